@@ -0,0 +1,102 @@
+"""
+Times `memotica forecast` on a database of a million reviews whose states are
+all different, the worst case for grouping and merging states: loading the
+reviews with `memotica.forecast.load_review_arrays`, then `simulate`.
+
+    python benchmarks/forecast.py --reviews 1000000 --days 30
+"""
+
+import tempfile
+from datetime import date, timedelta
+from pathlib import Path
+from time import perf_counter
+import click
+import numpy as np
+import pandas as pd
+from memotica import bulk
+from memotica.db import get_engine, init_db
+from memotica.forecast import load_review_arrays, simulate
+from memotica.models import utcnow
+
+
+def seed(engine, reviews: int, days: int, seed: int, today: date) -> None:
+    """
+    Adds a flashcard to each of 20 decks and `reviews` random reviews spread
+    over them, inserted directly since the forecast only reads the reviews.
+    """
+
+    rng = np.random.default_rng(seed)
+    now = utcnow().isoformat(" ")
+    flashcard_ids = rng.integers(1, 21, reviews)
+    due_in = rng.integers(-5, 2 * days, reviews)
+    repetitions = rng.integers(0, 8, reviews)
+    ef = np.round(rng.uniform(1.3, 2.8, reviews), 2)
+    interval = rng.integers(1, 60, reviews)
+
+    with engine.connect() as connection:
+        bulk.import_flashcards(
+            connection,
+            [
+                pd.DataFrame(
+                    {
+                        "front": [f"Front {i}" for i in range(20)],
+                        "back": [f"Back {i}" for i in range(20)],
+                        "reversible": False,
+                        "deck": [f"Deck {i}" for i in range(20)],
+                    }
+                )
+            ],
+        )
+        connection.exec_driver_sql("DELETE FROM reviews")
+        # The flashcards and decks were inserted in the same order.
+        connection.exec_driver_sql(
+            "INSERT INTO reviews "
+            "(flashcard_id, deck_id, next_review, repetitions, ef, interval, "
+            "reversed, created_at, last_updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?)",
+            [
+                (id, id, (today + timedelta(days=d)).isoformat(), n, e, i, now, now)
+                for id, d, n, e, i in zip(
+                    flashcard_ids.tolist(),
+                    due_in.tolist(),
+                    repetitions.tolist(),
+                    ef.tolist(),
+                    interval.tolist(),
+                )
+            ],
+        )
+        connection.commit()
+
+
+@click.command()
+@click.option("--reviews", default=1_000_000, show_default=True)
+@click.option("--days", default=30, show_default=True)
+@click.option("--seed", "seed_", default=0, show_default=True)
+def main(reviews: int, days: int, seed_: int):
+    today = date.today()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = get_engine(f"sqlite:///{Path(tmp) / 'memotica.db'}")
+        init_db(engine)
+        seed(engine, reviews, days, seed_, today)
+
+        start = perf_counter()
+        with engine.connect() as connection:
+            arrays = load_review_arrays(connection, days=days, today=today)
+        load_time = perf_counter() - start
+
+        start = perf_counter()
+        due = simulate(arrays, days)
+        simulate_time = perf_counter() - start
+
+        engine.dispose()
+
+    click.echo(
+        f"{reviews:,} reviews, {days} days: {load_time + simulate_time:.3f}s "
+        f"(load {load_time:.3f}s for {len(arrays):,} states, "
+        f"simulate {simulate_time:.3f}s, {due.sum():,.0f} expected reviews)"
+    )
+
+
+if __name__ == "__main__":
+    main()
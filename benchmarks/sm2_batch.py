@@ -0,0 +1,60 @@
+"""
+Compares the throughput of `memotica.sm2.sm2_batch` with calling
+`memotica.sm2.sm2` once per card.
+
+    python benchmarks/sm2_batch.py --updates 10000000
+"""
+
+from time import perf_counter
+import click
+import numpy as np
+from memotica.sm2 import sm2, sm2_batch
+
+
+@click.command()
+@click.option("--updates", default=10_000_000, show_default=True)
+@click.option(
+    "--scalar-updates",
+    default=1_000_000,
+    show_default=True,
+    help="How many of the updates to also run through the scalar sm2.",
+)
+@click.option("--seed", default=0, show_default=True)
+def main(updates: int, scalar_updates: int, seed: int):
+    rng = np.random.default_rng(seed)
+    n = rng.integers(0, 12, updates)
+    ef = rng.uniform(1.3, 3.0, updates)
+    i = rng.integers(1, 500, updates)
+    q = rng.integers(0, 6, updates)
+
+    start = perf_counter()
+    sm2_batch(n, ef, i, q)
+    batch_time = perf_counter() - start
+
+    scalar_updates = min(scalar_updates, updates)
+    cards = list(
+        zip(
+            n[:scalar_updates].tolist(),
+            ef[:scalar_updates].tolist(),
+            i[:scalar_updates].tolist(),
+            q[:scalar_updates].tolist(),
+        )
+    )
+
+    start = perf_counter()
+    for card in cards:
+        sm2(*card)
+    scalar_time = perf_counter() - start
+
+    click.echo(f"{'engine':<8} {'updates':>12} {'seconds':>10} {'updates/s':>14}")
+    click.echo(
+        f"{'batch':<8} {updates:>12,} {batch_time:>10.3f} {updates / batch_time:>14,.0f}"
+    )
+    click.echo(
+        f"{'scalar':<8} {scalar_updates:>12,} {scalar_time:>10.3f} "
+        f"{scalar_updates / scalar_time:>14,.0f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
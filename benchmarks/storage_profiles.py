@@ -0,0 +1,106 @@
+"""
+Compares the storage profiles from `memotica.settings.STORAGE_PROFILES` on the
+workloads that matter for memotica: bulk imports, answering reviews (one
+UPDATE and commit per answer) and reloading the flashcards table.
+
+    python benchmarks/storage_profiles.py --flashcards 100000 --answers 2000
+"""
+
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from time import perf_counter
+import click
+import pandas as pd
+from sqlalchemy.orm import Session
+from memotica import bulk
+from memotica.db import get_engine, init_db
+from memotica.repositories import DeckRepository, FlashcardRepository, ReviewRepository
+from memotica.settings import STORAGE_PROFILES
+
+
+def generate_chunks(flashcards: int, chunk_size: int = 10_000):
+    for start in range(0, flashcards, chunk_size):
+        ids = range(start, min(start + chunk_size, flashcards))
+        yield pd.DataFrame(
+            {
+                "front": [f"Front {i}" for i in ids],
+                "back": [f"Back {i}" for i in ids],
+                "reversible": [i % 3 == 0 for i in ids],
+                "deck": [f"Deck {i % 20}" for i in ids],
+            }
+        )
+
+
+def run_profile(profile: str, path: Path, flashcards: int, answers: int, reloads: int):
+    engine = get_engine(f"sqlite:///{path}", profile)
+    init_db(engine)
+
+    start = perf_counter()
+    with engine.connect() as connection:
+        bulk.import_flashcards(connection, generate_chunks(flashcards))
+    import_time = perf_counter() - start
+
+    with Session(engine) as session:
+        reviews_repository = ReviewRepository(session)
+        review_ids = [review.id for review in reviews_repository.get_all()[:answers]]
+
+        start = perf_counter()
+        now = datetime.now()
+        for review_id in review_ids:
+            reviews_repository.update(
+                review_id,
+                repetitions=1,
+                ef=2.6,
+                interval=1,
+                next_review=now.date() + timedelta(days=1),
+                last_updated_at=now,
+            )
+        answers_time = perf_counter() - start
+
+    start = perf_counter()
+    for _ in range(reloads):
+        with Session(engine) as session:
+            deck_ids = [deck.id for deck in DeckRepository(session).get_all()]
+            FlashcardRepository(session).get_by_decks(deck_ids)
+    reload_time = perf_counter() - start
+
+    engine.dispose()
+
+    return import_time, answers_time, reload_time
+
+
+@click.command()
+@click.option("--flashcards", default=50_000, show_default=True)
+@click.option("--answers", default=1_000, show_default=True)
+@click.option("--reloads", default=5, show_default=True)
+@click.option(
+    "--profile",
+    "profiles",
+    multiple=True,
+    type=click.Choice(list(STORAGE_PROFILES)),
+    help="Profiles to compare. By default all of them.",
+)
+def main(flashcards: int, answers: int, reloads: int, profiles: tuple[str, ...]):
+    click.echo(
+        f"{'profile':<12} {'import (rows/s)':>16} {'answer (ms)':>12} {'reload (ms)':>12}"
+    )
+
+    for profile in profiles or STORAGE_PROFILES:
+        with tempfile.TemporaryDirectory() as tmp:
+            import_time, answers_time, reload_time = run_profile(
+                profile,
+                Path(tmp) / "memotica.db",
+                flashcards,
+                answers,
+                reloads,
+            )
+
+        click.echo(
+            f"{profile:<12} {flashcards / import_time:>16,.0f} "
+            f"{answers_time / answers * 1000:>12.3f} {reload_time / reloads * 1000:>12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
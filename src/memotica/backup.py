@@ -0,0 +1,169 @@
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from time import perf_counter
+from typing import Callable
+from sqlalchemy import Engine
+from memotica.migrations import SCHEMA_VERSION
+from memotica.timing import TimedStats
+
+# Pages copied at a time. Between steps the database is unlocked, so the
+# TUI can keep reading and writing while a backup runs.
+DEFAULT_PAGES = 1024
+GZIP_MAGIC = b"\x1f\x8b"
+
+# Called after each step with the number of pages copied and the total.
+BackupProgress = Callable[[int, int], None]
+
+
+@dataclass
+class BackupStats(TimedStats):
+    """
+    Counters collected while running a backup or a restore.
+    """
+
+    pages: int = 0
+    size: int = 0
+
+
+def _copy(
+    source: sqlite3.Connection,
+    target: sqlite3.Connection,
+    pages: int,
+    on_progress: BackupProgress | None,
+) -> int:
+    """
+    Copies `source` into `target` with the online backup API, `pages` pages
+    at a time. The copy is a consistent snapshot: writes made to `source`
+    through another connection restart it.
+
+    :return int: the number of pages of the copy.
+    """
+
+    def progress(_, remaining: int, total: int) -> None:
+        if on_progress:
+            on_progress(total - remaining, total)
+
+    source.backup(target, pages=pages, progress=progress)
+    return target.execute("PRAGMA page_count").fetchone()[0]
+
+
+def check_integrity(connection: sqlite3.Connection) -> None:
+    """
+    Raises a ValueError if `PRAGMA integrity_check` finds any problem, or if
+    the file is not a database at all.
+    """
+
+    try:
+        problems = [row[0] for row in connection.execute("PRAGMA integrity_check")]
+    except sqlite3.DatabaseError as e:
+        raise ValueError(f"The backup is not a valid database: {e}") from e
+
+    if problems != ["ok"]:
+        raise ValueError(f"The backup is corrupt: {'; '.join(problems)}")
+
+
+def backup_database(
+    engine: Engine,
+    path: str | os.PathLike,
+    pages: int = DEFAULT_PAGES,
+    compress: bool = False,
+    on_progress: BackupProgress | None = None,
+) -> BackupStats:
+    """
+    Writes a copy of the database of `engine` to `path`, gzip compressed if
+    `compress` is set. The copy is checked with `PRAGMA integrity_check`
+    before it replaces `path`, so a failed backup never leaves a partial
+    file behind.
+    """
+
+    path = Path(path)
+    stats = BackupStats()
+
+    with tempfile.TemporaryDirectory(dir=path.parent) as directory:
+        copy = Path(directory) / "memotica.db"
+
+        target = sqlite3.connect(copy)
+        raw_connection = engine.raw_connection()
+        try:
+            stats.pages = _copy(
+                raw_connection.driver_connection, target, pages, on_progress
+            )
+            # The copy is a single file, even if the database uses a WAL.
+            target.execute("PRAGMA journal_mode = DELETE")
+            check_integrity(target)
+        finally:
+            raw_connection.close()
+            target.close()
+
+        if compress:
+            compressed = copy.with_suffix(".db.gz")
+            with open(copy, "rb") as source, gzip.open(compressed, "wb") as gz:
+                shutil.copyfileobj(source, gz)
+            copy = compressed
+
+        os.replace(copy, path)
+
+    stats.size = path.stat().st_size
+    stats.finished_at = perf_counter()
+    return stats
+
+
+def restore_database(
+    engine: Engine,
+    path: str | os.PathLike,
+    pages: int = DEFAULT_PAGES,
+    on_progress: BackupProgress | None = None,
+) -> BackupStats:
+    """
+    Replaces the database of `engine` with a backup written by
+    `backup_database`, compressed or not. The backup is checked with
+    `PRAGMA integrity_check`, and refused if made by a newer version of
+    memotica, before anything is overwritten.
+    """
+
+    path = Path(path)
+    stats = BackupStats(size=path.stat().st_size)
+
+    with tempfile.TemporaryDirectory() as directory:
+        with open(path, "rb") as file:
+            compressed = file.read(len(GZIP_MAGIC)) == GZIP_MAGIC
+
+        if compressed:
+            copy = Path(directory) / "memotica.db"
+            try:
+                with gzip.open(path, "rb") as gz, open(copy, "wb") as target:
+                    shutil.copyfileobj(gz, target)
+            except (OSError, EOFError) as e:
+                raise ValueError(f"The backup could not be decompressed: {e}") from e
+            path = copy
+
+        source = sqlite3.connect(path)
+        try:
+            check_integrity(source)
+
+            # Checked before anything is overwritten: this version of memotica
+            # could not open the restored database.
+            version = source.execute("PRAGMA user_version").fetchone()[0]
+            if version > SCHEMA_VERSION:
+                raise ValueError(
+                    f"The backup is at version {version}, which is newer than "
+                    f"this version of memotica supports ({SCHEMA_VERSION})."
+                )
+
+            raw_connection = engine.raw_connection()
+            try:
+                stats.pages = _copy(
+                    source, raw_connection.driver_connection, pages, on_progress
+                )
+            finally:
+                raw_connection.close()
+        finally:
+            source.close()
+
+    stats.finished_at = perf_counter()
+    return stats
@@ -0,0 +1,449 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from time import perf_counter
+from itertools import repeat
+from typing import Iterable, Literal, Sequence
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+from sqlalchemy import Boolean, Column, Connection, Table, func, insert, select
+from memotica.models import NEW_SYNC_ID_SQL, Deck, Flashcard, Review, content_hash
+from memotica.timing import TimedStats
+
+DEFAULT_CHUNK_SIZE = 10_000
+
+# What to do with imported flashcards that are already in their deck.
+OnDuplicate = Literal["skip", "update", "keep"]
+ON_DUPLICATE: tuple[OnDuplicate, ...] = ("skip", "update", "keep")
+
+
+@dataclass
+class ImportStats(TimedStats):
+    """
+    Counters collected while running a bulk import.
+    """
+
+    decks: int = 0
+    flashcards: int = 0
+    reviews: int = 0
+    updated: int = 0
+    skipped: int = 0
+
+    @property
+    def rows(self) -> int:
+        return self.decks + self.flashcards + self.reviews
+
+
+def read_flashcards_csv(
+    file,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterable[pd.DataFrame]:
+    """
+    Reads a flashcards CSV file (front, back, reversible, deck) in chunks of
+    at most `chunk_size` rows. The text columns are kept as written, so that
+    cells like `8` or `None` are not turned into numbers or missing values.
+    """
+
+    return pd.read_csv(
+        file,
+        chunksize=chunk_size,
+        usecols=["front", "back", "reversible", "deck"],
+        dtype={"front": str, "back": str, "deck": str},
+        keep_default_na=False,
+        na_values={"reversible": [""]},
+    )
+
+
+def read_table_csv(
+    file,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterable[pd.DataFrame]:
+    """
+    Reads a CSV file produced by `memotica export all` in chunks of at most
+    `chunk_size` rows. Values are kept as strings and converted by SQLite's
+    column affinity, except for booleans which are handled in `restore_table`.
+    """
+
+    return pd.read_csv(
+        file,
+        chunksize=chunk_size,
+        dtype=str,
+        keep_default_na=False,
+        na_values=[""],
+    )
+
+
+def _insert_sql(
+    table: Table,
+    columns: Sequence[str],
+    generated: dict[str, str] | None = None,
+) -> str:
+    """
+    Returns an INSERT with a placeholder for each of `columns`, and the SQL
+    expression of each of the `generated` columns.
+    """
+
+    generated = generated or {}
+    values = ["?" for _ in columns] + list(generated.values())
+    return (
+        f"INSERT INTO {table.name} ({', '.join([*columns, *generated])}) "
+        f"VALUES ({', '.join(values)})"
+    )
+
+
+def _bind(connection: Connection, column: Column, value):
+    """
+    Converts `value` to what SQLAlchemy would store for `column`, so rows
+    written through the DBAPI stay readable through the ORM.
+    """
+
+    dialect = connection.dialect
+    processor = column.type.dialect_impl(dialect).bind_processor(dialect)
+    return processor(value) if processor else value
+
+
+def _parse_bool(value: str | None) -> bool | None:
+    if value is None:
+        return None
+
+    return value.strip().lower() in ("true", "1")
+
+
+def restore_table(
+    connection: Connection,
+    table: Table,
+    chunks: Iterable[pd.DataFrame],
+) -> int:
+    """
+    Appends the rows of an exported table, keeping their ids, one chunk at a
+    time. Nothing is committed, so several tables can be restored in the same
+    transaction.
+
+    :param connection: The connection used to write.
+    :param table: The table the rows belong to.
+    :param chunks: DataFrames whose columns are a subset of the table's columns.
+
+    :return int: the number of rows written.
+    """
+
+    boolean_columns = {
+        column.name for column in table.columns if isinstance(column.type, Boolean)
+    }
+
+    rows = 0
+    for chunk in chunks:
+        unknown_columns = set(chunk.columns) - set(table.columns.keys())
+        if unknown_columns:
+            raise ValueError(
+                f"Unknown columns for '{table.name}': {', '.join(sorted(unknown_columns))}"
+            )
+
+        records = chunk.astype(object).where(chunk.notna(), None)
+        for column in boolean_columns.intersection(records.columns):
+            records[column] = records[column].map(_parse_bool)
+
+        connection.exec_driver_sql(
+            _insert_sql(table, list(records.columns)),
+            list(records.itertuples(index=False, name=None)),
+        )
+        rows += len(records)
+
+    return rows
+
+
+def import_flashcards(
+    connection: Connection,
+    chunks: Iterable[pd.DataFrame],
+    commit_every_chunk: bool = False,
+    on_duplicate: OnDuplicate = "skip",
+) -> ImportStats:
+    """
+    Inserts flashcards, their decks and their initial reviews chunk by chunk
+    with executemany inserts instead of per-row ORM round-trips.
+
+    Decks are matched by name with the existing ones. Flashcards are matched
+    by `content_hash` with the flashcards of their deck, including those of
+    earlier chunks, and the duplicates are skipped, used to update the
+    existing flashcard, or kept as new flashcards without a hash, depending
+    on `on_duplicate`. The hashes of the decks involved are loaded once and
+    matched with each chunk as a whole, never one row at a time.
+
+    Flashcard ids are allocated from `MAX(flashcards.id)` so that the reviews
+    of a chunk can be built without reading the flashcards back.
+
+    :param connection: The connection used to write. Everything is written in
+    a single transaction unless `commit_every_chunk` is set.
+    :param chunks: DataFrames with the columns front, back, reversible and deck.
+    :param commit_every_chunk: Commit after every chunk instead of once at the end.
+    :param on_duplicate: One of `ON_DUPLICATE`.
+
+    :return ImportStats: the number of rows written per table and the elapsed time.
+    """
+
+    if on_duplicate not in ON_DUPLICATE:
+        raise ValueError(f"Unknown duplicate handling: {on_duplicate}")
+
+    stats = ImportStats()
+    decks: dict[str, int] = {}
+    # The ids of the flashcards of the decks seen so far, by "deck_id:hash".
+    known = pd.Series([], dtype=np.int64)
+
+    flashcards_table = Flashcard.__table__
+    reviews_table = Review.__table__
+
+    now = datetime.now(timezone.utc)
+    timestamp = _bind(connection, flashcards_table.c.created_at, now)
+    today = _bind(connection, reviews_table.c.next_review, now.date())
+
+    insert_flashcards = _insert_sql(
+        flashcards_table,
+        (
+            "id",
+            "front",
+            "back",
+            "reversible",
+            "content_hash",
+            "deck_id",
+            "created_at",
+            "last_updated_at",
+        ),
+        {"sync_id": NEW_SYNC_ID_SQL},
+    )
+    insert_reviews = _insert_sql(
+        reviews_table,
+        (
+            "flashcard_id",
+            "deck_id",
+            "reversed",
+            "ef",
+            "interval",
+            "repetitions",
+            "next_review",
+            "created_at",
+            "last_updated_at",
+        ),
+        {"sync_id": NEW_SYNC_ID_SQL},
+    )
+
+    for chunk in chunks:
+        if chunk.empty:
+            continue
+
+        chunk = chunk.reset_index(drop=True)
+        new_names = [name for name in chunk["deck"].unique() if name not in decks]
+        if new_names:
+            existing_decks = connection.execute(
+                select(Deck.id, Deck.name)
+                .where(Deck.name.in_(new_names))
+                .order_by(Deck.id)
+            ).all()
+            for deck_id, deck_name in existing_decks:
+                decks.setdefault(deck_name, deck_id)
+
+            known = pd.concat(
+                (
+                    known,
+                    _load_content_keys(
+                        connection, [decks[name] for name in new_names if name in decks]
+                    ),
+                )
+            )
+
+            for deck_name in new_names:
+                if deck_name not in decks:
+                    result = connection.execute(
+                        insert(Deck.__table__).values(name=deck_name)
+                    )
+                    decks[deck_name] = result.inserted_primary_key[0]
+                    stats.decks += 1
+
+        reversible = chunk["reversible"].fillna(False).astype(bool).to_numpy()
+        deck_ids = chunk["deck"].map(decks).to_numpy(dtype=np.int64)
+        hashes = pd.Series(
+            [
+                content_hash(front, back)
+                for front, back in zip(chunk["front"].tolist(), chunk["back"].tolist())
+            ],
+            dtype=object,
+        )
+        keys = pd.Series(deck_ids).astype(str) + ":" + hashes
+
+        existing_ids = known.reindex(keys.to_numpy()).to_numpy()
+        exists = ~np.isnan(existing_ids)
+        repeated = keys.duplicated(
+            keep="last" if on_duplicate == "update" else "first"
+        ).to_numpy()
+
+        if on_duplicate == "keep":
+            inserted = np.ones(len(chunk), dtype=bool)
+            hashes[exists | repeated] = None
+        else:
+            inserted = ~exists & ~repeated
+            stats.skipped += int(repeated.sum())
+
+        if on_duplicate == "skip":
+            stats.skipped += int((exists & ~repeated).sum())
+        elif on_duplicate == "update":
+            updated = exists & ~repeated
+            stats.updated += int(updated.sum())
+            stats.reviews += _update_flashcards(
+                connection,
+                chunk[updated],
+                existing_ids[updated].astype(np.int64),
+                reversible[updated],
+                deck_ids[updated],
+                today,
+                timestamp,
+            )
+
+        size = int(inserted.sum())
+        if not size:
+            if commit_every_chunk:
+                connection.commit()
+            continue
+
+        first_id = connection.execute(
+            select(func.coalesce(func.max(flashcards_table.c.id), 0) + 1)
+        ).scalar_one()
+        ids = np.arange(first_id, first_id + size, dtype=np.int64)
+        rows = chunk[inserted]
+        reversible = reversible[inserted]
+        deck_ids = deck_ids[inserted]
+        hashes = hashes[inserted]
+
+        connection.exec_driver_sql(
+            insert_flashcards,
+            list(
+                zip(
+                    ids.tolist(),
+                    rows["front"].tolist(),
+                    rows["back"].tolist(),
+                    reversible.tolist(),
+                    hashes.tolist(),
+                    deck_ids.tolist(),
+                    repeat(timestamp, size),
+                    repeat(timestamp, size),
+                )
+            ),
+        )
+
+        hashed = hashes.notna().to_numpy()
+        known = pd.concat(
+            (known, pd.Series(ids[hashed], index=keys[inserted][hashed].to_numpy()))
+        )
+
+        review_ids = np.concatenate((ids, ids[reversible]))
+        review_deck_ids = np.concatenate((deck_ids, deck_ids[reversible]))
+        review_reversed = np.zeros(len(review_ids), dtype=bool)
+        review_reversed[size:] = True
+
+        connection.exec_driver_sql(
+            insert_reviews,
+            [
+                (
+                    flashcard_id,
+                    deck_id,
+                    is_reversed,
+                    2.5,
+                    1,
+                    0,
+                    today,
+                    timestamp,
+                    timestamp,
+                )
+                for flashcard_id, deck_id, is_reversed in zip(
+                    review_ids.tolist(),
+                    review_deck_ids.tolist(),
+                    review_reversed.tolist(),
+                )
+            ],
+        )
+
+        stats.flashcards += size
+        stats.reviews += len(review_ids)
+
+        if commit_every_chunk:
+            connection.commit()
+
+    connection.commit()
+    stats.finished_at = perf_counter()
+
+    return stats
+
+
+def _load_content_keys(connection: Connection, deck_ids: list[int]) -> pd.Series:
+    """
+    Returns the ids of the hashed flashcards of the given decks, indexed by
+    "deck_id:hash".
+    """
+
+    if not deck_ids:
+        return pd.Series([], dtype=np.int64)
+
+    rows = connection.execute(
+        select(Flashcard.id, Flashcard.deck_id, Flashcard.content_hash).where(
+            Flashcard.deck_id.in_(deck_ids),
+            Flashcard.content_hash.is_not(None),
+        )
+    ).all()
+
+    return pd.Series(
+        [id for id, _, _ in rows],
+        index=[f"{deck_id}:{hash}" for _, deck_id, hash in rows],
+        dtype=np.int64,
+    )
+
+
+def _update_flashcards(
+    connection: Connection,
+    rows: pd.DataFrame,
+    ids: npt.NDArray[np.int64],
+    reversible: npt.NDArray[np.bool_],
+    deck_ids: npt.NDArray[np.int64],
+    today,
+    timestamp,
+) -> int:
+    """
+    Overwrites existing flashcards with the imported rows that duplicate
+    them, and adds or removes their reversed review to match `reversible`.
+
+    :return int: the number of reviews added.
+    """
+
+    if not len(ids):
+        return 0
+
+    connection.exec_driver_sql(
+        "UPDATE flashcards SET front = ?, back = ?, reversible = ?, "
+        "last_updated_at = ? WHERE id = ?",
+        list(
+            zip(
+                rows["front"].tolist(),
+                rows["back"].tolist(),
+                reversible.tolist(),
+                repeat(timestamp, len(ids)),
+                ids.tolist(),
+            )
+        ),
+    )
+
+    connection.exec_driver_sql(
+        "DELETE FROM reviews WHERE flashcard_id = ? AND reversed",
+        [(id,) for id in ids[~reversible].tolist()],
+    )
+
+    result = connection.exec_driver_sql(
+        "INSERT INTO reviews (flashcard_id, deck_id, reversed, ef, interval, "
+        "repetitions, next_review, created_at, last_updated_at, sync_id) "
+        f"SELECT ?, ?, 1, 2.5, 1, 0, ?, ?, ?, {NEW_SYNC_ID_SQL} "
+        "WHERE NOT EXISTS "
+        "(SELECT 1 FROM reviews WHERE flashcard_id = ? AND reversed)",
+        [
+            (id, deck_id, today, timestamp, timestamp, id)
+            for id, deck_id in zip(
+                ids[reversible].tolist(), deck_ids[reversible].tolist()
+            )
+        ],
+    )
+
+    return max(result.rowcount, 0)
@@ -0,0 +1,27 @@
+from dataclasses import dataclass
+from typing import Callable
+
+
+@dataclass(frozen=True)
+class Change:
+    """
+    Rows of the table of `model` that a repository changed and committed.
+    """
+
+    model: type
+    ids: tuple[int, ...]
+
+
+class Inserted(Change):
+    pass
+
+
+class Updated(Change):
+    pass
+
+
+class Deleted(Change):
+    pass
+
+
+ChangeListener = Callable[[Change], None]
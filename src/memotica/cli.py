@@ -1,28 +1,122 @@
+import importlib
 import click
-from sqlalchemy import create_engine
-from sqlalchemy.orm import Session
-from memotica.config import Config
-from memotica.db import init_db
-from memotica.tui import Memotica
-from memotica.commands.import_command import import_group
-from memotica.commands.export_command import export_group
 
 
-@click.group(invoke_without_command=True)
+class LazyGroup(click.Group):
+    """
+    A click group whose subcommands are only imported when they are invoked.
+
+    Each lazy subcommand is given as its name mapped to the `module:attribute`
+    it lives in and its short help, so listing them in `--help` imports nothing.
+    """
+
+    def __init__(
+        self,
+        *args,
+        lazy_subcommands: dict[str, tuple[str, str]] | None = None,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.lazy_subcommands = lazy_subcommands or {}
+
+    def list_commands(self, ctx: click.Context) -> list[str]:
+        return sorted([*super().list_commands(ctx), *self.lazy_subcommands])
+
+    def get_command(self, ctx: click.Context, cmd_name: str) -> click.Command | None:
+        if cmd_name not in self.lazy_subcommands:
+            return super().get_command(ctx, cmd_name)
+
+        import_path, _ = self.lazy_subcommands[cmd_name]
+        module_name, attribute = import_path.split(":")
+        command = getattr(importlib.import_module(module_name), attribute)
+        if not isinstance(command, click.Command):
+            raise TypeError(f"'{import_path}' is not a click command.")
+        return command
+
+    def format_commands(self, ctx: click.Context, formatter: click.HelpFormatter):
+        names = self.list_commands(ctx)
+        limit = formatter.width - 6 - max(map(len, names), default=0)
+
+        rows = []
+        for name in names:
+            if name in self.lazy_subcommands:
+                help = self.lazy_subcommands[name][1]
+                rows.append((name, click.utils.make_default_short_help(help, limit)))
+                continue
+
+            command = super().get_command(ctx, name)
+            if command is not None and not command.hidden:
+                rows.append((name, command.get_short_help_str(limit)))
+
+        if rows:
+            with formatter.section("Commands"):
+                formatter.write_dl(rows)
+
+
+@click.group(
+    cls=LazyGroup,
+    invoke_without_command=True,
+    lazy_subcommands={
+        "import": (
+            "memotica.commands.import_command:import_group",
+            "Import your decks, flashcards, and reviews.",
+        ),
+        "export": (
+            "memotica.commands.export_command:export_group",
+            "Exports your decks, flashcards, and reviews.",
+        ),
+        "stats": (
+            "memotica.commands.stats_command:stats_group",
+            "Shows statistics about your decks and reviews.",
+        ),
+        "forecast": (
+            "memotica.commands.forecast_command:forecast_command",
+            "Shows how many reviews are expected to be due on each of the next days.",
+        ),
+        "backup": (
+            "memotica.commands.backup_command:backup_command",
+            "Back up your whole database to a file in the specified directory.",
+        ),
+        "restore": (
+            "memotica.commands.backup_command:restore_command",
+            "Restore your whole database from a file made by the backup command.",
+        ),
+        "sync": (
+            "memotica.commands.sync_command:sync_group",
+            "Sync your collection between machines with changesets.",
+        ),
+    },
+)
 @click.pass_context
 def cli(ctx) -> None:
     """
     memotica is an easy, fast and minimalist application for your terminal that allows you
     to learn using space repetition.
     """
+    # Imported here so that `--help` does not pay for SQLAlchemy and pydantic.
+    from memotica.config import Config
+    from memotica.db import get_engine, init_db
+    from memotica.settings import Settings
 
     ctx.ensure_object(dict)
 
     config = Config()
-    engine = create_engine(f"{config.sqlite_url}")
-    init_db(engine)
+    settings = Settings()
+    engine = get_engine(config.sqlite_url, settings.app.storage_profile)
+
+    def show_progress(applied: int, total: int, description: str) -> None:
+        click.echo(
+            f"Upgrading your database ({applied + 1}/{total}): {description}", err=True
+        )
+
+    try:
+        init_db(engine, show_progress)
+    except ValueError as e:
+        click.echo(f"Error: {e}")
+        ctx.exit(1)
 
     ctx.obj["engine"] = engine
+    ctx.obj["settings"] = settings
 
     if ctx.invoked_subcommand is None:
         ctx.forward(run)
@@ -34,11 +128,19 @@ def run(ctx):
     """
     Starts the TUI.
     """
-    engine = ctx.obj["engine"]
-    with Session(engine) as session:
-        app = Memotica(session)
-        app.run()
+    # Textual is only needed by the TUI, not by the other commands.
+    from sqlalchemy.orm import Session
+    from memotica.review_journal import ReviewJournal, journal_path
+    from memotica.tui import Memotica
 
+    engine = ctx.obj["engine"]
+    settings = ctx.obj["settings"]
+    review_journal = ReviewJournal(
+        journal_path(engine),
+        flush_every=settings.app.review_flush_every,
+        flush_interval=settings.app.review_flush_interval,
+    )
 
-cli.add_command(import_group)
-cli.add_command(export_group)
+    with Session(engine, expire_on_commit=False) as session:
+        app = Memotica(session, review_journal, settings.app.review_prefetch)
+        app.run()
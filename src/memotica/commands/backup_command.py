@@ -0,0 +1,103 @@
+import os
+from datetime import datetime
+import click
+from memotica.backup import DEFAULT_PAGES, backup_database, restore_database
+from memotica.migrations import migrate
+
+
+@click.command(name="backup")
+@click.option(
+    "--path",
+    default=".",
+    type=click.Path(
+        exists=True,
+        file_okay=False,
+        dir_okay=True,
+    ),
+    help="Path to the directory where the backup file will be saved.",
+    show_default=True,
+)
+@click.option(
+    "--compress",
+    is_flag=True,
+    default=False,
+    help="Compress the backup file with gzip.",
+)
+@click.option(
+    "--pages",
+    default=DEFAULT_PAGES,
+    type=click.IntRange(min=1),
+    show_default=True,
+    help="Number of database pages copied at a time.",
+)
+@click.pass_context
+def backup_command(ctx, path, compress, pages):
+    """
+    Back up your whole database to a file in the specified directory.
+
+    The backup is a consistent copy of the database, even while memotica
+    is running, and can be brought back with the restore command.
+    """
+
+    engine = ctx.obj["engine"]
+    today = datetime.now()
+    extension = ".db.gz" if compress else ".db"
+    backup_filename = os.path.join(
+        path, f"memotica_{today.strftime('%Y-%m-%d')}{extension}"
+    )
+
+    try:
+        stats = backup_database(engine, backup_filename, pages, compress)
+    except ValueError as e:
+        click.echo(f"Error: {e}")
+        return
+
+    click.echo(
+        f"Backed up {stats.pages} pages ({stats.size / 2**20:,.1f} MiB) "
+        f"in {stats.elapsed:.2f}s."
+    )
+    click.echo(f"Data backed up successfully to '{backup_filename}'!")
+
+
+@click.command(name="restore")
+@click.argument(
+    "file",
+    type=click.Path(
+        exists=True,
+        file_okay=True,
+        dir_okay=False,
+    ),
+)
+@click.option(
+    "--pages",
+    default=DEFAULT_PAGES,
+    type=click.IntRange(min=1),
+    show_default=True,
+    help="Number of database pages copied at a time.",
+)
+@click.confirmation_option(
+    prompt="This replaces all your decks, flashcards and reviews. Continue?"
+)
+@click.pass_context
+def restore_command(ctx, file, pages):
+    """
+    Restore your whole database from a file made by the backup command.
+    """
+
+    engine = ctx.obj["engine"]
+
+    try:
+        stats = restore_database(engine, file, pages)
+    except ValueError as e:
+        click.echo(f"Error: {e}")
+        return
+
+    # Backups made by older versions are brought up to date.
+    try:
+        migrate(engine)
+    except ValueError as e:
+        click.echo(f"Error: {e}")
+        return
+
+    click.echo(f"Restored {stats.pages} pages in {stats.elapsed:.2f}s.")
+    click.echo(f"Data restored successfully from '{file}'!")
@@ -0,0 +1,23 @@
+import click
+from sqlalchemy.orm import Session
+from memotica.repositories import DeckRepository
+
+
+def resolve_deck_id(session: Session, path: str) -> int | None:
+    """
+    Returns the id of the deck given to a `--deck` option, by name or by
+    `Parent/Child` path, or None if there is no such deck. Raises a
+    `click.BadParameter` if more than one deck matches.
+    """
+
+    repository = DeckRepository(session)
+    decks = repository.find_by_path(path)
+    if len(decks) > 1:
+        paths = ", ".join(f"'{repository.get_path(deck)}'" for deck in decks)
+        raise click.BadParameter(
+            f"More than one deck is called '{path}': {paths}. "
+            "Use the path of the one you mean, like 'Parent/Child'.",
+            param_hint="'--deck'",
+        )
+
+    return decks[0].id if decks else None
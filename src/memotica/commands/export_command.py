@@ -1,10 +1,10 @@
 import os
 import zipfile
-from io import BytesIO
 from datetime import datetime
 import click
-import pandas as pd
-from sqlalchemy import text
+from memotica import export
+from memotica.export import DEFAULT_BATCH_SIZE
+from memotica.repositories import select_deck_ids_by_name
 
 
 @click.group(
@@ -39,8 +39,21 @@ def export_group(ctx):
     multiple=True,
     help="List of decks to filter by. By default all decks will be exported.",
 )
+@click.option(
+    "--subdecks",
+    is_flag=True,
+    default=False,
+    help="Also export the sub-decks of the decks to filter by.",
+)
+@click.option(
+    "--batch-size",
+    default=DEFAULT_BATCH_SIZE,
+    type=click.IntRange(min=1),
+    show_default=True,
+    help="Number of rows read from the database and written at a time.",
+)
 @click.pass_context
-def export_all(ctx, path, decks):
+def export_all(ctx, path, decks, subdecks, batch_size):
     """
     Export all your decks, flashcards, and reviews to a ZIP file
     in the specified directory.
@@ -48,21 +61,22 @@ def export_all(ctx, path, decks):
 
     engine = ctx.obj["engine"]
     today = datetime.now()
-    zip_filename = os.path.join(path, f'memotica_{today.strftime("%Y-%m-%d")}.zip')
-
-    with zipfile.ZipFile(zip_filename, "w") as zipf:
-        for table in ["decks", "flashcards", "reviews"]:
-            df = pd.read_sql_table(
-                table,
-                con=engine.connect(),
-            )
+    zip_filename = os.path.join(path, f"memotica_{today.strftime('%Y-%m-%d')}.zip")
 
-            csv_buffer = BytesIO()
-            df.to_csv(csv_buffer, index=False)
-            csv_buffer.seek(0)
-            zipf.writestr(f"{table}.csv", csv_buffer.getvalue())
+    with zipfile.ZipFile(zip_filename, "w") as zipf, engine.connect() as connection:
+        stats = export.export_tables(
+            connection,
+            zipf,
+            batch_size=batch_size,
+            deck_ids=select_deck_ids_by_name(decks, subdecks) if decks else None,
+        )
 
-        click.echo(f"Data exported successfully to '{zip_filename}'!")
+    click.echo(
+        f"Exported {stats.tables['decks']} decks, {stats.tables['flashcards']} flashcards "
+        f"and {stats.tables['reviews']} reviews in {stats.elapsed:.2f}s "
+        f"({stats.rows_per_second:,.0f} rows/s)."
+    )
+    click.echo(f"Data exported successfully to '{zip_filename}'!")
 
 
 @click.command(name="flashcards")
@@ -84,8 +98,21 @@ def export_all(ctx, path, decks):
     multiple=True,
     help="List of decks to filter by. By default all decks will be exported.",
 )
+@click.option(
+    "--subdecks",
+    is_flag=True,
+    default=False,
+    help="Also export the sub-decks of the decks to filter by.",
+)
+@click.option(
+    "--batch-size",
+    default=DEFAULT_BATCH_SIZE,
+    type=click.IntRange(min=1),
+    show_default=True,
+    help="Number of rows read from the database and written at a time.",
+)
 @click.pass_context
-def export_flashcards(ctx, file, decks):
+def export_flashcards(ctx, file, decks, subdecks, batch_size):
     """
     Export your flashcards to a CSV file.
 
@@ -94,18 +121,16 @@ def export_flashcards(ctx, file, decks):
     """
 
     engine = ctx.obj["engine"]
-    query = text("""
-        SELECT f.front, f.back, f.reversible, d.name as deck
-        FROM flashcards AS f
-        LEFT JOIN decks AS d ON f.deck_id = d.id
-        """)
-
-    df = pd.read_sql_query(query, engine)
-
-    if decks:
-        df = df[df["deck"].isin(decks)]
-
-    df.to_csv(file, index=False)
+    with (
+        engine.connect() as connection,
+        open(file, "w", encoding="utf-8", newline="") as csv_file,
+    ):
+        export.export_flashcards(
+            connection,
+            csv_file,
+            batch_size=batch_size,
+            deck_ids=select_deck_ids_by_name(decks, subdecks) if decks else None,
+        )
 
     click.echo(f"Flashcards exported successfully to {file}")
 
@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+import click
+from sqlalchemy.orm import Session
+from memotica.commands.decks import resolve_deck_id
+from memotica.forecast import (
+    DEFAULT_ANSWERS,
+    DEFAULT_DAYS,
+    load_review_arrays,
+    simulate,
+)
+
+
+@click.command(name="forecast")
+@click.option(
+    "--deck",
+    "-d",
+    default=None,
+    help="Name or Parent/Child path of the deck to forecast. By default the whole collection is used.",
+)
+@click.option(
+    "--days",
+    default=DEFAULT_DAYS,
+    show_default=True,
+    type=click.IntRange(1, 365),
+    help="Number of days to forecast, starting today.",
+)
+@click.option(
+    "--wrong",
+    default=DEFAULT_ANSWERS["wrong"],
+    show_default=True,
+    type=click.FloatRange(min=0),
+    help="Share of the reviews expected to be answered as Wrong.",
+)
+@click.option(
+    "--good",
+    default=DEFAULT_ANSWERS["good"],
+    show_default=True,
+    type=click.FloatRange(min=0),
+    help="Share of the reviews expected to be answered as Good.",
+)
+@click.option(
+    "--easy",
+    default=DEFAULT_ANSWERS["easy"],
+    show_default=True,
+    type=click.FloatRange(min=0),
+    help="Share of the reviews expected to be answered as Easy.",
+)
+@click.pass_context
+def forecast_command(ctx, deck, days, wrong, good, easy):
+    """
+    Shows how many reviews are expected to be due on each of the next days
+    of a deck and its sub-decks, if you answer them the day they are due.
+    """
+
+    engine = ctx.obj["engine"]
+    with Session(engine) as session:
+        deck_id = None
+        if deck:
+            deck_id = resolve_deck_id(session, deck)
+            if deck_id is None:
+                click.echo(f"Deck '{deck}' not found!")
+                return
+
+        reviews = load_review_arrays(session, deck_id, days)
+
+    try:
+        due = simulate(reviews, days, {"wrong": wrong, "good": good, "easy": easy})
+    except ValueError as e:
+        click.echo(f"Error: {e}")
+        return
+
+    today = datetime.now().date()
+    click.echo(f"{'Date':<10} {'Due':>10}")
+    for day, count in enumerate(due):
+        click.echo(f"{today + timedelta(days=day):%Y-%m-%d} {count:>10.1f}")
+    click.echo(f"{'Total':<10} {due.sum():>10.1f}")
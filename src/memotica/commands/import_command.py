@@ -1,9 +1,15 @@
 import zipfile
+from time import perf_counter
 import click
-import pandas as pd
-from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from memotica import bulk
+from memotica.bulk import DEFAULT_CHUNK_SIZE
 from memotica.models import Deck, Flashcard, Review
-from memotica.repositories import FlashcardRepository, DeckRepository, ReviewRepository
+from memotica.repositories import (
+    assign_sync_ids,
+    rebuild_content_hashes,
+    rebuild_deck_closure,
+)
 
 
 @click.group(name="import")
@@ -24,8 +30,15 @@ def import_group(_):
         dir_okay=False,
     ),
 )
+@click.option(
+    "--chunk-size",
+    default=DEFAULT_CHUNK_SIZE,
+    type=click.IntRange(min=1),
+    show_default=True,
+    help="Number of rows read from the backup file and written at a time.",
+)
 @click.pass_context
-def import_all(ctx, file):
+def import_all(ctx, file, chunk_size):
     """
     Import all your data from a ZIP file.
 
@@ -35,8 +48,14 @@ def import_all(ctx, file):
 
     engine = ctx.obj["engine"]
     import_files = ("decks.csv", "flashcards.csv", "reviews.csv")
-
-    with zipfile.ZipFile(file, "r") as zipf:
+    tables = {
+        "decks.csv": Deck.__table__,
+        "flashcards.csv": Flashcard.__table__,
+        "reviews.csv": Review.__table__,
+    }
+
+    stats = bulk.ImportStats()
+    with zipfile.ZipFile(file, "r") as zipf, engine.connect() as connection:
         files_in_zip = zipf.namelist()
         if len(files_in_zip) != len(import_files):
             click.echo(
@@ -50,16 +69,40 @@ def import_all(ctx, file):
             )
             return
 
-        for import_file in import_files:
-            with zipf.open(import_file, "r") as f:
-                df = pd.read_csv(f)
-                df.to_sql(
-                    import_file[:-4],
-                    engine,
-                    if_exists="append",
-                    index=False,
-                )
+        try:
+            # Decks may reference parents that come later in the file.
+            connection.exec_driver_sql("PRAGMA defer_foreign_keys = ON")
+
+            for import_file in import_files:
+                table = tables[import_file]
+                with zipf.open(import_file, "r") as f:
+                    rows = bulk.restore_table(
+                        connection,
+                        table,
+                        bulk.read_table_csv(f, chunk_size),
+                    )
+
+                setattr(stats, table.name, rows)
+
+            # Decks are not necessarily restored parents first.
+            rebuild_deck_closure(connection)
+            # Backups from before content hashes and sync ids existed have none.
+            rebuild_content_hashes(connection)
+            assign_sync_ids(connection)
+            connection.commit()
+        except (ValueError, IntegrityError) as e:
+            connection.rollback()
+            click.echo(
+                f"Your backup file could not be imported: {getattr(e, 'orig', e)}"
+            )
+            return
+
+        stats.finished_at = perf_counter()
 
+    click.echo(
+        f"Imported {stats.decks} decks, {stats.flashcards} flashcards and {stats.reviews} reviews "
+        f"in {stats.elapsed:.2f}s ({stats.rows_per_second:,.0f} rows/s)."
+    )
     click.echo("Data imported successfully!")
 
 
@@ -72,49 +115,55 @@ def import_all(ctx, file):
         dir_okay=False,
     ),
 )
+@click.option(
+    "--chunk-size",
+    default=DEFAULT_CHUNK_SIZE,
+    type=click.IntRange(min=1),
+    show_default=True,
+    help="Number of rows read from the CSV file and written at a time.",
+)
+@click.option(
+    "--commit-every-chunk",
+    is_flag=True,
+    default=False,
+    help="Commit after every chunk instead of importing everything in a single transaction.",
+)
+@click.option(
+    "--on-duplicate",
+    default="skip",
+    type=click.Choice(bulk.ON_DUPLICATE),
+    show_default=True,
+    help="What to do with flashcards that are already in their deck: skip them, update the existing ones, or keep both.",
+)
 @click.pass_context
-def import_flashcards(ctx, file):
+def import_flashcards(ctx, file, chunk_size, commit_every_chunk, on_duplicate):
     """
     Import flashcard from a CSV file.
 
     This command will import flashcards from a CSV file and create the
-    necessary decks.
+    decks that do not exist yet. Flashcards with the same front and back,
+    ignoring case and whitespace, as one already in their deck are
+    duplicates.
     """
 
     engine = ctx.obj["engine"]
-    with Session(engine) as session:
-        flashcards_repository = FlashcardRepository(session)
-        decks_repository = DeckRepository(session)
-        reviews_repository = ReviewRepository(session)
-
-        df = pd.read_csv(file)
-        decks = {
-            deck_name: decks_repository.add(Deck(name=deck_name))
-            for deck_name in df["deck"].unique()
-        }
-
-        for _, row in df.iterrows():
-            flashcard = flashcards_repository.add(
-                Flashcard(
-                    front=row["front"],
-                    back=row["back"],
-                    reversible=row["reversible"],
-                    deck=decks[row["deck"]],
-                )
-            )
-
-            reviews_repository.add(Review(flashcard=flashcard))
-            if flashcard.reversible:
-                reviews_repository.add(
-                    Review(
-                        flashcard=flashcard,
-                        reversed=True,
-                    )
-                )
-
-            session.commit()
-
-        click.echo(f"Flashcards imported successfully from '{file}'!")
+    with engine.connect() as connection:
+        stats = bulk.import_flashcards(
+            connection,
+            bulk.read_flashcards_csv(file, chunk_size),
+            commit_every_chunk=commit_every_chunk,
+            on_duplicate=on_duplicate,
+        )
+
+    click.echo(
+        f"Imported {stats.flashcards} flashcards, {stats.reviews} reviews and {stats.decks} decks "
+        f"in {stats.elapsed:.2f}s ({stats.rows_per_second:,.0f} rows/s)."
+    )
+    if stats.updated or stats.skipped:
+        click.echo(
+            f"Updated {stats.updated} and skipped {stats.skipped} duplicate flashcards."
+        )
+    click.echo(f"Flashcards imported successfully from '{file}'!")
 
 
 import_group.add_command(import_all)
@@ -0,0 +1,72 @@
+import click
+from sqlalchemy.orm import Session
+from memotica.commands.decks import resolve_deck_id
+from memotica.repositories import StatisticsRepository
+
+
+@click.group(
+    name="stats",
+    invoke_without_command=True,
+)
+@click.pass_context
+def stats_group(ctx):
+    """
+    Shows statistics about your decks and reviews.
+    """
+
+    if ctx.invoked_subcommand is None:
+        ctx.forward(show_stats)
+
+
+@click.command(name="show")
+@click.option(
+    "--deck",
+    "-d",
+    default=None,
+    help="Name or Parent/Child path of the deck to show. By default the whole collection is shown.",
+)
+@click.pass_context
+def show_stats(ctx, deck):
+    """
+    Shows the number of flashcards, reviews, reviews due today and the
+    average easiness factor of a deck and its sub-decks.
+    """
+
+    engine = ctx.obj["engine"]
+    with Session(engine) as session:
+        deck_id = None
+        if deck:
+            deck_id = resolve_deck_id(session, deck)
+            if deck_id is None:
+                click.echo(f"Deck '{deck}' not found!")
+                return
+
+        statistics_repository = StatisticsRepository(session)
+
+        click.echo(f"Flashcards: {statistics_repository.count_flashcards(deck_id)}")
+        click.echo(f"Reviews: {statistics_repository.count_reviews(deck_id)}")
+        click.echo(f"Due today: {statistics_repository.count_pending_reviews(deck_id)}")
+        click.echo(
+            f"Average EF: {statistics_repository.calc_avg_review_score(deck_id):.2f}"
+        )
+
+
+@click.command(name="rebuild")
+@click.pass_context
+def rebuild_stats(ctx):
+    """
+    Recomputes the statistics of every deck from scratch.
+
+    Statistics are updated every time a flashcard or review changes, so
+    this is only needed if they ever drift from your data.
+    """
+
+    engine = ctx.obj["engine"]
+    with Session(engine) as session:
+        StatisticsRepository(session).rebuild()
+
+    click.echo("Statistics rebuilt successfully!")
+
+
+stats_group.add_command(show_stats)
+stats_group.add_command(rebuild_stats)
@@ -0,0 +1,109 @@
+import json
+from datetime import datetime
+import click
+from memotica.sync import (
+    apply_changeset,
+    export_changeset,
+    get_watermark,
+    set_watermark,
+)
+
+
+@click.group(name="sync")
+@click.pass_context
+def sync_group(_):
+    """
+    Sync your collection between machines with changesets.
+
+    A changeset holds the decks, flashcards and reviews changed, and the
+    ones deleted, since the last changeset exported to the same peer.
+    """
+    pass
+
+
+@click.command(name="export")
+@click.argument(
+    "file",
+    type=click.Path(
+        exists=False,
+        file_okay=True,
+        dir_okay=False,
+    ),
+)
+@click.option(
+    "--peer",
+    "-p",
+    default="default",
+    show_default=True,
+    help="Name of the machine the changeset is for.",
+)
+@click.option(
+    "--full",
+    is_flag=True,
+    default=False,
+    help="Export the whole collection instead of the changes since the last export.",
+)
+@click.pass_context
+def sync_export(ctx, file, peer, full):
+    """
+    Export the changes since the last changeset exported to PEER to a file.
+    """
+
+    engine = ctx.obj["engine"]
+    with engine.begin() as connection:
+        since = None if full else get_watermark(connection, peer)
+        changeset = export_changeset(connection, since)
+
+        with open(file, "w", encoding="utf-8") as f:
+            json.dump(changeset, f)
+
+        # Only moved forward once the changeset is written.
+        set_watermark(connection, peer, datetime.fromisoformat(changeset["until"]))
+
+    click.echo(
+        f"Exported {len(changeset['decks'])} decks, {len(changeset['flashcards'])} flashcards, "
+        f"{len(changeset['reviews'])} reviews and {len(changeset['tombstones'])} deletions "
+        f"changed since {since or 'the beginning'}."
+    )
+    click.echo(f"Changeset exported successfully to '{file}'!")
+
+
+@click.command(name="apply")
+@click.argument(
+    "file",
+    type=click.Path(
+        exists=True,
+        file_okay=True,
+        dir_okay=False,
+    ),
+)
+@click.pass_context
+def sync_apply(ctx, file):
+    """
+    Merge a changeset exported on another machine into your collection.
+
+    When both machines changed the same row, the latest change wins.
+    """
+
+    engine = ctx.obj["engine"]
+
+    try:
+        with open(file, encoding="utf-8") as f:
+            changeset = json.load(f)
+
+        with engine.begin() as connection:
+            stats = apply_changeset(connection, changeset)
+    except (ValueError, KeyError) as e:
+        click.echo(f"Your changeset could not be applied: {e}")
+        return
+
+    click.echo(
+        f"Inserted {stats.inserted}, updated {stats.updated} and deleted {stats.deleted} rows "
+        f"in {stats.elapsed:.2f}s. {stats.skipped} changes were older than yours or "
+        "could not be placed."
+    )
+    click.echo(f"Changeset applied successfully from '{file}'!")
+
+
+sync_group.add_command(sync_export)
+sync_group.add_command(sync_apply)
@@ -1,5 +1,54 @@
-from memotica.models import Base
+from sqlalchemy import Engine, create_engine, event
+from sqlalchemy.orm import Session
+from memotica.migrations import MigrationProgress, migrate
+from memotica.review_journal import ReviewJournal, journal_path
+from memotica.settings import STORAGE_PROFILES, StorageProfile
 
 
-def init_db(engine) -> None:
-    Base.metadata.create_all(engine)
+def get_engine(url: str, profile: str | StorageProfile = "balanced") -> Engine:
+    """
+    Creates an engine whose connections are configured with the pragmas of
+    the given storage profile, either a name from `STORAGE_PROFILES` or a
+    `StorageProfile` instance.
+    """
+
+    if isinstance(profile, str):
+        profile = STORAGE_PROFILES[profile]
+
+    pragmas = (
+        f"PRAGMA journal_mode = {profile.journal_mode}",
+        f"PRAGMA synchronous = {profile.synchronous}",
+        f"PRAGMA cache_size = {profile.cache_size:d}",
+        f"PRAGMA mmap_size = {profile.mmap_size:d}",
+        f"PRAGMA temp_store = {profile.temp_store}",
+        f"PRAGMA busy_timeout = {profile.busy_timeout:d}",
+        f"PRAGMA foreign_keys = {'ON' if profile.foreign_keys else 'OFF'}",
+    )
+
+    engine = create_engine(url)
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, _) -> None:
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    return engine
+
+
+def init_db(engine, on_progress: MigrationProgress | None = None) -> None:
+    migrate(engine, on_progress)
+    replay_review_journal(engine)
+
+
+def replay_review_journal(engine) -> None:
+    """
+    Writes the review answers that a previous run recorded but could not
+    flush before exiting.
+    """
+
+    journal = ReviewJournal(journal_path(engine))
+    with Session(engine) as session:
+        journal.replay(session)
+    journal.close()
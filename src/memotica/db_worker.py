@@ -0,0 +1,77 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, TypeVar
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+R = TypeVar("R")
+
+# How many SQLite virtual machine instructions run between two checks for
+# cancellation, a few milliseconds of work.
+PROGRESS_INTERVAL = 10_000
+
+
+class DatabaseWorker:
+    """
+    Runs database calls on a single dedicated thread, one at a time and in
+    the order they were submitted, so the event loop never waits on SQLite.
+
+    The session used by those calls must only be touched from this thread.
+    """
+
+    def __init__(self) -> None:
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db")
+
+    async def run(self, fn: Callable[..., R], *args, **kwargs) -> R:
+        """
+        Runs `fn(*args, **kwargs)` on the database thread and waits for its
+        result without blocking the event loop.
+        """
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(fn, *args, **kwargs))
+
+    async def run_interruptible(
+        self, session: Session, fn: Callable[..., R], *args, **kwargs
+    ) -> R | None:
+        """
+        Like `run`, for reads that are often superseded, such as searches.
+
+        When the awaiting task is cancelled, the call is skipped if it has
+        not started yet, and the statement SQLite is running is interrupted
+        otherwise, so that the thread is free for the next call. Cancelled
+        calls return None.
+        """
+
+        cancelled = threading.Event()
+
+        def call() -> R | None:
+            if cancelled.is_set():
+                return None
+
+            connection = session.connection().connection.driver_connection
+            connection.set_progress_handler(cancelled.is_set, PROGRESS_INTERVAL)
+            try:
+                return fn(*args, **kwargs)
+            except OperationalError:
+                if cancelled.is_set():
+                    return None
+                raise
+            finally:
+                connection.set_progress_handler(None, 0)
+
+        try:
+            return await self.run(call)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    def shutdown(self) -> None:
+        """
+        Waits for the calls already submitted, such as pending review
+        updates, and stops the thread.
+        """
+
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,109 @@
+from typing import Iterable, Iterator
+from memotica.models import Deck
+
+
+class DeckIndex:
+    """
+    The decks by id and the ids of the sub-decks of each deck, so that the
+    hierarchy can be walked without touching the database.
+
+    The index keeps its own copy of the hierarchy, and is only changed
+    through `add`, `update` and `remove`, which mirror the changes made to
+    the database and report which decks they affected.
+    """
+
+    def __init__(self, decks: Iterable[Deck] = ()) -> None:
+        self.decks: dict[int, Deck] = {}
+        self.parents: dict[int, int | None] = {}
+        self.children: dict[int | None, list[int]] = {None: []}
+
+        decks = list(decks)
+        for deck in decks:
+            self.decks[deck.id] = deck
+            self.children.setdefault(deck.id, [])
+
+        for deck in decks:
+            # A parent that is not in the index makes the deck a root deck.
+            parent_id = deck.parent_id if deck.parent_id in self.decks else None
+            self.parents[deck.id] = parent_id
+            self.children[parent_id].append(deck.id)
+
+    def __len__(self) -> int:
+        return len(self.decks)
+
+    def __iter__(self) -> Iterator[Deck]:
+        return iter(self.decks.values())
+
+    def __contains__(self, id: int) -> bool:
+        return id in self.decks
+
+    def get(self, id: int | None) -> Deck | None:
+        return self.decks.get(id) if id is not None else None
+
+    def parent_id(self, id: int) -> int | None:
+        return self.parents[id]
+
+    def sub_decks(self, id: int | None) -> list[Deck]:
+        """
+        Returns the sub-decks of a deck, or the root decks if `id` is None.
+        """
+
+        return [self.decks[child_id] for child_id in self.children[id]]
+
+    def descendants(self, id: int) -> set[int]:
+        """
+        Returns the ids of a deck and of all its sub-decks.
+        """
+
+        ids = {id}
+        pending = [id]
+        while pending:
+            for child_id in self.children[pending.pop()]:
+                ids.add(child_id)
+                pending.append(child_id)
+
+        return ids
+
+    def add(self, deck: Deck) -> None:
+        parent_id = deck.parent_id if deck.parent_id in self.decks else None
+
+        self.decks[deck.id] = deck
+        self.parents[deck.id] = parent_id
+        self.children[deck.id] = []
+        self.children[parent_id].append(deck.id)
+
+    def update(self, deck: Deck) -> int | None:
+        """
+        Replaces a deck after it was renamed or moved.
+
+        :return int | None: the id of its previous parent.
+        """
+
+        previous_parent_id = self.parents[deck.id]
+        parent_id = deck.parent_id if deck.parent_id in self.decks else None
+
+        self.decks[deck.id] = deck
+        if parent_id != previous_parent_id:
+            self.children[previous_parent_id].remove(deck.id)
+            self.children[parent_id].append(deck.id)
+            self.parents[deck.id] = parent_id
+
+        return previous_parent_id
+
+    def remove(self, id: int) -> list[int]:
+        """
+        Removes a deck. Its sub-decks become root decks, as deleting a deck
+        only clears their parent.
+
+        :return list[int]: the ids of its former sub-decks.
+        """
+
+        orphan_ids = self.children.pop(id)
+        self.children[self.parents.pop(id)].remove(id)
+        del self.decks[id]
+
+        for orphan_id in orphan_ids:
+            self.parents[orphan_id] = None
+            self.children[None].append(orphan_id)
+
+        return orphan_ids
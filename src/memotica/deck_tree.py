@@ -1,12 +1,23 @@
 from textual.binding import Binding
 from textual.widgets import Tree
+from textual.widgets.tree import TreeNode
+from memotica.deck_index import DeckIndex
 from memotica.messages import AddDeck, DeleteDeck, EditDeck, SelectDeck
 from memotica.models import Deck
 
 
-class DeckTree(Tree):
+class DeckTree(Tree[int | None]):
+    """
+    The deck hierarchy, whose nodes hold the id of their deck. The root,
+    which stands for every deck, holds None.
+
+    The tree is built once by `reload` and then patched one deck at a time,
+    so changing a deck only touches its own nodes.
+    """
+
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(label="*", *args, **kwargs)
+        self.deck_nodes: dict[int, TreeNode[int | None]] = {}
 
     BINDINGS = [
         Binding("backspace", "delete", "Delete"),
@@ -19,11 +30,7 @@ class DeckTree(Tree):
         self.border_title = "Decks"
 
     def on_tree_node_selected(self, selectedNode: Tree.NodeSelected) -> None:
-        node_label = f"{selectedNode.node.label}"
-        if node_label == "*":
-            self.post_message(SelectDeck())
-        else:
-            self.post_message(SelectDeck(node_label))
+        self.post_message(SelectDeck(selectedNode.node.data))
 
     def add_deck(self) -> None:
         self.post_message(AddDeck())
@@ -34,30 +41,87 @@ class DeckTree(Tree):
     def action_delete(self) -> None:
         self.post_message(DeleteDeck())
 
-    def reload(self, decks: list[Deck] | None = None) -> None:
+    def reload(self, decks: DeckIndex) -> None:
+        """
+        Rebuilds the whole tree from `decks` and selects every deck.
+        """
+
         self.loading = True
         self.clear()
+        self.deck_nodes: dict[int, TreeNode[int | None]] = {}
 
         self.post_message(SelectDeck())
         self.guide_depth = 3
         self.root.expand()
 
-        if not decks:
-            self.loading = False
-            return
+        for deck in decks.sub_decks(None):
+            self.__add_node(self.root, deck, decks)
 
-        root_decks = [deck for deck in self.app.decks if deck.parent_id is None]
+        self.loading = False
 
-        def add_deck_to_tree(parent, deck):
-            if not deck.sub_decks:
-                node = parent.add_leaf(deck.name)
-                return
+    def add_deck_node(self, deck: Deck, decks: DeckIndex) -> None:
+        """
+        Adds the node of a deck that was just added to `decks`.
+        """
 
-            node = parent.add(deck.name)
-            for sub_deck in deck.sub_decks:
-                add_deck_to_tree(node, sub_deck)
+        self.__add_node(self.__parent_node(deck.id, decks), deck, decks)
 
-        for root_deck in root_decks:
-            add_deck_to_tree(self.root, root_deck)
+    def update_deck_node(self, deck: Deck, decks: DeckIndex) -> None:
+        """
+        Renames the node of a deck that was just updated in `decks`, moving
+        it with its sub-decks if its parent changed.
+        """
 
-        self.loading = False
+        node = self.deck_nodes[deck.id]
+        parent = self.__parent_node(deck.id, decks)
+        if node.parent is parent:
+            node.set_label(deck.name)
+            return
+
+        previous_parent = node.parent
+        self.__remove_node(node)
+        self.__update_leaf(previous_parent)
+        self.__add_node(parent, deck, decks)
+
+    def remove_deck_node(
+        self, deck_id: int, orphan_ids: list[int], decks: DeckIndex
+    ) -> None:
+        """
+        Removes the node of a deck that was just removed from `decks`, and
+        moves its former sub-decks to the root.
+        """
+
+        node = self.deck_nodes[deck_id]
+        previous_parent = node.parent
+        self.__remove_node(node)
+        self.__update_leaf(previous_parent)
+
+        for orphan_id in orphan_ids:
+            self.__add_node(self.root, decks.get(orphan_id), decks)
+
+    def __parent_node(self, deck_id: int, decks: DeckIndex) -> TreeNode:
+        parent_id = decks.parent_id(deck_id)
+        return self.deck_nodes[parent_id] if parent_id is not None else self.root
+
+    def __add_node(self, parent: TreeNode, deck: Deck, decks: DeckIndex) -> None:
+        sub_decks = decks.sub_decks(deck.id)
+        node = parent.add(deck.name, data=deck.id, allow_expand=bool(sub_decks))
+        self.deck_nodes[deck.id] = node
+
+        for sub_deck in sub_decks:
+            self.__add_node(node, sub_deck, decks)
+
+        self.__update_leaf(parent)
+
+    def __remove_node(self, node: TreeNode) -> None:
+        pending = [node]
+        while pending:
+            removed = pending.pop()
+            del self.deck_nodes[removed.data]
+            pending.extend(removed.children)
+
+        node.remove()
+
+    def __update_leaf(self, node: TreeNode | None) -> None:
+        if node is not None and node is not self.root:
+            node.allow_expand = bool(node.children)
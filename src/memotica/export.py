@@ -0,0 +1,267 @@
+import csv
+import io
+import zipfile
+from dataclasses import dataclass, field
+from datetime import date, datetime, time
+from time import perf_counter
+from typing import Any, Callable, Iterable
+from sqlalchemy import (
+    Boolean,
+    Column,
+    Connection,
+    Date,
+    DateTime,
+    Float,
+    Integer,
+    MetaData,
+    Select,
+    Table,
+    case,
+    select,
+    type_coerce,
+)
+from memotica.models import Deck, Flashcard
+from memotica.timing import TimedStats
+
+DEFAULT_BATCH_SIZE = 5_000
+EXPORT_TABLES = ("decks", "flashcards", "reviews")
+
+
+@dataclass
+class ExportStats(TimedStats):
+    """
+    Counters collected while running an export.
+    """
+
+    tables: dict[str, int] = field(default_factory=dict)
+
+    @property
+    def rows(self) -> int:
+        return sum(self.tables.values())
+
+
+class _Format:
+    """
+    Formats the values of a column the way `pandas.DataFrame.to_csv` does.
+    Columns whose format depends on all of their values, like pandas'
+    dtypes do, look at them first through `observe`.
+    """
+
+    observes = False
+
+    def observe(self, value: Any) -> None:
+        pass
+
+    def __call__(self, value: Any) -> str:
+        return "" if value is None else str(value)
+
+
+class _FloatFormat(_Format):
+    def __call__(self, value: float | None) -> str:
+        return "" if value is None else repr(float(value))
+
+
+class _IntegerFormat(_Format):
+    # pandas reads integer columns with NULLs as floats.
+    observes = True
+
+    def __init__(self) -> None:
+        self.has_nulls = False
+
+    def observe(self, value: int | None) -> None:
+        self.has_nulls = self.has_nulls or value is None
+
+    def __call__(self, value: int | None) -> str:
+        if value is None:
+            return ""
+        return repr(float(value)) if self.has_nulls else str(value)
+
+
+class _DateFormat(_Format):
+    def __call__(self, value: date | None) -> str:
+        return "" if value is None else value.isoformat()
+
+
+class _DateTimeFormat(_Format):
+    # pandas leaves out the time when every value is a midnight, and prints
+    # milliseconds or microseconds only when some value needs them.
+    observes = True
+
+    def __init__(self) -> None:
+        self.dates_only = True
+        self.digits = 0
+
+    def observe(self, value: datetime | None) -> None:
+        if value is None:
+            return
+        if value.time() != time():
+            self.dates_only = False
+        if value.microsecond % 1000:
+            self.digits = 6
+        elif value.microsecond and not self.digits:
+            self.digits = 3
+
+    def __call__(self, value: datetime | None) -> str:
+        if value is None:
+            return ""
+        if self.dates_only:
+            return f"{value:%Y-%m-%d}"
+        text = f"{value:%Y-%m-%d %H:%M:%S}"
+        if self.digits:
+            text += f".{value.microsecond:06d}"[: self.digits + 1]
+        return text
+
+
+def _column_format(column: Column) -> _Format:
+    if isinstance(column.type, Boolean):
+        return _Format()
+    if isinstance(column.type, Integer):
+        return _IntegerFormat() if column.nullable else _Format()
+    if isinstance(column.type, Float):
+        return _FloatFormat()
+    if isinstance(column.type, DateTime):
+        return _DateTimeFormat()
+    if isinstance(column.type, Date):
+        return _DateFormat()
+    return _Format()
+
+
+def _write_rows(
+    file: io.TextIOBase,
+    connection: Connection,
+    stmt: Select,
+    formats: list[_Format],
+    batch_size: int,
+) -> int:
+    writer = csv.writer(file, lineterminator="\n")
+    writer.writerow(column.name for column in stmt.selected_columns)
+
+    streaming = connection.execution_options(stream_results=True, yield_per=batch_size)
+
+    count = 0
+    for rows in streaming.execute(stmt).partitions():
+        writer.writerows(
+            [format(value) for value, format in zip(row, formats)] for row in rows
+        )
+        count += len(rows)
+
+    return count
+
+
+def export_table(
+    connection: Connection,
+    name: str,
+    file: io.TextIOBase,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    query: Callable[[Table], Select] | None = None,
+) -> int:
+    """
+    Writes a table as CSV, in the layout `pandas.read_sql_table` followed by
+    `to_csv(index=False)` produces, which `memotica import all` reads back.
+    `query` selects the rows to write from the reflected table, every row by
+    default, and must keep its columns.
+
+    Rows are streamed in batches of `batch_size`, so memory does not grow
+    with the table. Columns whose format depends on every value are scanned
+    first by a query that only reads them.
+
+    :return int: the number of rows written.
+    """
+
+    table = Table(name, MetaData(), autoload_with=connection)
+    selected = (query(table) if query else select(table)).subquery()
+    formats = [_column_format(column) for column in table.columns]
+    streaming = connection.execution_options(stream_results=True, yield_per=batch_size)
+
+    observed = [
+        (selected.c[column.name], format)
+        for column, format in zip(table.columns, formats)
+        if format.observes
+    ]
+    if observed:
+        result = streaming.execute(select(*(column for column, _ in observed)))
+        for rows in result.partitions():
+            for row in rows:
+                for value, (_, format) in zip(row, observed):
+                    format.observe(value)
+
+    return _write_rows(file, connection, select(selected), formats, batch_size)
+
+
+def _deck_queries(deck_ids: Select) -> dict[str, Callable[[Table], Select]]:
+    """
+    Returns the queries that select the rows of each table that belong to
+    the decks of `deck_ids`. Parents outside of the selection are cleared,
+    so that the exported decks can be imported on their own.
+    """
+
+    def decks(table: Table) -> Select:
+        columns = [
+            case((column.in_(deck_ids), column)).label(column.name)
+            if column.name == "parent_id"
+            else column
+            for column in table.columns
+        ]
+        return select(*columns).where(table.c.id.in_(deck_ids))
+
+    def by_deck(table: Table) -> Select:
+        return select(table).where(table.c.deck_id.in_(deck_ids))
+
+    return {"decks": decks, "flashcards": by_deck, "reviews": by_deck}
+
+
+def export_tables(
+    connection: Connection,
+    zipf: zipfile.ZipFile,
+    tables: Iterable[str] = EXPORT_TABLES,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    deck_ids: Select | None = None,
+) -> ExportStats:
+    """
+    Writes each table to a `<table>.csv` entry of `zipf`, streaming the rows
+    straight into the archive. If `deck_ids` is given, only the decks it
+    selects, and their flashcards and reviews, are read.
+    """
+
+    stats = ExportStats()
+    queries = _deck_queries(deck_ids) if deck_ids is not None else {}
+
+    for name in tables:
+        with (
+            zipf.open(f"{name}.csv", "w") as entry,
+            io.TextIOWrapper(entry, encoding="utf-8", newline="") as file,
+        ):
+            stats.tables[name] = export_table(
+                connection, name, file, batch_size, queries.get(name)
+            )
+
+    stats.finished_at = perf_counter()
+    return stats
+
+
+def export_flashcards(
+    connection: Connection,
+    file: io.TextIOBase,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    deck_ids: Select | None = None,
+) -> int:
+    """
+    Writes the flashcards, as front, back, reversible and deck, in the layout
+    `memotica import flashcards` reads. If `deck_ids` is given, only the
+    flashcards of the decks it selects are read.
+
+    :return int: the number of flashcards written.
+    """
+
+    stmt = select(
+        Flashcard.front,
+        Flashcard.back,
+        # Written as 1 and 0, like the previous exports did.
+        type_coerce(Flashcard.reversible, Integer).label("reversible"),
+        Deck.name.label("deck"),
+    ).outerjoin(Deck, Flashcard.deck_id == Deck.id)
+    if deck_ids is not None:
+        stmt = stmt.where(Flashcard.deck_id.in_(deck_ids))
+
+    formats = [_Format() for _ in stmt.selected_columns]
+    return _write_rows(file, connection, stmt, formats, batch_size)
@@ -1,15 +1,51 @@
 from textwrap import shorten
+from typing import Sequence
 from rich.text import Text
+from sqlalchemy import Row
 from textual.binding import Binding
+from textual.coordinate import Coordinate
 from textual.widgets import DataTable
-from memotica.messages import AddFlashcard, DeleteFlashcard, EditFlashcard
-from memotica.models import Flashcard
+from memotica.messages import (
+    AddFlashcard,
+    DeleteFlashcard,
+    EditFlashcard,
+    LoadFlashcards,
+)
+from memotica.repositories import flashcard_row_cursor
 
 
 class FlashcardsTable(DataTable):
+    """
+    A table that only holds a window of `WINDOW_SIZE` flashcards at a time.
+
+    When the cursor gets close to one of the edges of the window, the table
+    asks for the window around it with a `LoadFlashcards` message and the
+    app answers by calling `show_window`. Windows are asked for by the
+    cursor of a row at their edge rather than by offset, so scrolling deep
+    into a large selection costs the same as scrolling near its start. Changes to single flashcards are
+    applied to the window in place with `insert_flashcards`,
+    `update_flashcards` and `remove_flashcards`.
+    """
+
+    WINDOW_SIZE = 200
+    WINDOW_MARGIN = 10
+    COLUMNS = ("front", "back", "reversible", "deck")
+
     def __init__(self, *args, **kwargs):
         super().__init__(cursor_type="row", zebra_stripes=True, *args, **kwargs)
 
+        self.window_start = 0
+        self.total = 0
+        self.order_by: str | None = None
+        self.descending = False
+        self.search: str | None = None
+        self.pending_window = False
+        self.pending_cursor_id: int | None = None
+        # The deck of the flashcard of each row, by flashcard id.
+        self.row_decks: dict[int, int] = {}
+        # The cursor of the sort key of each row, by flashcard id.
+        self.row_cursors: dict[int, str] = {}
+
     BINDINGS = [
         Binding("backspace", "delete", "Delete", priority=True),
         Binding("ctrl+e", "edit", "Edit", priority=True),
@@ -18,43 +54,207 @@ class FlashcardsTable(DataTable):
     ]
 
     def on_mount(self) -> None:
-        self.add_columns("Front", "Back", "Reversible", "Deck")
+        for column in self.COLUMNS:
+            self.add_column(column.capitalize(), key=column)
         self.border_title = "Flashcards"
 
     def add_flashcard(self):
         self.post_message(AddFlashcard())
 
     def action_edit(self) -> None:
+        if not self.row_count:
+            return
+
         row_key, _ = self.coordinate_to_cell_key(self.cursor_coordinate)
         flashcard_id = int(row_key.value)
         self.post_message(EditFlashcard(flashcard_id))
 
     def action_delete(self) -> None:
+        if not self.row_count:
+            return
+
         row_key, _ = self.coordinate_to_cell_key(self.cursor_coordinate)
         flashcard_id = int(row_key.value)
         self.post_message(DeleteFlashcard(flashcard_id))
 
-    def reload(self, flashcards: list[Flashcard] | None = None) -> None:
+    def on_data_table_header_selected(self, event: DataTable.HeaderSelected) -> None:
+        column = event.column_key.value
+        if column == self.order_by:
+            self.descending = not self.descending
+        else:
+            self.order_by = column
+            self.descending = False
+
+        self.reload()
+
+    def on_data_table_row_highlighted(self, event: DataTable.RowHighlighted) -> None:
+        # Highlights posted while the window was being replaced are stale.
+        if self.pending_window or event.cursor_row != self.cursor_row:
+            return
+
+        row = event.cursor_row
+        shift = min(self.WINDOW_SIZE // 2, self.row_count)
+        cursor_id = self.__row_id(row)
+
+        if row >= self.row_count - self.WINDOW_MARGIN and (
+            self.window_start + self.row_count < self.total
+        ):
+            self.load_window(
+                self.window_start + shift,
+                cursor_id,
+                after=self.row_cursors[self.__row_id(shift - 1)],
+            )
+        elif row < self.WINDOW_MARGIN and self.window_start > 0:
+            self.load_window(
+                self.window_start,
+                cursor_id,
+                before=self.row_cursors[self.__row_id(0)],
+            )
+
+    def reload(self) -> None:
+        """
+        Discards the current window and loads the first one again.
+        """
+
+        self.load_window(0, None)
+
+    def load_window(
+        self,
+        offset: int,
+        cursor_id: int | None,
+        after: str | None = None,
+        before: str | None = None,
+    ) -> None:
+        """
+        Asks for a window, see `LoadFlashcards`, keeping the cursor on the
+        flashcard of `cursor_id`, or on the first row if None.
+        """
+
+        self.pending_window = True
+        self.pending_cursor_id = cursor_id
+        self.post_message(
+            LoadFlashcards(
+                offset=offset,
+                limit=self.WINDOW_SIZE,
+                after=after,
+                before=before,
+                order_by=self.order_by,
+                descending=self.descending,
+                search=self.search,
+            )
+        )
+
+    def show_window(self, rows: list[Row], offset: int, total: int) -> None:
+        """
+        Replaces the rows of the table with `rows`, which start at `offset`
+        in a selection of `total` flashcards.
+        """
+
         self.loading = True
-        self.border_subtitle = None
         self.clear()
+        self.row_decks.clear()
+        self.row_cursors.clear()
 
-        if not flashcards:
-            self.loading = False
-            return
+        self.window_start = offset
+        self.total = total
+
+        for row in rows:
+            self.__add_flashcard_row(row)
 
-        for flashcard in flashcards:
-            self.add_row(
-                shorten(flashcard.front, width=40, placeholder="..."),
-                shorten(flashcard.back, width=40, placeholder="..."),
-                Text(
-                    str("✔" if flashcard.reversible else "✗"),
-                    style="bold",
-                    justify="center",
-                ),
-                flashcard.deck.name,
-                key=f"{flashcard.id}",
+        if rows:
+            ids = [row.id for row in rows]
+            cursor_row = (
+                ids.index(self.pending_cursor_id)
+                if self.pending_cursor_id in ids
+                else 0
             )
+            self.move_cursor(row=cursor_row, animate=False)
 
-        self.border_subtitle = f"{len(flashcards)}"
+        self.__update_total()
         self.loading = False
+        self.pending_window = False
+
+    def insert_flashcards(self, rows: list[Row]) -> None:
+        """
+        Counts new flashcards of the selection, and shows them if the window
+        reaches the end of the selection, where they are sorted by id.
+        """
+
+        for row in rows:
+            if self.window_start + self.row_count >= self.total:
+                self.__add_flashcard_row(row)
+            self.total += 1
+
+        self.__update_total()
+
+    def update_flashcards(self, ids: Sequence[int], rows: list[Row]) -> None:
+        """
+        Updates the rows of the window that show the flashcards of `ids` with
+        their new `rows`. Flashcards without a row left the selection, and
+        their rows are removed. Rows are not moved if their sort key changed.
+        """
+
+        rows_by_id = {row.id: row for row in rows}
+        for id in ids:
+            key = f"{id}"
+            if key not in self.rows:
+                continue
+
+            row = rows_by_id.get(id)
+            if row is None:
+                self.__remove_flashcard_row(id)
+                self.total -= 1
+                continue
+
+            for column, value in zip(self.COLUMNS, self.__cells(row)):
+                self.update_cell(key, column, value)
+            self.row_decks[id] = row.deck_id
+            self.row_cursors[id] = flashcard_row_cursor(row)
+
+        self.__update_total()
+
+    def remove_flashcards(self, ids: Sequence[int]) -> None:
+        """
+        Removes the rows of the window that show deleted flashcards.
+        """
+
+        for id in ids:
+            if f"{id}" in self.rows:
+                self.__remove_flashcard_row(id)
+                self.total -= 1
+
+        self.__update_total()
+
+    def rename_deck(self, deck_id: int, name: str) -> None:
+        for id, row_deck_id in self.row_decks.items():
+            if row_deck_id == deck_id:
+                self.update_cell(f"{id}", "deck", name)
+
+    def __cells(self, row: Row) -> tuple:
+        return (
+            shorten(row.front, width=40, placeholder="..."),
+            shorten(row.back, width=40, placeholder="..."),
+            Text(
+                str("✔" if row.reversible else "✗"),
+                style="bold",
+                justify="center",
+            ),
+            row.deck,
+        )
+
+    def __add_flashcard_row(self, row: Row) -> None:
+        self.add_row(*self.__cells(row), key=f"{row.id}")
+        self.row_decks[row.id] = row.deck_id
+        self.row_cursors[row.id] = flashcard_row_cursor(row)
+
+    def __remove_flashcard_row(self, id: int) -> None:
+        self.remove_row(f"{id}")
+        del self.row_decks[id]
+        del self.row_cursors[id]
+
+    def __row_id(self, row: int) -> int:
+        row_key, _ = self.coordinate_to_cell_key(Coordinate(row, 0))
+        return int(row_key.value)
+
+    def __update_total(self) -> None:
+        self.border_subtitle = f"{self.total}" if self.total else None
@@ -0,0 +1,228 @@
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+import numpy as np
+import numpy.typing as npt
+from sqlalchemy import Connection
+from sqlalchemy.orm import Session
+from memotica.sm2 import sm2_batch
+
+DEFAULT_DAYS = 30
+
+# The answers of the review screen and the quality each one stands for.
+ANSWER_QUALITIES = {"wrong": 0, "good": 3, "easy": 5}
+DEFAULT_ANSWERS = {"wrong": 0.15, "good": 0.6, "easy": 0.25}
+
+
+@dataclass
+class ReviewArrays:
+    """
+    The scheduling state of groups of reviews, one array per column.
+    `count` is how many reviews share each state, and is fractional once
+    the states are split between the possible answers by `simulate`.
+    """
+
+    due_in: npt.NDArray[np.int64]  # Days from today, negative when overdue.
+    repetitions: npt.NDArray[np.int64]
+    ef: npt.NDArray[np.float64]
+    interval: npt.NDArray[np.int64]
+    count: npt.NDArray[np.float64]
+
+    def __len__(self) -> int:
+        return len(self.due_in)
+
+    def select(self, mask: npt.NDArray) -> "ReviewArrays":
+        return ReviewArrays(
+            due_in=self.due_in[mask],
+            repetitions=self.repetitions[mask],
+            ef=self.ef[mask],
+            interval=self.interval[mask],
+            count=self.count[mask],
+        )
+
+    @classmethod
+    def concatenate(cls, arrays: list["ReviewArrays"]) -> "ReviewArrays":
+        return cls(
+            due_in=np.concatenate([a.due_in for a in arrays]),
+            repetitions=np.concatenate([a.repetitions for a in arrays]),
+            ef=np.concatenate([a.ef for a in arrays]),
+            interval=np.concatenate([a.interval for a in arrays]),
+            count=np.concatenate([a.count for a in arrays]),
+        )
+
+
+# The columns of `ReviewArrays`, in the order `load_review_arrays` reads them.
+REVIEW_ARRAYS_DTYPE = np.dtype(
+    [
+        ("due_in", np.int64),
+        ("repetitions", np.int64),
+        ("ef", np.float64),
+        ("interval", np.int64),
+        ("count", np.float64),
+    ]
+)
+
+
+def load_review_arrays(
+    session: Session | Connection,
+    deck_id: int | None = None,
+    days: int = DEFAULT_DAYS,
+    today: date | None = None,
+) -> ReviewArrays:
+    """
+    Loads the reviews of a deck and its sub-decks, or of every deck if
+    `deck_id` is None, that are due in the next `days` days. Reviews with
+    the same state are grouped by SQLite, so a collection with a million
+    reviews usually comes back as far fewer rows.
+
+    The due filter and the grouping both follow `ix_reviews_forecast`, and
+    the arrays are filled straight from the driver's cursor, since building
+    a row object per group costs more than the query itself.
+    """
+
+    today = today or datetime.now().date()
+    if isinstance(session, Session):
+        session = session.connection()
+
+    sql = """
+        SELECT
+            CAST(julianday(next_review) - julianday(:today) AS INTEGER),
+            repetitions,
+            ef,
+            interval,
+            count(*)
+        FROM reviews
+        WHERE next_review < :until
+    """
+    params = {
+        "today": today.isoformat(),
+        "until": (today + timedelta(days=days)).isoformat(),
+    }
+    if deck_id is not None:
+        sql += """
+        AND deck_id IN (
+            SELECT descendant_id FROM deck_closure WHERE ancestor_id = :deck_id
+        )
+        """
+        params["deck_id"] = deck_id
+    sql += "GROUP BY next_review, repetitions, ef, interval"
+
+    cursor = session.connection.cursor()
+    try:
+        cursor.execute(sql, params)
+        rows = np.fromiter(cursor, dtype=REVIEW_ARRAYS_DTYPE)
+    finally:
+        cursor.close()
+
+    return ReviewArrays(
+        due_in=rows["due_in"],
+        repetitions=rows["repetitions"],
+        ef=rows["ef"],
+        interval=rows["interval"],
+        count=rows["count"],
+    )
+
+
+def _merge(reviews: ReviewArrays) -> ReviewArrays:
+    """
+    Adds up the counts of the reviews that share a state.
+    """
+
+    if len(reviews) < 2:
+        return reviews
+
+    order = np.lexsort((reviews.interval, reviews.ef, reviews.repetitions))
+    sorted_reviews = reviews.select(order)
+
+    changes = (
+        (np.diff(sorted_reviews.repetitions) != 0)
+        | (np.diff(sorted_reviews.ef) != 0)
+        | (np.diff(sorted_reviews.interval) != 0)
+    )
+    starts = np.concatenate(([0], np.flatnonzero(changes) + 1))
+
+    merged = sorted_reviews.select(starts)
+    merged.count = np.add.reduceat(sorted_reviews.count, starts)
+
+    return merged
+
+
+def simulate(
+    reviews: ReviewArrays,
+    days: int = DEFAULT_DAYS,
+    answers: dict[str, float] = DEFAULT_ANSWERS,
+) -> npt.NDArray[np.float64]:
+    """
+    Computes how many reviews are expected to be due on each of the next
+    `days` days, starting today, if every due review is answered on its
+    day. Overdue reviews count as due today.
+
+    `answers` holds the weight of each answer of `ANSWER_QUALITIES`. Each
+    day, the reviews due that day are split between the answers by those
+    weights and rescheduled with `sm2_batch`, so the result is the exact
+    expectation rather than a random sample. Reviews that end up in the
+    same state are merged, which keeps the number of states small, and the
+    work is done one day at a time over arrays, never one card at a time.
+
+    :return: the expected number of due reviews of each day.
+    """
+
+    if days < 1:
+        raise ValueError("days must be positive")
+
+    unknown_answers = set(answers) - set(ANSWER_QUALITIES)
+    if unknown_answers:
+        raise ValueError(f"Unknown answers: {', '.join(sorted(unknown_answers))}")
+
+    weights = np.array(list(answers.values()), dtype=np.float64)
+    if (weights < 0).any() or weights.sum() <= 0:
+        raise ValueError("Answer weights must be positive")
+
+    qualities = np.array([ANSWER_QUALITIES[answer] for answer in answers])
+    probabilities = weights / weights.sum()
+
+    totals = np.zeros(days, dtype=np.float64)
+    buckets: list[list[ReviewArrays]] = [[] for _ in range(days)]
+
+    def schedule(reviews: ReviewArrays) -> None:
+        reviews = reviews.select(reviews.due_in < days)
+        order = np.argsort(reviews.due_in, kind="stable")
+        reviews = reviews.select(order)
+
+        due_days, starts = np.unique(reviews.due_in, return_index=True)
+        ends = np.append(starts[1:], len(reviews))
+        for day, start, end in zip(due_days.tolist(), starts, ends):
+            buckets[day].append(reviews.select(slice(start, end)))
+
+    overdue = reviews.select(slice(None))
+    overdue.due_in = np.maximum(reviews.due_in, 0)
+    schedule(overdue)
+
+    for day in range(days):
+        if not buckets[day]:
+            continue
+
+        due = _merge(ReviewArrays.concatenate(buckets[day]))
+        buckets[day] = []
+        totals[day] = due.count.sum()
+
+        size = len(due)
+        q = np.repeat(qualities, size)
+        repetitions, ef, interval = sm2_batch(
+            np.tile(due.repetitions, len(qualities)),
+            np.tile(due.ef, len(qualities)),
+            np.tile(due.interval, len(qualities)),
+            q,
+        )
+
+        schedule(
+            ReviewArrays(
+                due_in=day + interval,
+                repetitions=repetitions,
+                ef=ef,
+                interval=interval,
+                count=np.tile(due.count, len(qualities))
+                * np.repeat(probabilities, size),
+            )
+        )
+
+    return totals
@@ -1,5 +1,7 @@
 from datetime import datetime, timedelta
 from textual.message import Message
+from memotica.changes import Change
+from memotica.models import utcnow
 
 
 class AddDeck(Message):
@@ -7,9 +9,9 @@ class AddDeck(Message):
 
 
 class SelectDeck(Message):
-    def __init__(self, deck_name: str | None = None) -> None:
+    def __init__(self, deck_id: int | None = None) -> None:
         super().__init__()
-        self.deck_name = deck_name
+        self.deck_id = deck_id
 
 
 class EditDeck(Message):
@@ -24,6 +26,34 @@ class AddFlashcard(Message):
     pass
 
 
+class LoadFlashcards(Message):
+    """
+    Asks for the window of `limit` flashcards that starts right after the
+    row of the `after` cursor, the one that starts `limit // 2` rows before
+    the row of the `before` cursor, or the first one. `offset` is the
+    position of the row after `after`, or of the row of `before`.
+    """
+
+    def __init__(
+        self,
+        offset: int = 0,
+        limit: int = 200,
+        after: str | None = None,
+        before: str | None = None,
+        order_by: str | None = None,
+        descending: bool = False,
+        search: str | None = None,
+    ) -> None:
+        super().__init__()
+        self.offset = offset
+        self.limit = limit
+        self.after = after
+        self.before = before
+        self.order_by = order_by
+        self.descending = descending
+        self.search = search
+
+
 class EditFlashcard(Message):
     def __init__(self, flashcard_id: int) -> None:
         super().__init__()
@@ -36,6 +66,16 @@ class DeleteFlashcard(Message):
         self.flashcard_id = flashcard_id
 
 
+class DataChanged(Message):
+    def __init__(self, change: Change) -> None:
+        super().__init__()
+        self.change = change
+
+
+class FinishReview(Message):
+    pass
+
+
 class UpdateReview(Message):
     def __init__(
         self,
@@ -50,7 +90,5 @@ class UpdateReview(Message):
         self.ef = ef
         self.interval = interval
 
-        now = datetime.now()
-
-        self.next_review = now.date() + timedelta(days=interval)
-        self.last_updated_at = now
+        self.next_review = datetime.now().date() + timedelta(days=interval)
+        self.last_updated_at = utcnow()
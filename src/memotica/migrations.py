@@ -0,0 +1,298 @@
+from typing import Callable
+from sqlalchemy import Connection, Engine, text
+from memotica.models import (
+    FLASHCARDS_FTS_DDL,
+    REVIEWS_DECK_ID_TRIGGERS,
+    TOMBSTONE_TRIGGERS,
+    Base,
+    utcnow,
+)
+from memotica.repositories import (
+    assign_sync_ids,
+    rebuild_content_hashes,
+    rebuild_deck_closure,
+    rebuild_deck_statistics,
+)
+
+# Called before each migration with the number of migrations already applied,
+# the number to apply and the description of the one about to run.
+MigrationProgress = Callable[[int, int, str], None]
+
+
+def _columns(connection: Connection, table_name: str) -> set[str]:
+    return {
+        row.name for row in connection.execute(text(f"PRAGMA table_info({table_name})"))
+    }
+
+
+# Databases created before migrations existed all have version 0, whatever
+# memotica version created them, so the first migrations check what they
+# add before adding it. Later ones can assume the ones before them ran.
+
+
+def create_missing_tables(connection: Connection) -> None:
+    """
+    Create the tables and triggers added by older versions of memotica.
+    """
+
+    Base.metadata.create_all(connection)
+
+
+def add_reviews_deck_id(connection: Connection) -> None:
+    """
+    Copy each flashcard's deck to its reviews.
+    """
+
+    if "deck_id" not in _columns(connection, "reviews"):
+        connection.execute(
+            text("ALTER TABLE reviews ADD COLUMN deck_id INTEGER REFERENCES decks (id)")
+        )
+        connection.execute(
+            text("""
+            UPDATE reviews
+            SET deck_id = (
+                SELECT deck_id FROM flashcards WHERE flashcards.id = reviews.flashcard_id
+            )
+            """)
+        )
+
+    for trigger in REVIEWS_DECK_ID_TRIGGERS:
+        connection.execute(text(trigger))
+
+
+def add_reviews_due_index(connection: Connection) -> None:
+    """
+    Index the reviews by deck and due date.
+    """
+
+    connection.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_reviews_due "
+            "ON reviews (deck_id, ef, interval, next_review)"
+        )
+    )
+
+
+def add_flashcards_content_hash(connection: Connection) -> None:
+    """
+    Hash the content of the flashcards to find duplicates.
+    """
+
+    if "content_hash" not in _columns(connection, "flashcards"):
+        connection.execute(
+            text("ALTER TABLE flashcards ADD COLUMN content_hash VARCHAR(32)")
+        )
+        rebuild_content_hashes(connection)
+
+    connection.execute(
+        text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ux_flashcards_content "
+            "ON flashcards (deck_id, content_hash)"
+        )
+    )
+
+
+def build_deck_closure(connection: Connection) -> None:
+    """
+    Build the closure table of the deck hierarchy.
+    """
+
+    rebuild_deck_closure(connection)
+
+
+def build_deck_statistics(connection: Connection) -> None:
+    """
+    Count the flashcards and reviews of each deck.
+    """
+
+    # Rebuilt even when not empty: the triggers already counted the reviews
+    # whose deck was filled in by `add_reviews_deck_id`, but not their flashcards.
+    rebuild_deck_statistics(connection)
+
+
+def add_flashcards_fts(connection: Connection) -> None:
+    """
+    Index the flashcards for full-text search.
+    """
+
+    fts_missing = connection.execute(
+        text(
+            "SELECT NOT EXISTS "
+            "(SELECT 1 FROM sqlite_master WHERE name = 'flashcards_fts')"
+        )
+    ).scalar()
+    for statement in FLASHCARDS_FTS_DDL:
+        connection.execute(text(statement))
+    if fts_missing:
+        connection.execute(
+            text("INSERT INTO flashcards_fts (flashcards_fts) VALUES ('rebuild')")
+        )
+
+
+def add_sync_ids(connection: Connection) -> None:
+    """
+    Give the decks, flashcards and reviews the ids they are synced by.
+    """
+
+    if "last_updated_at" not in _columns(connection, "decks"):
+        connection.execute(
+            text("ALTER TABLE decks ADD COLUMN last_updated_at DATETIME")
+        )
+        connection.execute(
+            text("UPDATE decks SET last_updated_at = :now"), {"now": utcnow()}
+        )
+
+    sync_ids_missing = False
+    for table_name in ("decks", "flashcards", "reviews"):
+        if "sync_id" not in _columns(connection, table_name):
+            connection.execute(
+                text(f"ALTER TABLE {table_name} ADD COLUMN sync_id VARCHAR(32)")
+            )
+            sync_ids_missing = True
+    if sync_ids_missing:
+        assign_sync_ids(connection)
+
+    for table_name in ("decks", "flashcards", "reviews"):
+        connection.execute(
+            text(
+                f"CREATE UNIQUE INDEX IF NOT EXISTS ux_{table_name}_sync_id "
+                f"ON {table_name} (sync_id)"
+            )
+        )
+
+
+def add_last_updated_at_indexes(connection: Connection) -> None:
+    """
+    Index the flashcards and reviews by their last change.
+    """
+
+    for table_name in ("flashcards", "reviews"):
+        connection.execute(
+            text(
+                f"CREATE INDEX IF NOT EXISTS ix_{table_name}_last_updated_at "
+                f"ON {table_name} (last_updated_at)"
+            )
+        )
+
+
+def add_tombstone_triggers(connection: Connection) -> None:
+    """
+    Record the deletions to sync.
+    """
+
+    for trigger in TOMBSTONE_TRIGGERS:
+        connection.execute(text(trigger))
+
+
+def add_received_at(connection: Connection) -> None:
+    """
+    Record when rows were received from other machines.
+    """
+
+    # `create_missing_tables` may have just created the tombstones with it.
+    for table_name in ("decks", "flashcards", "reviews", "tombstones"):
+        if "received_at" not in _columns(connection, table_name):
+            connection.execute(
+                text(f"ALTER TABLE {table_name} ADD COLUMN received_at DATETIME")
+            )
+
+    for table_name in ("flashcards", "reviews", "tombstones"):
+        connection.execute(
+            text(
+                f"CREATE INDEX IF NOT EXISTS ix_{table_name}_received_at "
+                f"ON {table_name} (received_at)"
+            )
+        )
+
+
+def add_reviews_forecast_index(connection: Connection) -> None:
+    """
+    Index the reviews by due date and state.
+    """
+
+    connection.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_reviews_forecast "
+            "ON reviews (next_review, repetitions, ef, interval, deck_id)"
+        )
+    )
+
+
+# Applied in order: a database at version N has run the first N migrations.
+# New migrations are only ever appended.
+MIGRATIONS: tuple[Callable[[Connection], None], ...] = (
+    create_missing_tables,
+    add_reviews_deck_id,
+    add_reviews_due_index,
+    add_flashcards_content_hash,
+    build_deck_closure,
+    build_deck_statistics,
+    add_flashcards_fts,
+    add_sync_ids,
+    add_last_updated_at_indexes,
+    add_tombstone_triggers,
+    add_received_at,
+    add_reviews_forecast_index,
+)
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_schema_version(connection: Connection) -> int:
+    return connection.execute(text("PRAGMA user_version")).scalar()
+
+
+def _set_schema_version(connection: Connection, version: int) -> None:
+    # PRAGMA statements do not take bound parameters.
+    connection.execute(text(f"PRAGMA user_version = {version:d}"))
+
+
+def migrate(engine: Engine, on_progress: MigrationProgress | None = None) -> int:
+    """
+    Brings the database up to `SCHEMA_VERSION` and returns the number of
+    migrations applied. Up-to-date databases only cost reading their version.
+
+    New databases are created from the models directly. Otherwise the pending
+    migrations run in a single transaction, so a failed upgrade leaves the
+    database as it was.
+    """
+
+    with engine.connect() as connection:
+        if get_schema_version(connection) == SCHEMA_VERSION:
+            return 0
+
+    with engine.connect() as connection:
+        # The sqlite3 driver does not open transactions before DDL, so one
+        # is opened explicitly. It is IMMEDIATE so that two processes
+        # starting together do not both migrate.
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            version = get_schema_version(connection)
+            if version > SCHEMA_VERSION:
+                raise ValueError(
+                    f"The database is at version {version}, which is newer than "
+                    f"this version of memotica supports ({SCHEMA_VERSION})."
+                )
+
+            has_tables = connection.execute(
+                text("SELECT EXISTS (SELECT 1 FROM sqlite_master WHERE type = 'table')")
+            ).scalar()
+            if not has_tables:
+                Base.metadata.create_all(connection)
+                _set_schema_version(connection, SCHEMA_VERSION)
+                connection.commit()
+                return 0
+
+            pending = MIGRATIONS[version:]
+            for applied, migration in enumerate(pending):
+                if on_progress is not None:
+                    on_progress(applied, len(pending), migration.__doc__.strip())
+                migration(connection)
+                _set_schema_version(connection, version + applied + 1)
+
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            raise
+
+    return len(pending)
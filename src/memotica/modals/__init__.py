@@ -2,3 +2,4 @@ from .deck_modal import DeckModal  # noqa: F401
 from .flashcard_modal import FlashcardModal  # noqa: F401
 from .help_modal import HelpModal  # noqa: F401
 from .confirm_modal import ConfirmationModal  # noqa: F401
+from .forecast_modal import ForecastModal  # noqa: F401
@@ -4,6 +4,7 @@ from textual.screen import ModalScreen
 from textual.validation import Function
 from textual.containers import VerticalScroll
 from textual.widgets import Input, Select
+from memotica.deck_index import DeckIndex
 from memotica.models import Deck
 
 
@@ -19,25 +20,23 @@ class DeckModal(ModalScreen[Deck]):
 
     def __init__(
         self,
-        decks: list[Deck] = [],
+        deck_index: DeckIndex,
         deck: Deck | None = None,
         *args,
         **kwargs,
     ):
         super().__init__(*args, **kwargs)
 
-        self.decks = decks
+        self.decks = list(deck_index)
         self.deck = deck
 
-        self.available_decks = (
-            decks
-            if self.deck is None
-            else [deck for deck in self.decks if deck.id != self.deck.id]
-        )
-        self.decks_names = []
+        # A deck can't be moved into itself or into one of its sub-decks.
+        excluded_ids = deck_index.descendants(self.deck.id) if self.deck else set()
 
-        if self.available_decks:
-            self.decks_names = [deck.name for deck in self.available_decks]
+        self.available_decks = [
+            deck for deck in self.decks if deck.id not in excluded_ids
+        ]
+        self.decks_names = {deck.name for deck in self.decks}
 
     def compose(self) -> ComposeResult:
         with VerticalScroll(classes="modal modal--deck"):
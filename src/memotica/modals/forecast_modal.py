@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+import numpy as np
+import numpy.typing as npt
+from textual import events
+from textual.app import ComposeResult
+from textual.containers import VerticalScroll
+from textual.screen import ModalScreen
+from textual.widgets import Static
+
+BAR_WIDTH = 40
+
+
+class ForecastModal(ModalScreen):
+    """
+    Shows the expected number of due reviews of each of the next days.
+    """
+
+    def __init__(self, title: str, due: npt.NDArray[np.float64], *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.title = title
+        self.due = due
+
+    def compose(self) -> ComposeResult:
+        today = datetime.now().date()
+        highest = max(self.due.max(initial=0), 1)
+
+        lines = []
+        for day, count in enumerate(self.due):
+            bar = "█" * round(count / highest * BAR_WIDTH)
+            lines.append(f"{today + timedelta(days=day):%a %d %b} {count:>8.0f} {bar}")
+
+        with VerticalScroll(classes="modal modal--forecast"):
+            yield Static("\n".join(lines))
+
+    def on_mount(self) -> None:
+        self.body = self.query_one(".modal")
+        self.body.border_title = self.title
+        self.body.border_subtitle = f"{self.due.sum():.0f} reviews"
+
+    def on_key(self, event: events.Key) -> None:
+        event.stop()
+
+        if event.key == "up":
+            self.body.scroll_up()
+        elif event.key == "down":
+            self.body.scroll_down()
+        elif event.key == "pageup":
+            self.body.scroll_page_up()
+        elif event.key == "pagedown":
+            self.body.scroll_page_down()
+        else:
+            self.app.pop_screen()
@@ -1,6 +1,23 @@
+import hashlib
+import unicodedata
+import uuid
 from datetime import datetime, date, timezone
 from typing import List
-from sqlalchemy import Date, DateTime, Float, ForeignKey, Integer, String, Boolean
+from sqlalchemy import (
+    DDL,
+    Boolean,
+    Date,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    column,
+    event,
+    inspect,
+    table,
+)
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 
@@ -8,11 +25,38 @@ class Base(DeclarativeBase):
     pass
 
 
+def utcnow() -> datetime:
+    """
+    The time stored in the timestamp columns, which hold UTC times without
+    a time zone so that they compare across machines.
+    """
+
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def new_sync_id() -> str:
+    return uuid.uuid4().hex
+
+
+# The same kind of id as `new_sync_id`, for rows inserted with plain SQL.
+NEW_SYNC_ID_SQL = "lower(hex(randomblob(16)))"
+
+
 class Deck(Base):
     __tablename__ = "decks"
+    __table_args__ = (Index("ux_decks_sync_id", "sync_id", unique=True),)
 
     id: Mapped[int] = mapped_column(primary_key=True)
+    # Identifies the deck across the machines a collection is synced between.
+    sync_id: Mapped[str | None] = mapped_column(String(32), default=new_sync_id)
     name: Mapped[str] = mapped_column(String(50))
+    last_updated_at: Mapped[datetime | None] = mapped_column(
+        DateTime, default=utcnow, onupdate=utcnow
+    )
+    # When `apply_changeset` last wrote the deck. Its `last_updated_at` then
+    # comes from the other machine, so changesets read both columns to pass
+    # the deck on to the other peers.
+    received_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
 
     parent_id: Mapped[int] = mapped_column(
         Integer, ForeignKey("decks.id"), nullable=True
@@ -29,21 +73,46 @@ class Deck(Base):
         return f"Deck(id={self.id!r}, name={self.name!r}, parent={self.parent!r})"
 
 
+def content_hash(front: str, back: str) -> str:
+    """
+    Hashes the text of a flashcard, ignoring case, Unicode normalization and
+    whitespace, so that the same flashcard typed or exported slightly
+    differently gets the same hash.
+    """
+
+    def normalize(text: str) -> str:
+        return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+    content = f"{normalize(front)}\x1f{normalize(back)}"
+    return hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
+
+
 class Flashcard(Base):
     __tablename__ = "flashcards"
+    __table_args__ = (
+        # A deck cannot hold the same flashcard twice. Flashcards that were
+        # deliberately kept as duplicates have no hash.
+        Index("ux_flashcards_content", "deck_id", "content_hash", unique=True),
+        Index("ux_flashcards_sync_id", "sync_id", unique=True),
+        # Serves the changesets, which read the rows changed since a time.
+        Index("ix_flashcards_last_updated_at", "last_updated_at"),
+        Index("ix_flashcards_received_at", "received_at"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
+    sync_id: Mapped[str | None] = mapped_column(String(32), default=new_sync_id)
 
     front: Mapped[str]
     back: Mapped[str]
     reversible: Mapped[bool] = mapped_column(Boolean(), default=False)
+    content_hash: Mapped[str | None] = mapped_column(String(32), nullable=True)
 
-    created_at: Mapped[datetime] = mapped_column(
-        DateTime, default=datetime.now(timezone.utc)
-    )
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow)
     last_updated_at: Mapped[datetime] = mapped_column(
-        DateTime, default=datetime.now(timezone.utc)
+        DateTime, default=utcnow, onupdate=utcnow
     )
+    # See `Deck.received_at`.
+    received_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
 
     deck_id: Mapped[int] = mapped_column(ForeignKey("decks.id"), index=True)
     deck: Mapped["Deck"] = relationship(back_populates="flashcards")
@@ -56,28 +125,426 @@ class Flashcard(Base):
         return f"Flashcard(id={self.id!r}, front={self.front!r}, back={self.back!r}, reversible={self.reversible!r})"
 
 
+@event.listens_for(Flashcard, "before_insert")
+def set_content_hash(_mapper, _connection, flashcard: Flashcard) -> None:
+    flashcard.content_hash = content_hash(flashcard.front, flashcard.back)
+
+
+@event.listens_for(Flashcard, "before_update")
+def update_content_hash(_mapper, _connection, flashcard: Flashcard) -> None:
+    state = inspect(flashcard)
+    if (
+        state.attrs.front.history.has_changes()
+        or state.attrs.back.history.has_changes()
+    ):
+        flashcard.content_hash = content_hash(flashcard.front, flashcard.back)
+
+
 class Review(Base):
     __tablename__ = "reviews"
+    __table_args__ = (
+        # Serves the due queue: the deck filter is an index seek, the due
+        # filter is checked on the index entries and the rows come out in
+        # review order, so no temporary B-tree is needed to sort them.
+        Index("ix_reviews_due", "deck_id", "ef", "interval", "next_review"),
+        # Serves the forecast: the due filter is a range of the index and the
+        # reviews are grouped by state in index order, without a table lookup.
+        Index(
+            "ix_reviews_forecast",
+            "next_review",
+            "repetitions",
+            "ef",
+            "interval",
+            "deck_id",
+        ),
+        Index("ux_reviews_sync_id", "sync_id", unique=True),
+        Index("ix_reviews_last_updated_at", "last_updated_at"),
+        Index("ix_reviews_received_at", "received_at"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
+    sync_id: Mapped[str | None] = mapped_column(String(32), default=new_sync_id)
 
     ef: Mapped[float] = mapped_column(Float, default=2.5)
     interval: Mapped[int] = mapped_column(Integer, default=1)
     repetitions: Mapped[int] = mapped_column(Integer, default=0)
-    next_review: Mapped[date] = mapped_column(
-        Date, default=datetime.now(timezone.utc).date()
-    )
+    next_review: Mapped[date] = mapped_column(Date, default=date.today)
     reversed: Mapped[bool] = mapped_column(Boolean(), default=False)
 
-    created_at: Mapped[datetime] = mapped_column(
-        DateTime, default=datetime.now(timezone.utc)
-    )
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow)
     last_updated_at: Mapped[datetime] = mapped_column(
-        DateTime, default=datetime.now(timezone.utc)
+        DateTime, default=utcnow, onupdate=utcnow
     )
+    # See `Deck.received_at`.
+    received_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
 
     flashcard_id: Mapped[int] = mapped_column(ForeignKey("flashcards.id"), index=True)
     flashcard: Mapped["Flashcard"] = relationship(back_populates="reviews")
 
+    # Denormalized copy of `flashcards.deck_id`, kept in sync by the triggers
+    # below, so that the due queue can be read from a single index.
+    deck_id: Mapped[int | None] = mapped_column(ForeignKey("decks.id"), nullable=True)
+
     def __repr__(self) -> str:
         return f"Review(id={self.id!r}, ef={self.ef!r}, interval={self.interval!r}, repetitions={self.repetitions!r}, next_review={self.next_review!r}, reversed={self.reversed!r})"
+
+
+class DeckClosure(Base):
+    """
+    Every (ancestor, descendant) pair of the deck hierarchy, including each
+    deck paired with itself at depth 0. Maintained by the triggers in
+    `DECK_CLOSURE_TRIGGERS`.
+    """
+
+    __tablename__ = "deck_closure"
+    __table_args__ = (
+        Index("ix_deck_closure_descendant", "descendant_id", "ancestor_id"),
+    )
+
+    ancestor_id: Mapped[int] = mapped_column(ForeignKey("decks.id"), primary_key=True)
+    descendant_id: Mapped[int] = mapped_column(ForeignKey("decks.id"), primary_key=True)
+    depth: Mapped[int] = mapped_column(Integer)
+
+    def __repr__(self) -> str:
+        return f"DeckClosure(ancestor_id={self.ancestor_id!r}, descendant_id={self.descendant_id!r}, depth={self.depth!r})"
+
+
+class DeckStatistics(Base):
+    """
+    Counters of the flashcards and reviews that belong directly to a deck,
+    maintained by the triggers in `DECK_STATISTICS_TRIGGERS`.
+    """
+
+    __tablename__ = "deck_statistics"
+
+    deck_id: Mapped[int] = mapped_column(ForeignKey("decks.id"), primary_key=True)
+    flashcards: Mapped[int] = mapped_column(Integer, default=0)
+    reviews: Mapped[int] = mapped_column(Integer, default=0)
+    # Easiness factors have two decimals, so their sum is kept in hundredths
+    # to avoid accumulating floating point errors.
+    ef_sum: Mapped[int] = mapped_column(Integer, default=0)
+
+    def __repr__(self) -> str:
+        return f"DeckStatistics(deck_id={self.deck_id!r}, flashcards={self.flashcards!r}, reviews={self.reviews!r}, ef_sum={self.ef_sum!r})"
+
+
+class DeckReviewSchedule(Base):
+    """
+    Number of reviews of a deck that are scheduled for a given day.
+    """
+
+    __tablename__ = "deck_review_schedule"
+
+    deck_id: Mapped[int] = mapped_column(ForeignKey("decks.id"), primary_key=True)
+    next_review: Mapped[date] = mapped_column(Date, primary_key=True)
+    reviews: Mapped[int] = mapped_column(Integer, default=0)
+
+    def __repr__(self) -> str:
+        return f"DeckReviewSchedule(deck_id={self.deck_id!r}, next_review={self.next_review!r}, reviews={self.reviews!r})"
+
+
+class Tombstone(Base):
+    """
+    A deleted deck, flashcard or review, kept so that syncing can delete it
+    on the other machines. Written by the triggers in `TOMBSTONE_TRIGGERS`.
+    """
+
+    __tablename__ = "tombstones"
+    __table_args__ = (
+        Index("ix_tombstones_deleted_at", "deleted_at"),
+        Index("ix_tombstones_received_at", "received_at"),
+    )
+
+    table_name: Mapped[str] = mapped_column(String(20), primary_key=True)
+    sync_id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    deleted_at: Mapped[datetime] = mapped_column(DateTime)
+    # See `Deck.received_at`.
+    received_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+    def __repr__(self) -> str:
+        return f"Tombstone(table_name={self.table_name!r}, sync_id={self.sync_id!r}, deleted_at={self.deleted_at!r})"
+
+
+class SyncWatermark(Base):
+    """
+    Until when the changes of the collection were exported to a peer.
+    """
+
+    __tablename__ = "sync_watermarks"
+
+    peer: Mapped[str] = mapped_column(String(50), primary_key=True)
+    exported_until: Mapped[datetime] = mapped_column(DateTime)
+
+    def __repr__(self) -> str:
+        return (
+            f"SyncWatermark(peer={self.peer!r}, exported_until={self.exported_until!r})"
+        )
+
+
+REVIEWS_DECK_ID_TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS reviews_set_deck_id
+    AFTER INSERT ON reviews
+    WHEN NEW.deck_id IS NULL
+    BEGIN
+        UPDATE reviews
+        SET deck_id = (SELECT deck_id FROM flashcards WHERE id = NEW.flashcard_id)
+        WHERE id = NEW.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS reviews_update_deck_id
+    AFTER UPDATE OF flashcard_id ON reviews
+    BEGIN
+        UPDATE reviews
+        SET deck_id = (SELECT deck_id FROM flashcards WHERE id = NEW.flashcard_id)
+        WHERE id = NEW.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS flashcards_update_reviews_deck_id
+    AFTER UPDATE OF deck_id ON flashcards
+    BEGIN
+        UPDATE reviews SET deck_id = NEW.deck_id WHERE flashcard_id = NEW.id;
+    END
+    """,
+)
+
+for trigger in REVIEWS_DECK_ID_TRIGGERS:
+    event.listen(Review.__table__, "after_create", DDL(trigger))
+
+
+DECK_CLOSURE_TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS decks_insert_closure
+    AFTER INSERT ON decks
+    BEGIN
+        INSERT INTO deck_closure (ancestor_id, descendant_id, depth)
+        VALUES (NEW.id, NEW.id, 0);
+
+        INSERT INTO deck_closure (ancestor_id, descendant_id, depth)
+        SELECT ancestor_id, NEW.id, depth + 1
+        FROM deck_closure
+        WHERE descendant_id = NEW.parent_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS decks_check_closure
+    BEFORE UPDATE OF parent_id ON decks
+    WHEN NEW.parent_id IN (
+        SELECT descendant_id FROM deck_closure WHERE ancestor_id = NEW.id
+    )
+    BEGIN
+        SELECT RAISE(ABORT, 'A deck cannot be moved into one of its sub-decks');
+    END
+    """,
+    # Moving a deck detaches its whole subtree from the old ancestors and
+    # attaches it to the new ones.
+    """
+    CREATE TRIGGER IF NOT EXISTS decks_move_closure
+    AFTER UPDATE OF parent_id ON decks
+    WHEN OLD.parent_id IS NOT NEW.parent_id
+    BEGIN
+        DELETE FROM deck_closure
+        WHERE descendant_id IN (
+            SELECT descendant_id FROM deck_closure WHERE ancestor_id = NEW.id
+        )
+        AND ancestor_id IN (
+            SELECT ancestor_id FROM deck_closure
+            WHERE descendant_id = NEW.id AND ancestor_id != NEW.id
+        );
+
+        INSERT INTO deck_closure (ancestor_id, descendant_id, depth)
+        SELECT ancestors.ancestor_id, subtree.descendant_id, ancestors.depth + subtree.depth + 1
+        FROM deck_closure AS ancestors, deck_closure AS subtree
+        WHERE ancestors.descendant_id = NEW.parent_id AND subtree.ancestor_id = NEW.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS decks_delete_closure
+    BEFORE DELETE ON decks
+    BEGIN
+        DELETE FROM deck_closure
+        WHERE descendant_id = OLD.id OR ancestor_id = OLD.id;
+    END
+    """,
+)
+
+for trigger in DECK_CLOSURE_TRIGGERS:
+    event.listen(Base.metadata, "after_create", DDL(trigger))
+
+
+# The deletion time is written like SQLAlchemy writes `utcnow()`, with
+# microseconds, so that it compares with the other timestamps as text.
+TOMBSTONE_TRIGGERS = tuple(
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {table_name}_insert_tombstone
+    AFTER DELETE ON {table_name}
+    WHEN OLD.sync_id IS NOT NULL
+    BEGIN
+        INSERT OR REPLACE INTO tombstones (table_name, sync_id, deleted_at)
+        VALUES (
+            '{table_name}',
+            OLD.sync_id,
+            strftime('%Y-%m-%d %H:%M:%f000', 'now')
+        );
+    END
+    """
+    for table_name in ("decks", "flashcards", "reviews")
+)
+
+for trigger in TOMBSTONE_TRIGGERS:
+    # DDL formats its statement with %, so the strftime format is escaped.
+    event.listen(Base.metadata, "after_create", DDL(trigger.replace("%", "%%")))
+
+
+def _add_review_sql(deck_id: str, review: str, sign: str) -> str:
+    return f"""
+        INSERT INTO deck_statistics (deck_id, flashcards, reviews, ef_sum)
+        VALUES ({deck_id}, 0, {sign}1, {sign}CAST(ROUND({review}.ef * 100) AS INTEGER))
+        ON CONFLICT (deck_id) DO UPDATE
+        SET reviews = reviews + excluded.reviews, ef_sum = ef_sum + excluded.ef_sum;
+
+        INSERT INTO deck_review_schedule (deck_id, next_review, reviews)
+        VALUES ({deck_id}, {review}.next_review, {sign}1)
+        ON CONFLICT (deck_id, next_review) DO UPDATE
+        SET reviews = reviews + excluded.reviews;
+    """
+
+
+def _add_flashcard_sql(deck_id: str, sign: str) -> str:
+    return f"""
+        INSERT INTO deck_statistics (deck_id, flashcards, reviews, ef_sum)
+        VALUES ({deck_id}, {sign}1, 0, 0)
+        ON CONFLICT (deck_id) DO UPDATE
+        SET flashcards = flashcards + excluded.flashcards;
+    """
+
+
+# Reviews are counted once their `deck_id` is known, which for most inserts
+# happens in the UPDATE issued by `reviews_set_deck_id`.
+DECK_STATISTICS_TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS decks_delete_statistics
+    BEFORE DELETE ON decks
+    BEGIN
+        DELETE FROM deck_statistics WHERE deck_id = OLD.id;
+        DELETE FROM deck_review_schedule WHERE deck_id = OLD.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS flashcards_insert_statistics
+    AFTER INSERT ON flashcards
+    BEGIN
+        {_add_flashcard_sql("NEW.deck_id", "+")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS flashcards_delete_statistics
+    AFTER DELETE ON flashcards
+    BEGIN
+        {_add_flashcard_sql("OLD.deck_id", "-")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS flashcards_move_statistics
+    AFTER UPDATE OF deck_id ON flashcards
+    WHEN OLD.deck_id IS NOT NEW.deck_id
+    BEGIN
+        {_add_flashcard_sql("OLD.deck_id", "-")}
+        {_add_flashcard_sql("NEW.deck_id", "+")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS reviews_insert_statistics
+    AFTER INSERT ON reviews
+    WHEN NEW.deck_id IS NOT NULL
+    BEGIN
+        {_add_review_sql("NEW.deck_id", "NEW", "+")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS reviews_delete_statistics
+    AFTER DELETE ON reviews
+    WHEN OLD.deck_id IS NOT NULL
+    BEGIN
+        {_add_review_sql("OLD.deck_id", "OLD", "-")}
+        DELETE FROM deck_review_schedule
+        WHERE deck_id = OLD.deck_id AND next_review = OLD.next_review AND reviews = 0;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS reviews_update_old_statistics
+    AFTER UPDATE OF deck_id, ef, next_review ON reviews
+    WHEN OLD.deck_id IS NOT NULL
+    BEGIN
+        {_add_review_sql("OLD.deck_id", "OLD", "-")}
+        DELETE FROM deck_review_schedule
+        WHERE deck_id = OLD.deck_id AND next_review = OLD.next_review AND reviews = 0;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS reviews_update_new_statistics
+    AFTER UPDATE OF deck_id, ef, next_review ON reviews
+    WHEN NEW.deck_id IS NOT NULL
+    BEGIN
+        {_add_review_sql("NEW.deck_id", "NEW", "+")}
+    END
+    """,
+)
+
+for trigger in DECK_STATISTICS_TRIGGERS:
+    event.listen(Base.metadata, "after_create", DDL(trigger))
+
+
+# External content FTS5 index over the front and back of the flashcards:
+# the text is only stored in `flashcards`, the index is kept in sync by the
+# triggers below.
+FLASHCARDS_FTS_DDL = (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS flashcards_fts USING fts5(
+        front,
+        back,
+        content = 'flashcards',
+        content_rowid = 'id',
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS flashcards_insert_fts
+    AFTER INSERT ON flashcards
+    BEGIN
+        INSERT INTO flashcards_fts (rowid, front, back)
+        VALUES (NEW.id, NEW.front, NEW.back);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS flashcards_delete_fts
+    AFTER DELETE ON flashcards
+    BEGIN
+        INSERT INTO flashcards_fts (flashcards_fts, rowid, front, back)
+        VALUES ('delete', OLD.id, OLD.front, OLD.back);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS flashcards_update_fts
+    AFTER UPDATE OF front, back ON flashcards
+    BEGIN
+        INSERT INTO flashcards_fts (flashcards_fts, rowid, front, back)
+        VALUES ('delete', OLD.id, OLD.front, OLD.back);
+
+        INSERT INTO flashcards_fts (rowid, front, back)
+        VALUES (NEW.id, NEW.front, NEW.back);
+    END
+    """,
+)
+
+for statement in FLASHCARDS_FTS_DDL:
+    event.listen(Flashcard.__table__, "after_create", DDL(statement))
+
+flashcards_fts = table(
+    "flashcards_fts",
+    column("rowid"),
+    column("rank", Float),
+    column("flashcards_fts"),
+)
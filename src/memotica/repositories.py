@@ -1,23 +1,270 @@
-from typing import TypeVar, Generic, Type, Union
-from datetime import datetime, timezone
-from functools import lru_cache
-from sqlalchemy.orm import Session, aliased
-from sqlalchemy import select, update, func
-from memotica.models import Deck, Flashcard, Review
+import base64
+import json
+from dataclasses import dataclass
+from typing import Iterator, Sequence, TypeVar, Generic, Type, Union
+from datetime import date, datetime
+from sqlalchemy.orm import (
+    InstrumentedAttribute,
+    Query,
+    Session,
+    joinedload,
+)
+from sqlalchemy import (
+    Connection,
+    Date,
+    DateTime,
+    Row,
+    Select,
+    and_,
+    bindparam,
+    delete,
+    func,
+    insert,
+    literal,
+    literal_column,
+    select,
+    text,
+    true,
+    tuple_,
+    union_all,
+    update,
+)
+from memotica.changes import Change, ChangeListener, Deleted, Inserted, Updated
+from memotica.deck_index import DeckIndex
+from memotica.models import (
+    NEW_SYNC_ID_SQL,
+    Deck,
+    DeckClosure,
+    DeckReviewSchedule,
+    DeckStatistics,
+    Flashcard,
+    Review,
+    content_hash,
+    flashcards_fts,
+    utcnow,
+)
 
 T = TypeVar("T", bound=Union[Deck, Flashcard, Review])
 
+PREVIEW_LENGTH = 200
+
+FLASHCARD_ROW_COLUMNS = {
+    "front": Flashcard.front,
+    "back": Flashcard.back,
+    "reversible": Flashcard.reversible,
+    "deck": Deck.name,
+}
+
+
+@dataclass
+class Page(Generic[T]):
+    """
+    A page of a keyset pagination. `next_cursor` is passed back to get the
+    following page and is None on the last one.
+    """
+
+    items: list[T]
+    next_cursor: str | None
+
+
+def encode_cursor(values: Sequence) -> str:
+    """
+    Encodes the sort key of the last item of a page into an opaque cursor.
+    """
+
+    payload = [
+        value.isoformat() if isinstance(value, date) else value for value in values
+    ]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def decode_cursor(cursor: str, columns: Sequence[InstrumentedAttribute]) -> list:
+    """
+    Decodes a cursor made by `encode_cursor` for a page sorted by `columns`.
+    """
+
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+
+    parsers = {date: date.fromisoformat, datetime: datetime.fromisoformat}
+    return [
+        parsers[column.type.python_type](value)
+        if column.type.python_type in parsers and value is not None
+        else value
+        for column, value in zip(columns, values)
+    ]
+
+
+def flashcard_row_cursor(row: Row) -> str:
+    """
+    Encodes the sort key of a row of `FlashcardRepository.get_rows_with_subdecks`
+    into a cursor for the rows after or before it.
+    """
+
+    if "sort_key" in row._fields:
+        return encode_cursor([row.sort_key, row.id])
+    return encode_cursor([row.id])
+
+
+def search_expression(search: str | None) -> str | None:
+    """
+    Turns what a user typed into an FTS5 query that matches the words that
+    start with each of the typed words, so that typing never results in a
+    syntax error.
+    """
+
+    if not search:
+        return None
+
+    terms = [term.replace('"', '""') for term in search.split()]
+    return " ".join(f'"{term}"*' for term in terms) or None
+
+
+def select_subdeck_ids(id: int) -> Select:
+    """
+    Returns a query for the id of a deck and the ids of all of its
+    sub-decks, at any depth.
+    """
+
+    return select(DeckClosure.descendant_id).where(DeckClosure.ancestor_id == id)
+
+
+def assign_sync_ids(connection: Session | Connection) -> int:
+    """
+    Gives a sync id to the decks, flashcards and reviews that have none,
+    such as those of databases and backups from before it existed.
+
+    :return int: the number of rows updated.
+    """
+
+    return sum(
+        connection.execute(
+            text(
+                f"UPDATE {table_name} SET sync_id = {NEW_SYNC_ID_SQL} "
+                "WHERE sync_id IS NULL"
+            )
+        ).rowcount
+        for table_name in ("decks", "flashcards", "reviews")
+    )
+
+
+def select_deck_ids_by_name(names: Sequence[str], subdecks: bool = False) -> Select:
+    """
+    Returns a query for the ids of the decks with the given names and, if
+    `subdecks` is set, of all of their sub-decks, at any depth.
+    """
+
+    deck_ids = select(Deck.id).where(Deck.name.in_(names))
+    if not subdecks:
+        return deck_ids
+
+    return select(DeckClosure.descendant_id).where(
+        DeckClosure.ancestor_id.in_(deck_ids)
+    )
+
+
+def rebuild_deck_closure(connection: Session | Connection) -> None:
+    """
+    Recomputes `deck_closure` from `decks.parent_id`.
+    """
+
+    connection.execute(text("DELETE FROM deck_closure"))
+    connection.execute(
+        text("""
+        INSERT INTO deck_closure (ancestor_id, descendant_id, depth)
+        WITH RECURSIVE closure (ancestor_id, descendant_id, depth) AS (
+            SELECT id, id, 0 FROM decks
+            UNION ALL
+            SELECT closure.ancestor_id, decks.id, closure.depth + 1
+            FROM closure
+            JOIN decks ON decks.parent_id = closure.descendant_id
+        )
+        SELECT ancestor_id, descendant_id, depth FROM closure
+        """)
+    )
+
+
+def rebuild_content_hashes(connection: Session | Connection) -> int:
+    """
+    Hashes the flashcards that have no content hash, such as those of
+    databases and backups from before it existed. When a deck holds the same
+    flashcard more than once, only the oldest one gets the hash.
+
+    The hashes are computed and deduplicated by SQLite, through the
+    `content_hash` function registered on the connection, so the flashcards
+    are never all loaded at once.
+
+    :return int: the number of flashcards hashed.
+    """
+
+    if isinstance(connection, Session):
+        connection = connection.connection()
+
+    unhashed = connection.execute(
+        text("SELECT EXISTS (SELECT 1 FROM flashcards WHERE content_hash IS NULL)")
+    ).scalar()
+    if not unhashed:
+        return 0
+
+    connection.connection.driver_connection.create_function(
+        "content_hash", 2, content_hash, deterministic=True
+    )
+    return connection.execute(
+        text("""
+        UPDATE flashcards SET content_hash = hashed.content_hash
+        FROM (
+            SELECT
+                id,
+                deck_id,
+                content_hash,
+                ROW_NUMBER() OVER (
+                    PARTITION BY deck_id, content_hash ORDER BY id
+                ) AS position
+            FROM (
+                SELECT id, deck_id, content_hash(front, back) AS content_hash
+                FROM flashcards
+                WHERE content_hash IS NULL
+            )
+        ) AS hashed
+        WHERE flashcards.id = hashed.id
+        AND hashed.position = 1
+        AND NOT EXISTS (
+            SELECT 1 FROM flashcards AS taken
+            WHERE taken.deck_id = hashed.deck_id
+            AND taken.content_hash = hashed.content_hash
+        )
+        """)
+    ).rowcount
+
 
 class Repository(Generic[T]):
+    """
+    The queries of a model. The listeners added with `subscribe` are told
+    about the rows that `add`, `update` and `delete` change, once they are
+    committed, on the thread that made the change. Set-based operations
+    such as imports and resets do not report their rows.
+    """
+
     def __init__(self, session: Session, model: Type[T]) -> None:
         self.session = session
         self.model = model
+        self.listeners: list[ChangeListener] = []
+
+    def subscribe(self, listener: ChangeListener) -> None:
+        self.listeners.append(listener)
 
     def add(self, entity: T) -> T:
         self.session.add(entity)
         self.session.commit()
         self.session.refresh(entity)
 
+        self._emit(Inserted(self.model, (entity.id,)))
+
         return entity
 
     def get(self, id: int) -> T | None:
@@ -26,45 +273,193 @@ class Repository(Generic[T]):
     def get_all(self) -> list[T]:
         return self.session.query(self.model).all()
 
+    def get_page(self, limit: int = 100, cursor: str | None = None) -> Page[T]:
+        """
+        Returns the entities that come after `cursor` by id, at most `limit`
+        of them. Unlike an OFFSET, every page costs the same to read.
+        """
+
+        return self._get_page(select(self.model), [self.model.id], limit, cursor)
+
+    def iter_all(self, page_size: int = 1000) -> Iterator[T]:
+        """
+        Yields every entity by id, reading them `page_size` at a time.
+        """
+
+        cursor = None
+        while True:
+            page = self.get_page(limit=page_size, cursor=cursor)
+            yield from page.items
+
+            if page.next_cursor is None:
+                return
+            cursor = page.next_cursor
+
+    def _get_page(
+        self,
+        stmt: Select,
+        columns: list[InstrumentedAttribute],
+        limit: int,
+        cursor: str | None,
+    ) -> Page[T]:
+        """
+        Applies a keyset pagination to `stmt`: rows are sorted by `columns`,
+        which must end with a unique column, and only the ones whose sort key
+        is greater than the one in `cursor` are read.
+        """
+
+        if limit < 1:
+            raise ValueError(f"Page limit must be positive, got {limit}")
+
+        if cursor is not None:
+            values = decode_cursor(cursor, columns)
+            stmt = stmt.where(
+                tuple_(*columns)
+                > tuple_(
+                    *(
+                        bindparam(None, value, type_=column.type)
+                        for column, value in zip(columns, values)
+                    )
+                )
+            )
+
+        items = (
+            self.session.execute(stmt.order_by(*columns).limit(limit + 1))
+            .scalars()
+            .all()
+        )
+
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            next_cursor = encode_cursor(
+                [getattr(items[-1], column.key) for column in columns]
+            )
+
+        return Page(list(items), next_cursor)
+
     def update(self, id: int, **kwargs) -> None:
         stmt = update(self.model).where(self.model.id == id).values(**kwargs)
         self.session.execute(stmt)
         self.session.commit()
 
+        self._emit(Updated(self.model, (id,)))
+
     def delete(self, id: int) -> None:
         entity = self.get(id)
         if entity:
             self.session.delete(entity)
             self.session.commit()
 
+            self._emit(Deleted(self.model, (id,)))
+
+    def _emit(self, change: Change) -> None:
+        for listener in self.listeners:
+            listener(change)
+
 
 class DeckRepository(Repository[Deck]):
     def __init__(self, session: Session) -> None:
         super().__init__(session, Deck)
 
     def get_with_subdecks(self, id: int) -> list[Deck]:
-        deck_alias = aliased(Deck)
+        result = self.session.execute(
+            select(Deck).where(Deck.id.in_(select_subdeck_ids(id)))
+        )
 
-        cte = select(Deck.id).where(Deck.id == id).cte(name="subdecks", recursive=True)
+        return result.scalars().all()
 
-        subdecks = cte.union_all(
-            select(deck_alias.id).where(deck_alias.parent_id == cte.c.id)
-        )
+    def get_index(self) -> DeckIndex:
+        """
+        Returns every deck, read with a single query, in a `DeckIndex`.
+        """
 
         result = self.session.execute(
-            select(Deck).where(Deck.id.in_(select(subdecks.c.id)))
+            select(Deck).order_by(Deck.id).execution_options(populate_existing=True)
         )
 
-        return result.scalars().all()
+        return DeckIndex(result.scalars())
 
     def get_by_name(self, name: str) -> Deck | None:
         return self.session.query(Deck).where(Deck.name == name).one_or_none()
 
+    def find_by_path(self, path: str) -> list[Deck]:
+        """
+        Returns the decks named `path` or, if there are none, the decks at
+        `path` read as a `Parent/Child` path, whose last names have to match
+        the deck and its closest parents. Names are not unique, so there can
+        be more than one.
+        """
+
+        decks = self.session.scalars(select(Deck).where(Deck.name == path)).all()
+        if decks or "/" not in path:
+            return list(decks)
+
+        *parent_names, name = path.split("/")
+        matches = []
+        for deck in self.session.scalars(select(Deck).where(Deck.name == name)):
+            parent = deck.parent
+            for parent_name in reversed(parent_names):
+                if parent is None or parent.name != parent_name:
+                    break
+                parent = parent.parent
+            else:
+                matches.append(deck)
+
+        return matches
+
+    def get_path(self, deck: Deck) -> str:
+        """
+        Returns the `Parent/Child` path of a deck, from its root deck.
+        """
+
+        names = []
+        while deck is not None:
+            names.append(deck.name)
+            deck = deck.parent
+
+        return "/".join(reversed(names))
+
 
 class FlashcardRepository(Repository[Flashcard]):
     def __init__(self, session: Session) -> None:
         super().__init__(session, Flashcard)
 
+    def update(self, id: int, **kwargs) -> None:
+        if "front" in kwargs or "back" in kwargs:
+            current = self.session.execute(
+                select(Flashcard.front, Flashcard.back).where(Flashcard.id == id)
+            ).one_or_none()
+
+            if current:
+                kwargs["content_hash"] = content_hash(
+                    kwargs.get("front", current.front),
+                    kwargs.get("back", current.back),
+                )
+
+        super().update(id, **kwargs)
+
+    def find_duplicate(
+        self,
+        deck_id: int,
+        front: str,
+        back: str,
+        exclude_id: int | None = None,
+    ) -> int | None:
+        """
+        Returns the id of the flashcard of the deck with the same content,
+        as compared by `content_hash`, other than `exclude_id`.
+        """
+
+        stmt = select(Flashcard.id).where(
+            Flashcard.deck_id == deck_id,
+            Flashcard.content_hash == content_hash(front, back),
+        )
+        if exclude_id is not None:
+            stmt = stmt.where(Flashcard.id != exclude_id)
+
+        return self.session.execute(stmt).scalar_one_or_none()
+
     def get_by_deck(
         self,
         deck_id: int,
@@ -73,9 +468,9 @@ class FlashcardRepository(Repository[Flashcard]):
     ) -> list[Flashcard]:
         query = self.session.query(Flashcard).join(Deck).filter(Deck.id == deck_id)
 
-        if limit:
+        if limit is not None:
             query = query.limit(limit)
-        if offset:
+        if offset is not None:
             query = query.offset(offset)
 
         return query.all()
@@ -88,13 +483,165 @@ class FlashcardRepository(Repository[Flashcard]):
     ) -> list[Flashcard]:
         query = self.session.query(Flashcard).filter(Flashcard.deck_id.in_(deck_ids))
 
-        if limit:
+        if limit is not None:
             query = query.limit(limit)
-        if offset:
+        if offset is not None:
             query = query.offset(offset)
 
         return query.all()
 
+    def get_page_by_decks(
+        self,
+        deck_ids: list[int],
+        limit: int = 100,
+        cursor: str | None = None,
+    ) -> Page[Flashcard]:
+        """
+        Keyset paginated version of `get_by_decks`. Flashcards are sorted by
+        deck and id, which `ix_flashcards_deck_id` returns in order.
+        """
+
+        return self._get_page(
+            select(Flashcard).where(Flashcard.deck_id.in_(deck_ids)),
+            [Flashcard.deck_id, Flashcard.id],
+            limit,
+            cursor,
+        )
+
+    def get_contents(self, ids: list[int]) -> dict[int, Row]:
+        """
+        Returns the front and back of the given flashcards, by id, in a
+        single query.
+        """
+
+        result = self.session.execute(
+            select(Flashcard.id, Flashcard.front, Flashcard.back).where(
+                Flashcard.id.in_(ids)
+            )
+        )
+
+        return {row.id: row for row in result}
+
+    def count_with_subdecks(
+        self,
+        deck_id: int | None = None,
+        search: str | None = None,
+    ) -> int:
+        """
+        Counts the flashcards of a deck and its sub-decks, or of every deck
+        if `deck_id` is None, that match `search` if given.
+        """
+
+        stmt = self._filter(
+            select(func.count()).select_from(Flashcard), deck_id, search
+        )
+
+        return self.session.execute(stmt).scalar_one()
+
+    def get_rows_with_subdecks(
+        self,
+        deck_id: int | None = None,
+        limit: int = 100,
+        after: str | None = None,
+        before: str | None = None,
+        order_by: str | None = None,
+        descending: bool = False,
+        search: str | None = None,
+        ids: Sequence[int] | None = None,
+    ) -> list[Row]:
+        """
+        Returns a page of the flashcards of a deck and its sub-decks, or of
+        every deck if `deck_id` is None, as lightweight rows with the
+        columns id, front, back, reversible, deck_id and deck, and the
+        sort_key of the order when there is one.
+
+        Front and back are cut to their first `PREVIEW_LENGTH` characters.
+        `order_by` is one of the keys of `FLASHCARD_ROW_COLUMNS`; rows are
+        always sorted by id last, so pages are stable. When `search` is
+        given, only the matching flashcards are returned and, unless
+        `order_by` is set, the best matches come first. When `ids` is given,
+        only the flashcards among them are returned.
+
+        Pages are read by keyset: `after` and `before` are cursors made by
+        `flashcard_row_cursor` for a row of the same order, and only the
+        `limit` rows right after or right before it are returned, so a page
+        costs the same however far it is.
+        """
+
+        order_columns = [Flashcard.id]
+        if order_by is not None:
+            order_columns.insert(0, FLASHCARD_ROW_COLUMNS[order_by])
+        elif search_expression(search):
+            order_columns.insert(0, flashcards_fts.c.rank)
+
+        stmt = select(
+            Flashcard.id,
+            func.substr(Flashcard.front, 1, PREVIEW_LENGTH).label("front"),
+            func.substr(Flashcard.back, 1, PREVIEW_LENGTH).label("back"),
+            Flashcard.reversible,
+            Flashcard.deck_id,
+            Deck.name.label("deck"),
+            *(column.label("sort_key") for column in order_columns[:-1]),
+        ).join(Deck, Flashcard.deck_id == Deck.id)
+        stmt = self._filter(stmt, deck_id, search)
+        if ids is not None:
+            stmt = stmt.where(Flashcard.id.in_(ids))
+
+        # Rows before a cursor are read backwards from it, then put back in order.
+        backwards = before is not None
+        cursor = before if backwards else after
+        if cursor is not None:
+            key = tuple_(*order_columns)
+            values = tuple_(
+                *(
+                    bindparam(None, value, type_=column.type)
+                    for column, value in zip(
+                        order_columns, decode_cursor(cursor, order_columns)
+                    )
+                )
+            )
+            stmt = stmt.where(key < values if descending != backwards else key > values)
+
+        stmt = stmt.order_by(
+            *(
+                column.desc() if descending != backwards else column
+                for column in order_columns
+            )
+        )
+
+        rows = self.session.execute(stmt.limit(limit)).all()
+        return rows[::-1] if backwards else rows
+
+    def search(
+        self,
+        search: str,
+        deck_id: int | None = None,
+        limit: int = 100,
+        after: str | None = None,
+    ) -> list[Row]:
+        """
+        Returns a page of the flashcards of a deck and its sub-decks, or of
+        every deck if `deck_id` is None, whose front or back contain words
+        starting with each word of `search`, best matches first.
+
+        See `get_rows_with_subdecks` for the columns of the rows and `after`.
+        """
+
+        return self.get_rows_with_subdecks(
+            deck_id, limit=limit, after=after, search=search
+        )
+
+    def _filter(self, stmt: Select, deck_id: int | None, search: str | None) -> Select:
+        if deck_id is not None:
+            stmt = stmt.where(Flashcard.deck_id.in_(select_subdeck_ids(deck_id)))
+
+        expression = search_expression(search)
+        if expression:
+            stmt = stmt.join(flashcards_fts, flashcards_fts.c.rowid == Flashcard.id)
+            stmt = stmt.where(flashcards_fts.c.flashcards_fts.match(expression))
+
+        return stmt
+
 
 class ReviewRepository(Repository[Review]):
     def __init__(self, session: Session) -> None:
@@ -117,15 +664,158 @@ class ReviewRepository(Repository[Review]):
         )
 
     def get_pending(self, deck_id: int) -> list[Review]:
+        return self._get_pending_query(deck_id).all()
+
+    def get_pending_with_subdecks(
+        self,
+        deck_id: int,
+        with_flashcards: bool = True,
+    ) -> list[Review]:
+        """
+        Returns the pending reviews of a deck and all of its sub-decks, with
+        their flashcards unless `with_flashcards` is False, in a single query.
+
+        Reviews are grouped by deck and sorted like `get_pending` inside
+        each deck.
+        """
+
+        query = self.session.query(Review)
+        if with_flashcards:
+            query = query.options(joinedload(Review.flashcard, innerjoin=True))
+
+        return (
+            query.filter(Review.deck_id.in_(select_subdeck_ids(deck_id)))
+            .filter(Review.next_review <= datetime.now().date())
+            .order_by(Review.deck_id, Review.ef, Review.interval, Review.next_review)
+            .all()
+        )
+
+    def get_pending_page(
+        self,
+        deck_id: int,
+        limit: int = 100,
+        cursor: str | None = None,
+    ) -> Page[Review]:
+        """
+        Keyset paginated version of `get_pending`, in the same order.
+        """
+
+        return self._get_page(
+            select(Review)
+            .where(Review.deck_id == deck_id)
+            .where(Review.next_review <= datetime.now().date()),
+            [Review.ef, Review.interval, Review.next_review, Review.id],
+            limit,
+            cursor,
+        )
+
+    def _get_pending_query(self, deck_id: int) -> Query[Review]:
+        # Matches `ix_reviews_due` column by column.
         return (
             self.session.query(Review)
-            .join(Flashcard)
-            .filter(Flashcard.deck_id == deck_id)
+            .filter(Review.deck_id == deck_id)
             .filter(Review.next_review <= datetime.now().date())
             .order_by(Review.ef, Review.interval, Review.next_review)
-            .all()
         )
 
+    def reset_with_subdecks(self, deck_id: int) -> tuple[int, int]:
+        """
+        Deletes the reviews of a deck and its sub-decks and creates new ones,
+        two for reversible flashcards, with a single DELETE and a single
+        INSERT ... SELECT in one transaction.
+
+        :return tuple[int, int]: the number of deleted and created reviews.
+        """
+
+        now = utcnow()
+        subdeck_ids = select_subdeck_ids(deck_id)
+
+        deleted = self.session.execute(
+            delete(Review).where(Review.deck_id.in_(subdeck_ids))
+        ).rowcount
+
+        def select_reviews(reversed: bool) -> Select:
+            stmt = select(
+                Flashcard.id,
+                Flashcard.deck_id,
+                literal(reversed),
+                literal(2.5),
+                literal(1),
+                literal(0),
+                literal(datetime.now().date(), Date),
+                literal(now, DateTime),
+                literal(now, DateTime),
+                literal_column(NEW_SYNC_ID_SQL),
+            ).where(Flashcard.deck_id.in_(subdeck_ids))
+
+            return stmt.where(Flashcard.reversible == true()) if reversed else stmt
+
+        created = self.session.execute(
+            insert(Review).from_select(
+                [
+                    Review.flashcard_id,
+                    Review.deck_id,
+                    Review.reversed,
+                    Review.ef,
+                    Review.interval,
+                    Review.repetitions,
+                    Review.next_review,
+                    Review.created_at,
+                    Review.last_updated_at,
+                    Review.sync_id,
+                ],
+                union_all(select_reviews(False), select_reviews(True)),
+            )
+        ).rowcount
+
+        self.session.commit()
+
+        return deleted, created
+
+    def update_answers(self, answers: list[dict]) -> None:
+        """
+        Writes many review answers with a single executemany UPDATE and one
+        commit. Each answer holds a `review_id` and the new repetitions, ef,
+        interval, next_review and last_updated_at, the time it was answered.
+        Answers of reviews that no longer exist are ignored, and only the
+        last answer of each review is written.
+
+        Answers can be written a while after they were given. A review that
+        a sync wrote in the meantime with a later change keeps that change,
+        and the reviews written get the time they were written as their
+        `last_updated_at`, so that changesets exported in the meantime do
+        not leave them out.
+        """
+
+        latest = {answer["review_id"]: answer for answer in answers}
+
+        reviews = Review.__table__
+        answered_at = bindparam("answered_at", type_=reviews.c.last_updated_at.type)
+        self.session.execute(
+            update(reviews)
+            .where(
+                reviews.c.id == bindparam("review_id"),
+                ~and_(
+                    reviews.c.received_at.is_not(None),
+                    reviews.c.received_at > answered_at,
+                    reviews.c.last_updated_at > answered_at,
+                ),
+            )
+            .values(last_updated_at=utcnow()),
+            [
+                {
+                    key: value
+                    for key, value in answer.items()
+                    if key != "last_updated_at"
+                }
+                | {"answered_at": answer["last_updated_at"]}
+                for answer in latest.values()
+            ],
+        )
+        self.session.commit()
+
+        self._emit(Updated(Review, tuple(latest)))
+
     def delete_by_flashcard(self, flashcard_id: int) -> None:
         reviews = self.get_by_flashcard(flashcard_id)
         if reviews:
@@ -133,58 +823,105 @@ class ReviewRepository(Repository[Review]):
                 self.delete(review.id)
 
 
+def rebuild_deck_statistics(connection: Session | Connection) -> None:
+    """
+    Recomputes `deck_statistics` and `deck_review_schedule` from scratch.
+    """
+
+    connection.execute(text("DELETE FROM deck_statistics"))
+    connection.execute(text("DELETE FROM deck_review_schedule"))
+    connection.execute(
+        text("""
+        INSERT INTO deck_statistics (deck_id, flashcards, reviews, ef_sum)
+        SELECT
+            decks.id,
+            COALESCE(f.flashcards, 0),
+            COALESCE(r.reviews, 0),
+            COALESCE(r.ef_sum, 0)
+        FROM decks
+        LEFT JOIN (
+            SELECT deck_id, COUNT(*) AS flashcards
+            FROM flashcards
+            GROUP BY deck_id
+        ) AS f ON f.deck_id = decks.id
+        LEFT JOIN (
+            SELECT
+                deck_id,
+                COUNT(*) AS reviews,
+                SUM(CAST(ROUND(ef * 100) AS INTEGER)) AS ef_sum
+            FROM reviews
+            GROUP BY deck_id
+        ) AS r ON r.deck_id = decks.id
+        """)
+    )
+    connection.execute(
+        text("""
+        INSERT INTO deck_review_schedule (deck_id, next_review, reviews)
+        SELECT deck_id, next_review, COUNT(*)
+        FROM reviews
+        WHERE deck_id IS NOT NULL
+        GROUP BY deck_id, next_review
+        """)
+    )
+
+
 class StatisticsRepository:
+    """
+    Reads the counters kept in `deck_statistics` and `deck_review_schedule`.
+
+    Statistics of a deck include all of its sub-decks.
+    """
+
     def __init__(self, session: Session) -> None:
         self.session = session
 
-    @lru_cache
     def count_flashcards(self, deck_id: int | None = None) -> int:
-        stmt = select(func.count()).select_from(Flashcard)
-        if deck_id:
-            stmt = stmt.where(Flashcard.deck_id == deck_id)
+        stmt = select(func.coalesce(func.sum(DeckStatistics.flashcards), 0))
+        if deck_id is not None:
+            stmt = stmt.where(DeckStatistics.deck_id.in_(select_subdeck_ids(deck_id)))
 
-        count = self.session.execute(stmt).scalar()
-        return count if count else 0
+        return self.session.execute(stmt).scalar_one()
 
-    @lru_cache
     def count_reviews(self, deck_id: int | None = None) -> int:
-        stmt = select(func.count()).select_from(Review)
-        if deck_id:
-            stmt = stmt.join(Flashcard).where(Flashcard.deck_id == deck_id)
+        stmt = select(func.coalesce(func.sum(DeckStatistics.reviews), 0))
+        if deck_id is not None:
+            stmt = stmt.where(DeckStatistics.deck_id.in_(select_subdeck_ids(deck_id)))
 
-        count = self.session.execute(stmt).scalar()
-        return count if count else 0
+        return self.session.execute(stmt).scalar_one()
 
-    @lru_cache
     def count_pending_reviews(self, deck_id: int | None = None) -> int:
-        stmt = select(func.count()).select_from(Review)
-        if deck_id:
-            stmt = stmt.join(Flashcard).where(Flashcard.deck_id == deck_id)
-
-        stmt = stmt.where(Review.next_date <= datetime.now(timezone.utc).date())
+        stmt = select(func.coalesce(func.sum(DeckReviewSchedule.reviews), 0)).where(
+            DeckReviewSchedule.next_review <= datetime.now().date()
+        )
+        if deck_id is not None:
+            stmt = stmt.where(
+                DeckReviewSchedule.deck_id.in_(select_subdeck_ids(deck_id))
+            )
 
-        count = self.session.execute(stmt).scalar()
-        return count if count else 0
+        return self.session.execute(stmt).scalar_one()
 
-    @lru_cache
     def count_reviewed_reviews(self, deck_id: int | None = None) -> int:
-        stmt = select(func.count()).select_from(Review)
-        if deck_id:
-            stmt = stmt.join(Flashcard).where(Flashcard.deck_id == deck_id)
-
-        stmt = stmt.where(Review.next_date > datetime.now(timezone.utc).date())
+        stmt = select(func.coalesce(func.sum(DeckReviewSchedule.reviews), 0)).where(
+            DeckReviewSchedule.next_review > datetime.now().date()
+        )
+        if deck_id is not None:
+            stmt = stmt.where(
+                DeckReviewSchedule.deck_id.in_(select_subdeck_ids(deck_id))
+            )
 
-        count = self.session.execute(stmt).scalar()
-        return count if count else 0
+        return self.session.execute(stmt).scalar_one()
 
-    @lru_cache
     def calc_avg_review_score(self, deck_id: int | None = None) -> float:
-        stmt = select(func.avg(Review.ef)).select_from(Review)
-        if deck_id:
-            stmt = stmt.join(Flashcard).where(Flashcard.deck_id == deck_id)
+        stmt = select(func.sum(DeckStatistics.ef_sum), func.sum(DeckStatistics.reviews))
+        if deck_id is not None:
+            stmt = stmt.where(DeckStatistics.deck_id.in_(select_subdeck_ids(deck_id)))
 
-        avg_score = self.session.execute(stmt).scalar()
-        return avg_score if avg_score else 0
+        ef_sum, reviews = self.session.execute(stmt).one()
+        return ef_sum / reviews / 100 if reviews else 0
 
     def calc_learning_rate(self, deck_id: int | None = None) -> float:
         return 0
+
+    def rebuild(self) -> None:
+        rebuild_deck_statistics(self.session)
+        self.session.commit()
@@ -0,0 +1,182 @@
+import json
+import threading
+from dataclasses import asdict, dataclass
+from datetime import date, datetime
+from pathlib import Path
+from typing import IO
+from sqlalchemy import Connection, Engine
+from sqlalchemy.orm import Session
+from memotica.repositories import ReviewRepository
+
+DEFAULT_FLUSH_EVERY = 20
+DEFAULT_FLUSH_INTERVAL = 5.0
+
+
+@dataclass
+class ReviewAnswer:
+    """
+    The new state of a review after answering it.
+    """
+
+    review_id: int
+    repetitions: int
+    ef: float
+    interval: int
+    next_review: date
+    last_updated_at: datetime
+
+    def to_json(self) -> str:
+        values = asdict(self)
+        values["next_review"] = self.next_review.isoformat()
+        values["last_updated_at"] = self.last_updated_at.isoformat()
+
+        return json.dumps(values)
+
+    @classmethod
+    def from_json(cls, line: str) -> "ReviewAnswer":
+        values = json.loads(line)
+        values["next_review"] = date.fromisoformat(values["next_review"])
+        values["last_updated_at"] = datetime.fromisoformat(values["last_updated_at"])
+
+        return cls(**values)
+
+
+def journal_path(engine: Engine) -> Path | None:
+    """
+    Returns where the review journal of a database lives, next to the
+    database file, or None for in-memory databases.
+    """
+
+    database = engine.url.database
+    if not database or database == ":memory:" or database.startswith("file:"):
+        return None
+
+    return Path(f"{database}-reviews")
+
+
+class ReviewJournal:
+    """
+    A write-behind buffer for review answers.
+
+    Answers are kept in memory and appended to a journal file, so recording
+    one never waits on SQLite. They are written to the database in a single
+    transaction by `flush`, after which the journal is emptied. Answers left
+    in the journal by a crash are written by `replay` on the next start.
+
+    The journal file is not synced to disk, so it survives the application
+    crashing but not necessarily the operating system doing so.
+    """
+
+    def __init__(
+        self,
+        path: Path | None = None,
+        flush_every: int = DEFAULT_FLUSH_EVERY,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+    ) -> None:
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+
+        self.pending: list[ReviewAnswer] = []
+        self.lock = threading.Lock()
+        self.file: IO[str] | None = None
+
+    @property
+    def has_pending(self) -> bool:
+        return bool(self.pending)
+
+    def record(self, answer: ReviewAnswer) -> bool:
+        """
+        Buffers an answer.
+
+        :return bool: whether `flush_every` answers are waiting to be flushed.
+        """
+
+        with self.lock:
+            self.pending.append(answer)
+
+            if self.path is not None:
+                if self.file is None:
+                    self.file = open(self.path, "a", encoding="utf-8")
+
+                self.file.write(answer.to_json() + "\n")
+                self.file.flush()
+
+            return len(self.pending) >= self.flush_every
+
+    def flush(self, session: Session | Connection) -> int:
+        """
+        Writes the buffered answers in one transaction and removes them from
+        the journal.
+
+        :return int: the number of answers written.
+        """
+
+        with self.lock:
+            answers, self.pending = self.pending, []
+
+        if not answers:
+            return 0
+
+        try:
+            ReviewRepository(session).update_answers(
+                [asdict(answer) for answer in answers]
+            )
+        except Exception:
+            with self.lock:
+                self.pending = answers + self.pending
+            raise
+
+        with self.lock:
+            # Answers recorded while flushing must stay in the journal.
+            self._rewrite(self.pending)
+
+        return len(answers)
+
+    def replay(self, session: Session | Connection) -> int:
+        """
+        Writes the answers left in the journal file by a previous run that
+        did not flush them, then empties it.
+
+        :return int: the number of answers written.
+        """
+
+        if self.path is None or not self.path.exists():
+            return 0
+
+        answers = []
+        with open(self.path, encoding="utf-8") as file:
+            for line in file:
+                try:
+                    answers.append(ReviewAnswer.from_json(line))
+                except (ValueError, KeyError, TypeError):
+                    # A line cut short by a crash.
+                    continue
+
+        if answers:
+            ReviewRepository(session).update_answers(
+                [asdict(answer) for answer in answers]
+            )
+
+        with self.lock:
+            self._rewrite(self.pending)
+
+        return len(answers)
+
+    def close(self) -> None:
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def _rewrite(self, answers: list[ReviewAnswer]) -> None:
+        if self.path is None:
+            return
+
+        if self.file is None:
+            self.file = open(self.path, "a", encoding="utf-8")
+
+        self.file.seek(0)
+        self.file.truncate()
+        self.file.writelines(answer.to_json() + "\n" for answer in answers)
+        self.file.flush()
@@ -1,13 +1,15 @@
 from collections import deque
 from enum import Enum, auto
-from textual import events
+from typing import Awaitable, Callable
+from sqlalchemy import Row
+from textual import events, work
 from textual.app import ComposeResult
 from textual.binding import Binding
 from textual.containers import Container
 from textual.reactive import reactive
 from textual.screen import Screen
 from textual.widgets import Footer, Markdown, Button
-from memotica.messages import UpdateReview
+from memotica.messages import FinishReview, UpdateReview
 from memotica.models import Review
 from memotica.sm2 import sm2
 
@@ -18,7 +20,19 @@ class ReviewStatus(Enum):
     SHOW_ANSWER = auto()
 
 
+DEFAULT_PREFETCH = 10
+
+
 class ReviewScreen(Screen):
+    """
+    Shows the pending reviews one by one.
+
+    The content of the flashcards is not part of the reviews: a worker
+    loads it with `load_contents`, in one batch, for the next `prefetch`
+    cards of the queue, so showing the next card does not wait on the
+    database.
+    """
+
     BINDINGS = [
         Binding("ctrl+q", "close", "Exit Review Session", show=True, priority=True),
         Binding("escape", "close", "Stop Review", show=False, priority=True),
@@ -30,9 +44,20 @@ class ReviewScreen(Screen):
 
     review_status: reactive[ReviewStatus] = reactive(ReviewStatus.LOADING)
 
-    def __init__(self, reviews: list[Review], *args, **kwargs):
+    def __init__(
+        self,
+        reviews: list[Review],
+        load_contents: Callable[[list[int]], Awaitable[dict[int, Row]]],
+        prefetch: int = DEFAULT_PREFETCH,
+        *args,
+        **kwargs,
+    ):
         super().__init__(*args, **kwargs)
         self.review_queue = deque(reviews)
+        self.load_contents = load_contents
+        self.prefetch = prefetch
+        self.contents: dict[int, Row] = {}
+        self.current_question: Review | None = None
         self.loading = True
 
     def compose(self) -> ComposeResult:
@@ -68,6 +93,9 @@ class ReviewScreen(Screen):
 
         self.load_next()
 
+    def on_unmount(self) -> None:
+        self.app.post_message(FinishReview())
+
     def on_button_pressed(self, event: Button.Pressed) -> None:
         button_id = event.button.id
         if button_id == "show":
@@ -150,11 +178,46 @@ class ReviewScreen(Screen):
         self.review_status = ReviewStatus.LOADING
 
         self.current_question = self.review_queue.popleft()
+        if self.current_question.flashcard_id in self.contents:
+            self.show_question()
+
+        self.prefetch_contents()
+
+    def show_question(self) -> None:
+        assert self.current_question
+
+        content = self.contents[self.current_question.flashcard_id]
         if self.current_question.reversed:
-            self.question.update(self.current_question.flashcard.back)
-            self.answer.update(self.current_question.flashcard.front)
+            self.question.update(content.back)
+            self.answer.update(content.front)
         else:
-            self.question.update(self.current_question.flashcard.front)
-            self.answer.update(self.current_question.flashcard.back)
+            self.question.update(content.front)
+            self.answer.update(content.back)
 
         self.review_status = ReviewStatus.SHOW_QUESTION
+
+    @work(exclusive=True, group="prefetch")
+    async def prefetch_contents(self) -> None:
+        """
+        Loads the content of the current card, if it is missing, and of the
+        next `prefetch` cards of the queue, and forgets the content of the
+        cards that left the queue.
+        """
+
+        upcoming = [self.current_question] + list(self.review_queue)[: self.prefetch]
+        wanted = {review.flashcard_id for review in upcoming if review}
+        queued = wanted | {review.flashcard_id for review in self.review_queue}
+
+        for flashcard_id in self.contents.keys() - queued:
+            del self.contents[flashcard_id]
+
+        missing = wanted - self.contents.keys()
+        if missing:
+            self.contents.update(await self.load_contents(sorted(missing)))
+
+        if (
+            self.review_status == ReviewStatus.LOADING
+            and self.current_question
+            and self.current_question.flashcard_id in self.contents
+        ):
+            self.show_question()
@@ -1,4 +1,4 @@
-from typing import Type, Tuple
+from typing import Literal, Type, Tuple
 from pathlib import Path
 from click import get_app_dir
 from pydantic import BaseModel, Field
@@ -13,8 +13,51 @@ app_dir = Path(get_app_dir(app_name="memotica"))
 config_file_path = app_dir / "config.toml"
 
 
+class StorageProfile(BaseModel):
+    """
+    SQLite pragmas applied to every new database connection.
+    """
+
+    journal_mode: Literal["delete", "truncate", "persist", "wal"] = "wal"
+    synchronous: Literal["off", "normal", "full", "extra"] = "normal"
+    cache_size: int = -64_000  # Negative values are KiB.
+    mmap_size: int = 256 * 1024 * 1024
+    temp_store: Literal["default", "file", "memory"] = "memory"
+    busy_timeout: int = 5_000  # Milliseconds.
+    foreign_keys: bool = True
+
+
+STORAGE_PROFILES: dict[str, StorageProfile] = {
+    # SQLite's own defaults.
+    "compatible": StorageProfile(
+        journal_mode="delete",
+        synchronous="full",
+        cache_size=-2_000,
+        mmap_size=0,
+        temp_store="default",
+        busy_timeout=0,
+        foreign_keys=False,
+    ),
+    "balanced": StorageProfile(),
+    "durable": StorageProfile(synchronous="full"),
+    # Trades durability on power loss for speed.
+    "fast": StorageProfile(
+        synchronous="off",
+        cache_size=-256_000,
+        mmap_size=1024 * 1024 * 1024,
+    ),
+}
+
+
 class AppSettings(BaseModel):
     db_url: str = f"sqlite:///{app_dir / 'memotica.db'}"
+    storage_profile: Literal["compatible", "balanced", "durable", "fast"] = "balanced"
+    # Review answers are written to the database in batches of this many
+    # answers, or after this many seconds.
+    review_flush_every: int = 20
+    review_flush_interval: float = 5.0
+    # How many upcoming cards of a review session are loaded ahead.
+    review_prefetch: int = 10
 
 
 class Settings(BaseSettings):
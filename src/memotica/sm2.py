@@ -1,3 +1,10 @@
+import numpy as np
+import numpy.typing as npt
+
+# Splits a float64 into two halves whose products are exact (Dekker).
+_SPLITTER = 134217729.0  # 2**27 + 1
+
+
 def sm2(n: int, ef: float, i: int, q: int) -> tuple[int, float, int]:
     """
     A simple implementation of the SuperMemo 2 (SM2) algorithm in Python.
@@ -27,3 +34,69 @@ def sm2(n: int, ef: float, i: int, q: int) -> tuple[int, float, int]:
     ef = max(1.3, round(ef, 2))
 
     return (n, ef, i)
+
+
+def _round_hundredths(x: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+    """
+    Does what `round(x, 2)` does for Python floats: rounds the exact binary
+    value of `x` to two decimals, ties to even, and returns the closest
+    float to the result.
+
+    `np.round` rounds `x * 100` after it has been rounded to a float, which
+    gives a different answer when `x` is right next to a tie. Here the
+    rounding error of `x * 100` is computed exactly (Dekker's product) and
+    used to break those ties.
+    """
+
+    product = x * 100.0
+
+    high = x * _SPLITTER
+    high = high - (high - x)
+    low = x - high
+    error = (high * 100.0 - product) + low * 100.0
+
+    rounded = np.rint(product)
+    distance = product - rounded
+    rounded = np.where((distance == 0.5) & (error > 0), rounded + 1, rounded)
+    rounded = np.where((distance == -0.5) & (error < 0), rounded - 1, rounded)
+
+    return rounded / 100.0
+
+
+def sm2_batch(
+    n: npt.ArrayLike,
+    ef: npt.ArrayLike,
+    i: npt.ArrayLike,
+    q: npt.ArrayLike,
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.float64], npt.NDArray[np.int64]]:
+    """
+    Applies `sm2` to many cards at once. The results are bit for bit the
+    ones `sm2` returns for each card, as long as the intervals fit in an
+    int64.
+
+    :param n: Number of times each card has been successfully recalled.
+    :param ef: The easiness factors.
+    :param i: Inter-repetition intervals.
+    :param q: Quality of each response.
+
+    :return tuple: arrays with the updated values of n, ef and the inter-repetition interval.
+    """
+
+    n = np.asarray(n, dtype=np.int64)
+    ef = np.asarray(ef, dtype=np.float64)
+    i = np.asarray(i, dtype=np.int64)
+    q = np.asarray(q, dtype=np.int64)
+
+    recalled = q >= 3
+
+    new_i = np.where(n == 1, 6, np.rint(i * ef).astype(np.int64))
+    new_i = np.where(recalled & (n != 0), new_i, 1)
+    new_n = np.where(recalled, n + 1, 0)
+
+    misses = 5 - q
+    new_ef = ef + (0.1 - misses * (0.08 + misses * 0.002))
+    new_ef = _round_hundredths(new_ef)
+    # Written like this, and not with np.maximum, to match max() on NaN.
+    new_ef = np.where(new_ef > 1.3, new_ef, 1.3)
+
+    return (new_n, new_ef, new_i)
@@ -0,0 +1,554 @@
+from dataclasses import dataclass
+from datetime import date, datetime
+from time import perf_counter
+from typing import Any, Iterable, Sequence, Type
+from sqlalchemy import (
+    Connection,
+    Row,
+    Select,
+    delete,
+    insert,
+    or_,
+    select,
+    true,
+    update,
+)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+from memotica.models import (
+    Deck,
+    Flashcard,
+    Review,
+    SyncWatermark,
+    Tombstone,
+    content_hash,
+    utcnow,
+)
+from memotica.repositories import assign_sync_ids
+from memotica.timing import TimedStats
+
+CHANGESET_VERSION = 1
+
+# Sync ids looked up per query, well below SQLite's limit of variables.
+LOOKUP_SIZE = 500
+
+SyncedModel = Type[Deck] | Type[Flashcard] | Type[Review]
+
+
+@dataclass
+class SyncStats(TimedStats):
+    """
+    Counters collected while applying a changeset.
+    """
+
+    inserted: int = 0
+    updated: int = 0
+    deleted: int = 0
+    skipped: int = 0
+
+
+def get_watermark(connection: Connection, peer: str) -> datetime | None:
+    """
+    Returns until when changes were last exported to `peer`, or None if
+    they never were.
+    """
+
+    return connection.execute(
+        select(SyncWatermark.exported_until).where(SyncWatermark.peer == peer)
+    ).scalar_one_or_none()
+
+
+def set_watermark(connection: Connection, peer: str, exported_until: datetime) -> None:
+    stmt = sqlite_insert(SyncWatermark).values(peer=peer, exported_until=exported_until)
+    connection.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[SyncWatermark.peer],
+            set_={"exported_until": stmt.excluded.exported_until},
+        )
+    )
+
+
+def _to_json(row: Row) -> dict[str, Any]:
+    return {
+        key: value.isoformat() if isinstance(value, (date, datetime)) else value
+        for key, value in row._asdict().items()
+    }
+
+
+def _from_json(row: dict[str, Any]) -> dict[str, Any]:
+    row = dict(row)
+    for key in ("created_at", "last_updated_at", "deleted_at"):
+        if row.get(key) is not None:
+            row[key] = datetime.fromisoformat(row[key])
+    if row.get("next_review") is not None:
+        row["next_review"] = date.fromisoformat(row["next_review"])
+
+    return row
+
+
+def export_changeset(
+    connection: Connection, since: datetime | None = None
+) -> dict[str, Any]:
+    """
+    Collects the decks, flashcards and reviews changed after `since`, or all
+    of them if `since` is None, and the ones deleted after it. Rows received
+    from another machine after `since` are included too, whenever they were
+    changed there, so that they reach the other peers. Rows refer to each
+    other by sync id, as their ids differ between machines.
+
+    :return dict: a changeset that can be written as JSON and merged into
+        another collection with `apply_changeset`. Its `until` is the time
+        to pass as `since` next time.
+    """
+
+    until = utcnow()
+    # Rows inserted with plain SQL by older versions may not have one yet.
+    assign_sync_ids(connection)
+
+    def changed(*columns) -> Any:
+        if since is None:
+            return true()
+        return or_(*(column > since for column in columns))
+
+    parent = aliased(Deck)
+    decks = connection.execute(
+        select(
+            Deck.sync_id,
+            Deck.name,
+            parent.sync_id.label("parent"),
+            Deck.last_updated_at,
+        )
+        .outerjoin(parent, Deck.parent_id == parent.id)
+        .where(changed(Deck.last_updated_at, Deck.received_at))
+        .order_by(Deck.id)
+    )
+    flashcards = connection.execute(
+        select(
+            Flashcard.sync_id,
+            Flashcard.front,
+            Flashcard.back,
+            Flashcard.reversible,
+            Deck.sync_id.label("deck"),
+            Flashcard.created_at,
+            Flashcard.last_updated_at,
+        )
+        .join(Deck, Flashcard.deck_id == Deck.id)
+        .where(changed(Flashcard.last_updated_at, Flashcard.received_at))
+        .order_by(Flashcard.id)
+    )
+    reviews = connection.execute(
+        select(
+            Review.sync_id,
+            Flashcard.sync_id.label("flashcard"),
+            Review.reversed,
+            Review.ef,
+            Review.interval,
+            Review.repetitions,
+            Review.next_review,
+            Review.created_at,
+            Review.last_updated_at,
+        )
+        .join(Flashcard, Review.flashcard_id == Flashcard.id)
+        .where(changed(Review.last_updated_at, Review.received_at))
+        .order_by(Review.id)
+    )
+    tombstones = connection.execute(
+        select(Tombstone.table_name, Tombstone.sync_id, Tombstone.deleted_at).where(
+            changed(Tombstone.deleted_at, Tombstone.received_at)
+        )
+    )
+
+    return {
+        "version": CHANGESET_VERSION,
+        "since": since.isoformat() if since is not None else None,
+        "until": until.isoformat(),
+        "decks": [_to_json(row) for row in decks],
+        "flashcards": [_to_json(row) for row in flashcards],
+        "reviews": [_to_json(row) for row in reviews],
+        "tombstones": [_to_json(row) for row in tombstones],
+    }
+
+
+def _chunks(values: Sequence, size: int = LOOKUP_SIZE) -> Iterable[Sequence]:
+    for start in range(0, len(values), size):
+        yield values[start : start + size]
+
+
+def _local_rows(
+    connection: Connection, model: SyncedModel, sync_ids: Iterable[str | None]
+) -> dict[str, Row]:
+    """
+    Returns the id and last update of the rows of `model` with the given
+    sync ids, by sync id.
+    """
+
+    sync_ids = list({sync_id for sync_id in sync_ids if sync_id is not None})
+    rows = {}
+    for chunk in _chunks(sync_ids):
+        for row in connection.execute(
+            select(model.sync_id, model.id, model.last_updated_at).where(
+                model.sync_id.in_(chunk)
+            )
+        ):
+            rows[row.sync_id] = row
+
+    return rows
+
+
+def _local_tombstones(
+    connection: Connection, table_name: str, sync_ids: Iterable[str]
+) -> dict[str, datetime]:
+    sync_ids = list(set(sync_ids))
+    tombstones = {}
+    for chunk in _chunks(sync_ids):
+        tombstones.update(
+            connection.execute(
+                select(Tombstone.sync_id, Tombstone.deleted_at).where(
+                    Tombstone.table_name == table_name,
+                    Tombstone.sync_id.in_(chunk),
+                )
+            ).all()
+        )
+
+    return tombstones
+
+
+def _is_newer(timestamp: datetime | None, than: datetime | None) -> bool:
+    # Rows from before timestamps were kept on decks have none, and lose.
+    if than is None:
+        return timestamp is not None
+
+    return timestamp is not None and timestamp > than
+
+
+def _write(
+    connection: Connection,
+    model: SyncedModel,
+    sync_id: str,
+    current: Row | None,
+    values: dict[str, Any],
+) -> int | None:
+    """
+    Inserts the row `sync_id` of `model`, or updates it if it exists as
+    `current`. Rows that would break a constraint, such as a flashcard that
+    another one of its deck already duplicates, are left out.
+
+    :return int | None: the id of the row, or None if it was left out.
+    """
+
+    try:
+        with connection.begin_nested():
+            if current is None:
+                result = connection.execute(
+                    insert(model).values(sync_id=sync_id, **values)
+                )
+                return result.inserted_primary_key[0]
+
+            connection.execute(
+                update(model).where(model.id == current.id).values(**values)
+            )
+            return current.id
+    except IntegrityError:
+        return None
+
+
+def _adopt(
+    connection: Connection,
+    model: SyncedModel,
+    sync_id: str,
+    stmt: Select,
+    taken: set[int],
+) -> Row | None:
+    """
+    Gives `sync_id` to the first local row that `stmt` finds and that no
+    other row of the changeset matched, if any, so that a row created on
+    both machines, such as by importing the same file, is merged instead of
+    duplicated.
+    """
+
+    candidates = connection.execute(
+        stmt.with_only_columns(model.sync_id, model.id, model.last_updated_at)
+    )
+    current = next((row for row in candidates if row.id not in taken), None)
+    if current is None:
+        return None
+
+    connection.execute(
+        update(model)
+        .where(model.id == current.id)
+        .values(sync_id=sync_id, last_updated_at=current.last_updated_at)
+    )
+    return current
+
+
+def _apply_rows(
+    connection: Connection,
+    model: SyncedModel,
+    rows: list[dict[str, Any]],
+    stats: SyncStats,
+    resolve,
+    received_at: datetime,
+) -> list[dict[str, Any]]:
+    """
+    Merges the rows of `model` with last-writer-wins on `last_updated_at`.
+    `resolve` turns a row into the values to write, and the query of the
+    local row to adopt, or returns None if the row cannot be placed.
+    Written rows are marked as received at `received_at`.
+
+    :return list[dict]: the rows that were written.
+    """
+
+    local = _local_rows(connection, model, (row["sync_id"] for row in rows))
+    deleted = _local_tombstones(
+        connection, model.__tablename__, (row["sync_id"] for row in rows)
+    )
+
+    # Local rows that already stand for a row of the changeset.
+    taken = {row.id for row in local.values()}
+
+    written = []
+    for row in rows:
+        resolved = resolve(row)
+        if resolved is None:
+            stats.skipped += 1
+            continue
+
+        values, adoptable = resolved
+        current = local.get(row["sync_id"])
+        if current is None:
+            deleted_at = deleted.get(row["sync_id"])
+            if deleted_at is not None and not _is_newer(
+                row["last_updated_at"], deleted_at
+            ):
+                stats.skipped += 1
+                continue
+
+            current = _adopt(connection, model, row["sync_id"], adoptable, taken)
+
+        if current is not None and not _is_newer(
+            row["last_updated_at"], current.last_updated_at
+        ):
+            stats.skipped += 1
+            continue
+
+        id = _write(
+            connection,
+            model,
+            row["sync_id"],
+            current,
+            {**values, "received_at": received_at},
+        )
+        if id is None:
+            stats.skipped += 1
+            continue
+
+        taken.add(id)
+        if current is None:
+            stats.inserted += 1
+        else:
+            stats.updated += 1
+        written.append(row)
+
+    return written
+
+
+def _apply_tombstones(
+    connection: Connection,
+    tombstones: list[dict[str, Any]],
+    stats: SyncStats,
+    received_at: datetime,
+) -> None:
+    """
+    Deletes the rows that were deleted on the other machine after their last
+    local update, children first, and keeps the tombstones so that older
+    changes cannot bring the rows back.
+    """
+
+    for model in (Review, Flashcard, Deck):
+        table_name = model.__tablename__
+        rows = [row for row in tombstones if row["table_name"] == table_name]
+        local = _local_rows(connection, model, (row["sync_id"] for row in rows))
+
+        for row in rows:
+            current = local.get(row["sync_id"])
+            if current is not None:
+                if _is_newer(current.last_updated_at, row["deleted_at"]):
+                    stats.skipped += 1
+                    continue
+
+                if model is Deck:
+                    has_flashcards = connection.execute(
+                        select(Flashcard.id).where(Flashcard.deck_id == current.id)
+                    ).first()
+                    if has_flashcards:
+                        stats.skipped += 1
+                        continue
+
+                    # Like deleting a deck in the TUI, its sub-decks become
+                    # root decks.
+                    connection.execute(
+                        update(Deck)
+                        .where(Deck.parent_id == current.id)
+                        .values(
+                            parent_id=None,
+                            last_updated_at=Deck.last_updated_at,
+                            received_at=received_at,
+                        )
+                    )
+                elif model is Flashcard:
+                    connection.execute(
+                        delete(Review).where(Review.flashcard_id == current.id)
+                    )
+
+                connection.execute(delete(model).where(model.id == current.id))
+                stats.deleted += 1
+
+            stmt = sqlite_insert(Tombstone).values(
+                table_name=table_name,
+                sync_id=row["sync_id"],
+                deleted_at=row["deleted_at"],
+                received_at=received_at,
+            )
+            connection.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[Tombstone.table_name, Tombstone.sync_id],
+                    set_={
+                        "deleted_at": stmt.excluded.deleted_at,
+                        "received_at": stmt.excluded.received_at,
+                    },
+                )
+            )
+
+
+def apply_changeset(connection: Connection, changeset: dict[str, Any]) -> SyncStats:
+    """
+    Merges a changeset from `export_changeset` into the collection. A row
+    only overwrites the local one if it was updated later, and a deletion
+    only applies to rows that were not updated after it. Rows whose deck or
+    flashcard is not in the collection are skipped.
+
+    Nothing is committed, so that a changeset is applied entirely or not at
+    all.
+    """
+
+    if changeset.get("version") != CHANGESET_VERSION:
+        raise ValueError(f"Unsupported changeset version: {changeset.get('version')!r}")
+
+    stats = SyncStats()
+    received_at = utcnow()
+    assign_sync_ids(connection)
+
+    decks = [_from_json(row) for row in changeset["decks"]]
+    parent = aliased(Deck)
+
+    def resolve_deck(row: dict[str, Any]):
+        adoptable = (
+            select(Deck)
+            .outerjoin(parent, Deck.parent_id == parent.id)
+            .where(
+                Deck.name == row["name"],
+                parent.sync_id.is_(None)
+                if row["parent"] is None
+                else parent.sync_id == row["parent"],
+            )
+        )
+        values = {"name": row["name"], "last_updated_at": row["last_updated_at"]}
+        return values, adoptable
+
+    written = _apply_rows(connection, Deck, decks, stats, resolve_deck, received_at)
+
+    # Parents are set once every deck exists, as they may come later.
+    deck_ids = {
+        sync_id: row.id
+        for sync_id, row in _local_rows(
+            connection, Deck, (row["parent"] for row in written)
+        ).items()
+    }
+    for row in written:
+        try:
+            with connection.begin_nested():
+                connection.execute(
+                    update(Deck)
+                    .where(Deck.sync_id == row["sync_id"])
+                    .values(
+                        parent_id=deck_ids.get(row["parent"]),
+                        last_updated_at=row["last_updated_at"],
+                        received_at=received_at,
+                    )
+                )
+        except IntegrityError:
+            # Moving a deck into one of its sub-decks is refused.
+            pass
+
+    flashcards = [_from_json(row) for row in changeset["flashcards"]]
+    deck_ids = {
+        sync_id: row.id
+        for sync_id, row in _local_rows(
+            connection, Deck, (row["deck"] for row in flashcards)
+        ).items()
+    }
+
+    def resolve_flashcard(row: dict[str, Any]):
+        deck_id = deck_ids.get(row["deck"])
+        if deck_id is None:
+            return None
+
+        hash = content_hash(row["front"], row["back"])
+        values = {
+            "front": row["front"],
+            "back": row["back"],
+            "reversible": row["reversible"],
+            "content_hash": hash,
+            "deck_id": deck_id,
+            "created_at": row["created_at"],
+            "last_updated_at": row["last_updated_at"],
+        }
+        adoptable = select(Flashcard).where(
+            Flashcard.deck_id == deck_id, Flashcard.content_hash == hash
+        )
+        return values, adoptable
+
+    _apply_rows(
+        connection, Flashcard, flashcards, stats, resolve_flashcard, received_at
+    )
+
+    reviews = [_from_json(row) for row in changeset["reviews"]]
+    flashcard_ids = {
+        sync_id: row.id
+        for sync_id, row in _local_rows(
+            connection, Flashcard, (row["flashcard"] for row in reviews)
+        ).items()
+    }
+
+    def resolve_review(row: dict[str, Any]):
+        flashcard_id = flashcard_ids.get(row["flashcard"])
+        if flashcard_id is None:
+            return None
+
+        values = {
+            "flashcard_id": flashcard_id,
+            "reversed": row["reversed"],
+            "ef": row["ef"],
+            "interval": row["interval"],
+            "repetitions": row["repetitions"],
+            "next_review": row["next_review"],
+            "created_at": row["created_at"],
+            "last_updated_at": row["last_updated_at"],
+        }
+        adoptable = select(Review).where(
+            Review.flashcard_id == flashcard_id, Review.reversed == row["reversed"]
+        )
+        return values, adoptable
+
+    _apply_rows(connection, Review, reviews, stats, resolve_review, received_at)
+
+    _apply_tombstones(
+        connection,
+        [_from_json(row) for row in changeset["tombstones"]],
+        stats,
+        received_at,
+    )
+
+    stats.finished_at = perf_counter()
+    return stats
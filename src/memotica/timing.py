@@ -0,0 +1,27 @@
+from dataclasses import dataclass, field
+from time import perf_counter
+
+
+@dataclass(kw_only=True)
+class TimedStats:
+    """
+    The timing shared by the counters of long operations, such as imports,
+    exports, backups and syncs. Subclasses add their counters, and override
+    `rows` to get a throughput.
+    """
+
+    started_at: float = field(default_factory=perf_counter)
+    finished_at: float | None = None
+
+    @property
+    def elapsed(self) -> float:
+        finished_at = self.finished_at or perf_counter()
+        return max(finished_at - self.started_at, 1e-9)
+
+    @property
+    def rows(self) -> int:
+        return 0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.elapsed
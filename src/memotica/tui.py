@@ -1,37 +1,63 @@
-from datetime import datetime
-from sqlalchemy import create_engine
+import asyncio
 from sqlalchemy.orm import Session
-from textual import on
+from textual import on, work
 from textual.app import App, ComposeResult
 from textual.binding import Binding
 from textual.reactive import reactive
-from textual.widgets import Footer, Header
+from textual.containers import Vertical
+from textual.widgets import Footer, Header, Input
 from memotica import messages
 from memotica.config import Config
-from memotica.db import init_db
+from memotica.db import get_engine, init_db
+from memotica.db_worker import DatabaseWorker
+from memotica.review_journal import ReviewAnswer, ReviewJournal, journal_path
 from memotica.messages import (
     AddDeck,
     AddFlashcard,
+    DataChanged,
     DeleteDeck,
     DeleteFlashcard,
     EditDeck,
     EditFlashcard,
+    FinishReview,
+    LoadFlashcards,
     SelectDeck,
     UpdateReview,
 )
 from memotica.modals import HelpModal
+from memotica.changes import Change, Deleted, Inserted
+from memotica.deck_index import DeckIndex
 from memotica.deck_tree import DeckTree
 from memotica.flashcards_table import FlashcardsTable
 from memotica.modals.flashcard_modal import FlashcardModal
 from memotica.models import Deck, Flashcard, Review
-from memotica.repositories import FlashcardRepository, DeckRepository, ReviewRepository
-from memotica.modals import DeckModal, ConfirmationModal
-from memotica.review_screen import ReviewScreen
+from memotica.repositories import (
+    FlashcardRepository,
+    DeckRepository,
+    ReviewRepository,
+    flashcard_row_cursor,
+)
+from memotica.modals import DeckModal, ConfirmationModal, ForecastModal
+from memotica.forecast import load_review_arrays, simulate
+from memotica.review_screen import DEFAULT_PREFETCH, ReviewScreen
+from memotica.settings import Settings
+
+# Seconds without typing before the search box filters the flashcards.
+SEARCH_DELAY = 0.25
 
 
 class Memotica(App):
     """
     An Anki-like application for the terminal.
+
+    Every repository call runs on the `DatabaseWorker` thread from a Textual
+    worker, so input and rendering never wait on SQLite. Objects loaded from
+    the session are read from the event loop, so the session must be
+    created with `expire_on_commit=False`.
+
+    Review answers go to a `ReviewJournal` and are written in batches: every
+    `flush_every` answers, every `flush_interval` seconds, when a review
+    session ends and when the app exits.
     """
 
     TITLE = "Memotica"
@@ -47,51 +73,87 @@ class Memotica(App):
         Binding("ctrl+n", "add_deck", "Add Deck", show=True),
         Binding("ctrl+a", "add_flashcard", "Add Flashcard", show=True),
         Binding("ctrl+r", "reset_reviews", "Reset Deck's Flashcards", show=False),
+        Binding("ctrl+f", "show_forecast", "Forecast", show=False),
+        Binding("ctrl+l", "search", "Search", show=True),
     ]
 
     show_sidebar: reactive[bool] = reactive(True)
     selected_deck: reactive[Deck | None] = reactive(None)
-    decks: reactive[list[Deck] | None] = reactive(None)
 
-    def __init__(self, session: Session, *args, **kwargs):
+    def __init__(
+        self,
+        session: Session,
+        review_journal: ReviewJournal | None = None,
+        review_prefetch: int = DEFAULT_PREFETCH,
+        *args,
+        **kwargs,
+    ):
         super().__init__(*args, **kwargs)
         self.session = session
+        self.review_journal = review_journal or ReviewJournal(
+            journal_path(session.get_bind())
+        )
+        self.review_prefetch = review_prefetch
         self.flashcards_repository = FlashcardRepository(session)
         self.decks_repository = DeckRepository(session)
         self.reviews_repository = ReviewRepository(session)
+        self.deck_index = DeckIndex()
+        self.db = DatabaseWorker()
+
+        # Repositories report changes on the database thread, and
+        # `post_message` hands them over to the event loop.
+        for repository in (self.flashcards_repository, self.decks_repository):
+            repository.subscribe(lambda change: self.post_message(DataChanged(change)))
+
+    @property
+    def decks(self) -> list[Deck]:
+        return list(self.deck_index)
 
     def compose(self) -> ComposeResult:
         yield Header()
         yield DeckTree()
-        yield FlashcardsTable()
+        with Vertical(id="flashcards"):
+            yield Input(placeholder="Search flashcards", id="search")
+            yield FlashcardsTable()
         yield Footer()
 
     def on_mount(self) -> None:
         self.flashcards_table = self.query_one(FlashcardsTable)
         self.deck_tree = self.query_one(DeckTree)
+        self.search_input = self.query_one("#search", Input)
 
+        self.set_interval(self.review_journal.flush_interval, self.__flush_if_pending)
         self.__reload()
 
     def on_quit(self) -> None:
         self.session.flush()
         self.app.exit()
 
+    def on_unmount(self) -> None:
+        self.db.shutdown()
+
+        # The database thread is gone, so the session can be used from here.
+        self.review_journal.flush(self.session)
+        self.review_journal.close()
+
     @on(messages.AddDeck)
     def add_new_deck(self) -> None:
         def add_deck(response: Deck | None) -> None:
             if response:
-                self.decks_repository.add(response)
-                self.__reload()
+                self.save_deck(response)
+
+        self.push_screen(DeckModal(self.deck_index), add_deck)
 
-        self.push_screen(DeckModal(decks=self.decks), add_deck)
+    @work(group="writes")
+    async def save_deck(self, deck: Deck) -> None:
+        await self.db.run(self.decks_repository.add, deck)
 
     @on(messages.SelectDeck)
     def load_deck_flashcards(self, message: SelectDeck) -> None:
-        if message.deck_name:
-            # TODO: Check if deck exists.
-            deck = self.decks_repository.get_by_name(message.deck_name)
-            self.selected_deck = deck
-            self.__reload_flashcards()
+        self.selected_deck = self.deck_index.get(message.deck_id)
+        self.__reload_flashcards()
+
+        if self.selected_deck:
             self.flashcards_table.focus()
 
     @on(messages.EditDeck)
@@ -102,27 +164,30 @@ class Memotica(App):
         def callback(response: Deck | None) -> None:
             assert self.selected_deck
 
-            self.decks_repository.update(
-                self.selected_deck.id,
-                name=response.name,
-                parent_id=response.parent_id,
-            )
-
-            self.notify(
-                "Deck updated!",
-                severity="information",
-                timeout=5,
-            )
-
-            self.__reload()
+            self.save_deck_changes(self.selected_deck.id, response)
 
         assert self.decks
 
         self.push_screen(
-            DeckModal(decks=self.decks, deck=self.selected_deck),
+            DeckModal(self.deck_index, deck=self.selected_deck),
             callback,
         )
 
+    @work(group="writes")
+    async def save_deck_changes(self, deck_id: int, deck: Deck) -> None:
+        await self.db.run(
+            self.decks_repository.update,
+            deck_id,
+            name=deck.name,
+            parent_id=deck.parent_id,
+        )
+
+        self.notify(
+            "Deck updated!",
+            severity="information",
+            timeout=5,
+        )
+
     @on(messages.DeleteDeck)
     def delete_deck(self) -> None:
         if not self.selected_deck:
@@ -130,8 +195,7 @@ class Memotica(App):
 
         def callback(response: bool | None) -> None:
             if response:
-                self.decks_repository.delete(self.selected_deck.id)
-                self.__reload()
+                self.remove_deck(self.selected_deck.id)
 
         self.push_screen(
             ConfirmationModal(
@@ -140,6 +204,147 @@ class Memotica(App):
             callback,
         )
 
+    @work(group="writes")
+    async def remove_deck(self, deck_id: int) -> None:
+        await self.db.run(self.decks_repository.delete, deck_id)
+
+    @on(messages.DataChanged)
+    def apply_change(self, message: DataChanged) -> None:
+        change = message.change
+
+        if change.model is Flashcard:
+            if isinstance(change, Deleted):
+                self.flashcards_table.remove_flashcards(change.ids)
+            else:
+                self.load_changed_flashcards(change)
+        elif change.model is Deck:
+            if isinstance(change, Deleted):
+                self.remove_deck_nodes(change.ids)
+            else:
+                self.load_changed_decks(change)
+
+    @work(group="changes")
+    async def load_changed_flashcards(self, change: Change) -> None:
+        deck_id = self.selected_deck.id if self.selected_deck else None
+        rows = await self.db.run(
+            self.flashcards_repository.get_rows_with_subdecks,
+            deck_id,
+            limit=len(change.ids),
+            search=self.flashcards_table.search,
+            ids=change.ids,
+        )
+
+        if isinstance(change, Inserted):
+            self.flashcards_table.insert_flashcards(rows)
+        else:
+            self.flashcards_table.update_flashcards(change.ids, rows)
+
+    @work(group="changes")
+    async def load_changed_decks(self, change: Change) -> None:
+        def load() -> list[Deck]:
+            return [self.decks_repository.get(id) for id in change.ids]
+
+        for deck in await self.db.run(load):
+            if deck is None:
+                continue
+
+            if isinstance(change, Inserted) or deck.id not in self.deck_index:
+                self.deck_index.add(deck)
+                self.deck_tree.add_deck_node(deck, self.deck_index)
+                continue
+
+            previous_parent_id = self.deck_index.update(deck)
+            self.deck_tree.update_deck_node(deck, self.deck_index)
+            self.flashcards_table.rename_deck(deck.id, deck.name)
+
+            if self.selected_deck and self.selected_deck.id == deck.id:
+                self.selected_deck = deck
+            elif self.selected_deck and previous_parent_id != deck.parent_id:
+                # The deck may have moved into or out of the selected one.
+                self.__reload_flashcards()
+
+    def remove_deck_nodes(self, deck_ids: tuple[int, ...]) -> None:
+        for deck_id in deck_ids:
+            orphan_ids = self.deck_index.remove(deck_id)
+            self.deck_tree.remove_deck_node(deck_id, orphan_ids, self.deck_index)
+
+            if self.selected_deck and self.selected_deck.id == deck_id:
+                self.selected_deck = None
+
+        # The flashcards of the decks were deleted with them.
+        self.__reload_flashcards()
+
+    @on(messages.LoadFlashcards)
+    def load_flashcards(self, message: LoadFlashcards) -> None:
+        deck_id = self.selected_deck.id if self.selected_deck else None
+        self.load_flashcards_window(deck_id, message)
+
+    @work(exclusive=True, group="flashcards")
+    async def load_flashcards_window(
+        self, deck_id: int | None, message: LoadFlashcards
+    ) -> None:
+        def load():
+            total = self.flashcards_repository.count_with_subdecks(
+                deck_id, search=message.search
+            )
+
+            def get_rows(limit: int, **cursors) -> list:
+                return self.flashcards_repository.get_rows_with_subdecks(
+                    deck_id,
+                    limit=limit,
+                    order_by=message.order_by,
+                    descending=message.descending,
+                    search=message.search,
+                    **cursors,
+                )
+
+            if message.after is not None:
+                return (
+                    get_rows(message.limit, after=message.after),
+                    message.offset,
+                    total,
+                )
+
+            # Scrolling up: the window starts half a window before the row of
+            # `before`, or at the start of the selection if it is closer.
+            head = []
+            if message.before is not None:
+                head = get_rows(message.limit // 2, before=message.before)
+            if not head:
+                return get_rows(message.limit), 0, total
+
+            tail = get_rows(
+                message.limit - len(head), after=flashcard_row_cursor(head[-1])
+            )
+            offset = message.offset - len(head)
+            if len(head) < message.limit // 2 or offset < 0:
+                offset = 0
+
+            return head + tail, offset, total
+
+        # Typing in the search box supersedes loads that are still running.
+        result = await self.db.run_interruptible(self.session, load)
+        if result is None:
+            return
+
+        self.flashcards_table.show_window(*result)
+
+    @on(Input.Changed, "#search")
+    def search_flashcards(self, event: Input.Changed) -> None:
+        self.apply_search(event.value)
+
+    @on(Input.Submitted, "#search")
+    def focus_flashcards(self) -> None:
+        self.flashcards_table.focus()
+
+    @work(exclusive=True, group="search")
+    async def apply_search(self, search: str) -> None:
+        # Waits for the user to stop typing before running the search.
+        await asyncio.sleep(SEARCH_DELAY)
+
+        self.flashcards_table.search = search.strip() or None
+        self.flashcards_table.reload()
+
     def on_add_flashcard(self, _: AddFlashcard) -> None:
         if not self.decks:
             self.notify(
@@ -153,6 +358,20 @@ class Memotica(App):
             if not result:
                 return
 
+            self.save_flashcard(result)
+
+        self.push_screen(
+            FlashcardModal(decks=self.decks, current_deck=self.selected_deck), callback
+        )
+
+    @work(group="writes")
+    async def save_flashcard(self, result: Flashcard) -> None:
+        def save() -> bool:
+            if self.flashcards_repository.find_duplicate(
+                result.deck_id, result.front, result.back
+            ):
+                return False
+
             flashcard = self.flashcards_repository.add(result)
             self.reviews_repository.add(Review(flashcard=flashcard))
 
@@ -161,25 +380,44 @@ class Memotica(App):
                     Review(flashcard_id=flashcard.id, reversed=True)
                 )
 
-            self.__reload_flashcards()
+            return True
 
-        self.push_screen(
-            FlashcardModal(decks=self.decks, current_deck=self.selected_deck), callback
-        )
+        if not await self.db.run(save):
+            self.__notify_duplicate()
 
-    def on_edit_flashcard(self, message: EditFlashcard) -> None:
-        flashcard = self.flashcards_repository.get(message.flashcard_id)
+    @work(exclusive=True, group="edit_flashcard")
+    async def on_edit_flashcard(self, message: EditFlashcard) -> None:
+        flashcard = await self.db.run(
+            self.flashcards_repository.get, message.flashcard_id
+        )
         if not flashcard:
             return
 
         def callback(result: Flashcard | None) -> None:
+            self.save_flashcard_changes(flashcard, result)
+
+        assert self.decks
+
+        self.app.push_screen(
+            FlashcardModal(self.decks, self.selected_deck, flashcard), callback
+        )
+
+    @work(group="writes")
+    async def save_flashcard_changes(
+        self, flashcard: Flashcard, result: Flashcard
+    ) -> None:
+        def save() -> bool:
+            if self.flashcards_repository.find_duplicate(
+                result.deck_id, result.front, result.back, exclude_id=flashcard.id
+            ):
+                return False
+
             self.flashcards_repository.update(
                 flashcard.id,
                 reversible=result.reversible,
                 front=result.front,
                 back=result.back,
                 deck_id=result.deck_id,
-                last_updated_at=datetime.now(),
             )
 
             self.reviews_repository.delete_by_flashcard(flashcard.id)
@@ -188,41 +426,53 @@ class Memotica(App):
             if result.reversible:
                 self.reviews_repository.add(Review(flashcard=flashcard, reversed=True))
 
-            self.notify(
-                "Flashcard updated",
-                severity="information",
-                timeout=5,
-            )
-
-            self.__reload_flashcards()
+            return True
 
-        assert self.decks
+        if not await self.db.run(save):
+            self.__notify_duplicate()
+            return
 
-        self.app.push_screen(
-            FlashcardModal(self.decks, self.selected_deck, flashcard), callback
+        self.notify(
+            "Flashcard updated",
+            severity="information",
+            timeout=5,
         )
 
     def on_delete_flashcard(self, message: DeleteFlashcard) -> None:
         def callback(_: bool | None) -> None:
-            self.flashcards_repository.delete(message.flashcard_id)
-            self.__reload_flashcards()
+            self.remove_flashcard(message.flashcard_id)
 
         self.app.push_screen(
             ConfirmationModal("Are you sure that you want to delete this flashcard?"),
             callback,
         )
 
+    @work(group="writes")
+    async def remove_flashcard(self, flashcard_id: int) -> None:
+        await self.db.run(self.flashcards_repository.delete, flashcard_id)
+
     def on_update_review(self, message: UpdateReview) -> None:
-        review_id = message.review_id
-        self.reviews_repository.update(
-            review_id,
-            repetitions=message.repetitions,
-            ef=message.ef,
-            interval=message.interval,
-            next_review=message.next_review,
-            last_updated_at=message.last_updated_at,
+        should_flush = self.review_journal.record(
+            ReviewAnswer(
+                review_id=message.review_id,
+                repetitions=message.repetitions,
+                ef=message.ef,
+                interval=message.interval,
+                next_review=message.next_review,
+                last_updated_at=message.last_updated_at,
+            )
         )
 
+        if should_flush:
+            self.flush_reviews()
+
+    def on_finish_review(self, _: FinishReview) -> None:
+        self.__flush_if_pending()
+
+    @work(group="writes")
+    async def flush_reviews(self) -> None:
+        await self.db.run(self.review_journal.flush, self.session)
+
     def action_show_help(self) -> None:
         self.push_screen(HelpModal())
 
@@ -238,13 +488,17 @@ class Memotica(App):
         else:
             self.deck_tree.add_class("hide")
 
+    def action_search(self) -> None:
+        self.search_input.focus()
+
     def action_add_deck(self) -> None:
         self.deck_tree.add_deck()
 
     def action_add_flashcard(self) -> None:
         self.flashcards_table.add_flashcard()
 
-    def action_start_review(self) -> None:
+    @work(exclusive=True, group="start_review")
+    async def action_start_review(self) -> None:
         if not self.selected_deck:
             self.notify(
                 "You need to select a Deck first!",
@@ -253,14 +507,15 @@ class Memotica(App):
             )
             return
 
-        deck_and_subdecks = self.decks_repository.get_with_subdecks(
-            self.selected_deck.id
-        )
-        reviews = [
-            review
-            for deck in deck_and_subdecks
-            for review in self.reviews_repository.get_pending(deck.id)
-        ]
+        def load() -> list[Review]:
+            # Answers still in the journal would bring their cards back.
+            self.review_journal.flush(self.session)
+            return self.reviews_repository.get_pending_with_subdecks(
+                deck_id, with_flashcards=False
+            )
+
+        deck_id = self.selected_deck.id
+        reviews = await self.db.run(load)
 
         if not reviews:
             self.notify(
@@ -270,7 +525,32 @@ class Memotica(App):
             )
             return
 
-        self.push_screen(ReviewScreen(reviews=reviews, name="review"))
+        self.push_screen(
+            ReviewScreen(
+                reviews=reviews,
+                load_contents=self.load_flashcard_contents,
+                prefetch=self.review_prefetch,
+                name="review",
+            )
+        )
+
+    async def load_flashcard_contents(self, ids: list[int]) -> dict:
+        return await self.db.run(self.flashcards_repository.get_contents, ids)
+
+    @work(exclusive=True, group="forecast")
+    async def action_show_forecast(self) -> None:
+        deck = self.selected_deck
+
+        def forecast():
+            # Answers still in the journal would count as due.
+            self.review_journal.flush(self.session)
+            reviews = load_review_arrays(self.session, deck.id if deck else None)
+            return simulate(reviews)
+
+        due = await self.db.run(forecast)
+
+        title = f"Forecast for '{deck.name}'" if deck else "Forecast"
+        self.push_screen(ForecastModal(title, due))
 
     def action_reset_reviews(self) -> None:
         if not self.selected_deck:
@@ -284,21 +564,8 @@ class Memotica(App):
         def callback(response: bool | None) -> None:
             assert self.selected_deck
 
-            deck_and_subdecks = self.decks_repository.get_with_subdecks(
-                self.selected_deck.id
-            )
-            ids = [deck.id for deck in deck_and_subdecks]
-            flashcards = self.flashcards_repository.get_by_decks(ids)
-
-            for flashcard in flashcards:
-                self.reviews_repository.delete_by_flashcard(flashcard.id)
-                self.reviews_repository.add(Review(flashcard=flashcard))
-                if flashcard.reversible:
-                    self.reviews_repository.add(
-                        Review(flashcard_id=flashcard.id, reversed=True)
-                    )
-
-            self.__reload()
+            if response:
+                self.reset_deck_reviews(self.selected_deck.id)
 
         self.app.push_screen(
             ConfirmationModal(
@@ -307,21 +574,41 @@ class Memotica(App):
             callback,
         )
 
-    def __reload_decks(self) -> None:
-        self.decks = self.decks_repository.get_all()
-        self.deck_tree.reload(self.decks)
+    @work(group="writes")
+    async def reset_deck_reviews(self, deck_id: int) -> None:
+        def reset() -> tuple[int, int]:
+            # Answers still in the journal would undo the reset.
+            self.review_journal.flush(self.session)
+            return self.reviews_repository.reset_with_subdecks(deck_id)
+
+        _, created = await self.db.run(reset)
+
+        self.notify(
+            f"{created} reviews reset!",
+            severity="information",
+            timeout=5,
+        )
+
+        self.__reload()
+
+    def __notify_duplicate(self) -> None:
+        self.notify(
+            "This deck already has a flashcard with the same front and back.",
+            severity="error",
+            timeout=5,
+        )
+
+    def __flush_if_pending(self) -> None:
+        if self.review_journal.has_pending:
+            self.flush_reviews()
+
+    @work(exclusive=True, group="decks")
+    async def __reload_decks(self) -> None:
+        self.deck_index = await self.db.run(self.decks_repository.get_index)
+        self.deck_tree.reload(self.deck_index)
 
     def __reload_flashcards(self) -> None:
-        if self.selected_deck:
-            deck_and_subdecks = self.decks_repository.get_with_subdecks(
-                self.selected_deck.id
-            )
-            ids = [deck.id for deck in deck_and_subdecks]
-            flashcards = self.flashcards_repository.get_by_decks(ids)
-            self.flashcards_table.reload(flashcards)
-        else:
-            flashcards = self.flashcards_repository.get_all()
-            self.flashcards_table.reload(flashcards)
+        self.flashcards_table.reload()
 
     def __reload(self) -> None:
         self.__reload_decks()
@@ -330,9 +617,16 @@ class Memotica(App):
 
 if __name__ == "__main__":
     config = Config()
-    engine = create_engine(f"{config.sqlite_url}")
+    settings = Settings()
+    engine = get_engine(config.sqlite_url, settings.app.storage_profile)
     init_db(engine)
 
-    with Session(engine) as session:
-        app = Memotica(session)
+    review_journal = ReviewJournal(
+        journal_path(engine),
+        flush_every=settings.app.review_flush_every,
+        flush_interval=settings.app.review_flush_interval,
+    )
+
+    with Session(engine, expire_on_commit=False) as session:
+        app = Memotica(session, review_journal, settings.app.review_prefetch)
         app.run()
@@ -1,15 +1,58 @@
 import pytest
-from sqlalchemy import create_engine
+from sqlalchemy import StaticPool, create_engine
 from sqlalchemy.orm import Session
+from memotica.db import get_engine
 from memotica.models import Base
 from memotica.repositories import DeckRepository, FlashcardRepository, ReviewRepository
 
 
-@pytest.fixture(scope="function", autouse=True)
-def session():
-    engine = create_engine("sqlite:///:memory:")
-    Base.metadata.create_all(engine)
+@pytest.fixture(scope="function")
+def make_engine():
+    """
+    Creates in-memory databases, such as the other machines of a sync.
+    """
+
+    engines = []
+
+    def make_engine():
+        # The TUI talks to the database from its own thread, so every thread
+        # has to share the one connection holding the in-memory database.
+        engine = create_engine(
+            "sqlite:///:memory:",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        Base.metadata.create_all(engine)
+        engines.append(engine)
+        return engine
+
+    yield make_engine
+
+    for engine in engines:
+        engine.dispose()
+
+
+@pytest.fixture(scope="function")
+def engine(make_engine):
+    return make_engine()
+
 
+@pytest.fixture
+def file_engine(tmp_path):
+    """
+    An empty database in a file, for what in-memory databases do not
+    support, like backups and journal modes.
+    """
+
+    engine = get_engine(f"sqlite:///{tmp_path / 'memotica.db'}")
+
+    yield engine
+
+    engine.dispose()
+
+
+@pytest.fixture(scope="function", autouse=True)
+def session(engine):
     with Session(engine) as session:
         yield session
 
@@ -0,0 +1,119 @@
+import gzip
+import sqlite3
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from memotica.backup import backup_database, restore_database
+from memotica.db import get_engine, init_db
+from memotica.migrations import SCHEMA_VERSION
+from memotica.models import Deck, Flashcard
+
+
+@pytest.fixture(autouse=True)
+def flashcards(file_engine):
+    init_db(file_engine)
+
+    with Session(file_engine) as session:
+        german = Deck(name="German")
+        session.add_all(
+            Flashcard(front=f"Wort {i}", back=f"Word {i}", deck=german)
+            for i in range(500)
+        )
+        session.commit()
+
+
+def count_flashcards(engine) -> int:
+    with engine.connect() as connection:
+        return connection.execute(text("SELECT count(*) FROM flashcards")).scalar()
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_backup_and_restore(tmp_path, file_engine, compress):
+    backup_file = tmp_path / "backup.db"
+    progress = []
+
+    stats = backup_database(
+        file_engine,
+        backup_file,
+        pages=4,
+        compress=compress,
+        on_progress=lambda copied, total: progress.append((copied, total)),
+    )
+
+    assert stats.pages == progress[-1][1]
+    assert len(progress) > 1
+    assert progress[-1][0] == progress[-1][1]
+    with open(backup_file, "rb") as file:
+        assert (file.read(2) == b"\x1f\x8b") == compress
+    # No temporary file is left next to the backup.
+    assert [
+        file.name for file in tmp_path.iterdir() if not file.name.startswith("memotica")
+    ] == ["backup.db"]
+
+    engine = get_engine(f"sqlite:///{tmp_path / 'restored.db'}")
+    init_db(engine)
+    assert count_flashcards(engine) == 0
+
+    restore_database(engine, backup_file, pages=4)
+
+    assert count_flashcards(engine) == 500
+    with engine.connect() as connection:
+        assert connection.execute(text("PRAGMA integrity_check")).scalar() == "ok"
+        # The restored database keeps its own journal mode.
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+    engine.dispose()
+
+
+def test_backup_is_a_snapshot_of_concurrent_writes(tmp_path, file_engine):
+    writer = sqlite3.connect(tmp_path / "memotica.db")
+    written = []
+
+    def write_once(copied: int, total: int) -> None:
+        if not written:
+            writer.execute("UPDATE flashcards SET back = 'changed' WHERE id = 1")
+            writer.commit()
+            written.append(copied)
+
+    backup_database(
+        file_engine, tmp_path / "backup.db", pages=1, on_progress=write_once
+    )
+    writer.close()
+
+    backup = sqlite3.connect(tmp_path / "backup.db")
+    assert backup.execute("SELECT back FROM flashcards WHERE id = 1").fetchone() == (
+        "changed",
+    )
+    assert backup.execute("SELECT count(*) FROM flashcards").fetchone() == (500,)
+    backup.close()
+
+
+@pytest.mark.parametrize(
+    "content",
+    [b"not a database" * 100, gzip.compress(b"not a database"), b"\x1f\x8b\x08"],
+)
+def test_restore_invalid_backup(tmp_path, file_engine, content):
+    backup_file = tmp_path / "backup.db"
+    backup_file.write_bytes(content)
+
+    with pytest.raises(ValueError):
+        restore_database(file_engine, backup_file)
+
+    assert count_flashcards(file_engine) == 500
+
+
+def test_restore_refuses_newer_backups(tmp_path, file_engine):
+    backup_file = tmp_path / "backup.db"
+    backup_database(file_engine, backup_file)
+    backup = sqlite3.connect(backup_file)
+    backup.execute("DELETE FROM flashcards")
+    backup.execute(f"PRAGMA user_version = {SCHEMA_VERSION + 1}")
+    backup.commit()
+    backup.close()
+
+    with pytest.raises(ValueError):
+        restore_database(file_engine, backup_file)
+
+    assert count_flashcards(file_engine) == 500
+    with file_engine.connect() as connection:
+        version = connection.execute(text("PRAGMA user_version")).scalar()
+        assert version == SCHEMA_VERSION
@@ -0,0 +1,193 @@
+from io import StringIO
+import pytest
+from memotica import bulk
+from memotica.models import Deck, Flashcard, Review
+
+CSV = """front,back,reversible,deck
+Wasser,Water,True,German
+Kuh,Cow,False,German
+Hund,Dog,False,German
+Neko,Cat,True,Japanese
+Inu,Dog,False,Japanese
+"""
+
+
+class TestImportFlashcards:
+    def test_import(self, engine, flashcard_repository, review_repository):
+        with engine.connect() as connection:
+            stats = bulk.import_flashcards(
+                connection, bulk.read_flashcards_csv(StringIO(CSV), chunk_size=2)
+            )
+
+        assert stats.decks == 2
+        assert stats.flashcards == 5
+        assert stats.reviews == 7
+
+        flashcards = flashcard_repository.get_all()
+        assert len(flashcards) == 5
+        assert {flashcard.deck.name for flashcard in flashcards} == {
+            "German",
+            "Japanese",
+        }
+
+        wasser = next(
+            flashcard for flashcard in flashcards if flashcard.front == "Wasser"
+        )
+        assert wasser.reversible
+        assert sorted(review.reversed for review in wasser.reviews) == [False, True]
+
+        reviews = review_repository.get_all()
+        assert len(reviews) == 7
+        assert all(isinstance(review, Review) for review in reviews)
+        assert all(review.ef == 2.5 and review.repetitions == 0 for review in reviews)
+
+        sync_ids = [row.sync_id for row in [*flashcards, *reviews]]
+        assert all(sync_ids) and len(set(sync_ids)) == len(sync_ids)
+
+    def test_import_commit_every_chunk(self, engine, flashcard_repository):
+        with engine.connect() as connection:
+            stats = bulk.import_flashcards(
+                connection,
+                bulk.read_flashcards_csv(StringIO(CSV), chunk_size=1),
+                commit_every_chunk=True,
+            )
+
+        assert stats.flashcards == 5
+        assert len(flashcard_repository.get_all()) == 5
+
+    def test_import_appends_to_existing_flashcards(self, engine, flashcard_repository):
+        for _ in range(2):
+            with engine.connect() as connection:
+                bulk.import_flashcards(
+                    connection,
+                    bulk.read_flashcards_csv(StringIO(CSV)),
+                    on_duplicate="keep",
+                )
+
+        flashcards = flashcard_repository.get_all()
+        assert len(flashcards) == 10
+        assert len({flashcard.id for flashcard in flashcards}) == 10
+        assert all(isinstance(flashcard, Flashcard) for flashcard in flashcards)
+        assert sum(flashcard.content_hash is None for flashcard in flashcards) == 5
+
+    def test_import_skips_duplicates(
+        self, engine, deck_repository, flashcard_repository
+    ):
+        deck_repository.add(Deck(name="German"))
+        csv = CSV + "  WASSER ,water,False,German\nFeuer,Fire,False,German\n"
+
+        with engine.connect() as connection:
+            stats = bulk.import_flashcards(
+                connection, bulk.read_flashcards_csv(StringIO(csv), chunk_size=2)
+            )
+        assert stats.decks == 1
+        assert stats.flashcards == 6
+        assert stats.skipped == 1
+
+        with engine.connect() as connection:
+            stats = bulk.import_flashcards(
+                connection, bulk.read_flashcards_csv(StringIO(csv), chunk_size=3)
+            )
+        assert stats.decks == 0
+        assert stats.flashcards == 0
+        assert stats.skipped == 7
+
+        assert len(deck_repository.get_all()) == 2
+        assert len(flashcard_repository.get_all()) == 6
+
+    def test_import_updates_duplicates(
+        self, engine, flashcard_repository, review_repository
+    ):
+        with engine.connect() as connection:
+            bulk.import_flashcards(connection, bulk.read_flashcards_csv(StringIO(CSV)))
+
+        csv = "front,back,reversible,deck\nwasser,Water,False,German\nKuh,Cow,True,German\n"
+        with engine.connect() as connection:
+            stats = bulk.import_flashcards(
+                connection,
+                bulk.read_flashcards_csv(StringIO(csv)),
+                on_duplicate="update",
+            )
+
+        assert stats.updated == 2
+        assert stats.flashcards == 0
+        assert stats.reviews == 1
+
+        flashcards = {
+            flashcard.back: flashcard for flashcard in flashcard_repository.get_all()
+        }
+        assert flashcards["Water"].front == "wasser"
+        assert [review.reversed for review in flashcards["Water"].reviews] == [False]
+        assert sorted(review.reversed for review in flashcards["Cow"].reviews) == [
+            False,
+            True,
+        ]
+        assert len(review_repository.get_all()) == 7
+
+    def test_import_keeps_cells_as_text(self, engine, flashcard_repository):
+        csv = (
+            "front,back,reversible,deck\n"
+            '"How many legs does a spider have?",8,False,Biology\n'
+            "Nothing,None,,Biology\n"
+            "Unknown,NA,True,2024\n"
+        )
+
+        with engine.connect() as connection:
+            stats = bulk.import_flashcards(
+                connection, bulk.read_flashcards_csv(StringIO(csv))
+            )
+
+        assert stats.flashcards == 3
+        assert {
+            (flashcard.back, flashcard.reversible, flashcard.deck.name)
+            for flashcard in flashcard_repository.get_all()
+        } == {("8", False, "Biology"), ("None", False, "Biology"), ("NA", True, "2024")}
+
+
+class TestRestoreTable:
+    def test_restore(self, engine, deck_repository, flashcard_repository):
+        decks = "id,name,parent_id\n1,German,\n2,Verbs,1.0\n"
+        flashcards = (
+            "id,front,back,reversible,created_at,last_updated_at,deck_id\n"
+            "1,Wasser,Water,True,2024-09-01 10:00:00,2024-09-01 10:00:00,1\n"
+            '2,"gehen\nlaufen",01,False,2024-09-01 10:00:00.123456,2024-09-01 10:00:00,2\n'
+        )
+
+        with engine.connect() as connection:
+            rows = bulk.restore_table(
+                connection,
+                Deck.__table__,
+                bulk.read_table_csv(StringIO(decks), chunk_size=1),
+            )
+            rows += bulk.restore_table(
+                connection,
+                Flashcard.__table__,
+                bulk.read_table_csv(StringIO(flashcards), chunk_size=1),
+            )
+            connection.commit()
+
+        assert rows == 4
+
+        verbs = deck_repository.get(2)
+        assert verbs is not None
+        assert verbs.parent_id == 1
+
+        wasser = flashcard_repository.get(1)
+        assert wasser is not None
+        assert wasser.reversible is True
+
+        gehen = flashcard_repository.get(2)
+        assert gehen is not None
+        assert gehen.front == "gehen\nlaufen"
+        assert gehen.back == "01"
+        assert gehen.reversible is False
+        assert gehen.deck.name == "Verbs"
+
+    def test_restore_unknown_columns(self, engine):
+        with engine.connect() as connection:
+            with pytest.raises(ValueError):
+                bulk.restore_table(
+                    connection,
+                    Deck.__table__,
+                    bulk.read_table_csv(StringIO("id,title\n1,German\n")),
+                )
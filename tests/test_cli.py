@@ -0,0 +1,101 @@
+import os
+import subprocess
+import sys
+import pytest
+from click.testing import CliRunner
+import memotica
+from memotica.commands.forecast_command import forecast_command
+from memotica.commands.stats_command import show_stats
+from memotica.models import Deck, Flashcard
+
+SRC_DIR = os.path.dirname(os.path.dirname(memotica.__file__))
+
+HEAVY_MODULES = {"pandas", "numpy", "textual"}
+
+
+def import_times(tmp_path, args: list[str]) -> tuple[set[str], float]:
+    """
+    Runs memotica with `-X importtime` and returns the modules it imported
+    and the time, in seconds, spent importing them.
+    """
+    env = {
+        **os.environ,
+        "ENVIRONMENT": "development",
+        "PYTHONPATH": os.pathsep.join(filter(None, [SRC_DIR, os.getenv("PYTHONPATH")])),
+    }
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "memotica", *args],
+        cwd=tmp_path,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    modules, total = set(), 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        modules.add(name.strip().split(".")[0])
+        # Nested imports are indented further, and already counted by their parent.
+        if not name[1:].startswith(" "):
+            total += int(cumulative)
+    return modules, total / 1e6
+
+
+@pytest.mark.parametrize(
+    ("args", "allowed", "budget"),
+    [
+        (["--help"], set(), 0.3),
+        (["export", "--help"], set(), 1.0),
+        (["stats", "--help"], set(), 1.0),
+        (["forecast", "--help"], {"numpy"}, 1.0),
+        (["import", "--help"], {"pandas", "numpy"}, 1.5),
+        (["backup", "--help"], set(), 1.0),
+        (["restore", "--help"], set(), 1.0),
+        (["sync", "export", "--help"], set(), 1.0),
+    ],
+)
+def test_startup_imports(tmp_path, args, allowed, budget):
+    modules, elapsed = import_times(tmp_path, args)
+
+    assert modules & HEAVY_MODULES == allowed
+    assert elapsed < budget
+
+
+def test_help_does_not_touch_the_database(tmp_path):
+    modules, _ = import_times(tmp_path, ["--help"])
+
+    assert "sqlalchemy" not in modules
+    assert not (tmp_path / "memotica.db").exists()
+
+
+@pytest.fixture
+def verbs(session):
+    # Deck names are only unique among their siblings.
+    session.add_all(
+        Flashcard(
+            front=front, back=back, deck=Deck(name="Verbs", parent=Deck(name=parent))
+        )
+        for parent, front, back in (
+            ("German", "gehen", "to go"),
+            ("Spanish", "ir", "to go"),
+        )
+    )
+    session.commit()
+
+
+@pytest.mark.parametrize("command", [show_stats, forecast_command])
+def test_deck_option_with_duplicate_names(engine, verbs, command):
+    runner = CliRunner()
+
+    result = runner.invoke(command, ["--deck", "Verbs"], obj={"engine": engine})
+    assert result.exit_code == 2
+    assert "'German/Verbs', 'Spanish/Verbs'" in result.output
+
+    result = runner.invoke(command, ["--deck", "Spanish/Verbs"], obj={"engine": engine})
+    assert result.exit_code == 0
+
+    result = runner.invoke(command, ["--deck", "French"], obj={"engine": engine})
+    assert "Deck 'French' not found!" in result.output
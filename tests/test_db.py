@@ -0,0 +1,291 @@
+import asyncio
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from memotica import migrations
+from memotica.db import get_engine, init_db
+from memotica.db_worker import DatabaseWorker
+from memotica.migrations import SCHEMA_VERSION, get_schema_version, migrate
+from memotica.models import Deck, Flashcard, Review
+from memotica.repositories import (
+    DeckRepository,
+    FlashcardRepository,
+    rebuild_content_hashes,
+)
+from memotica.settings import STORAGE_PROFILES
+
+
+@pytest.mark.parametrize("profile", STORAGE_PROFILES)
+def test_get_engine_applies_storage_profile(tmp_path, profile):
+    engine = get_engine(f"sqlite:///{tmp_path / 'memotica.db'}", profile)
+    expected = STORAGE_PROFILES[profile]
+
+    with engine.connect() as connection:
+
+        def pragma(name: str):
+            return connection.execute(text(f"PRAGMA {name}")).scalar()
+
+        assert pragma("journal_mode") == expected.journal_mode
+        assert pragma("synchronous") == ["off", "normal", "full", "extra"].index(
+            expected.synchronous
+        )
+        assert pragma("cache_size") == expected.cache_size
+        assert pragma("temp_store") == ["default", "file", "memory"].index(
+            expected.temp_store
+        )
+        assert pragma("busy_timeout") == expected.busy_timeout
+        assert pragma("foreign_keys") == expected.foreign_keys
+
+    engine.dispose()
+
+
+def test_migrate_indexes_existing_flashcards(engine):
+    with Session(engine) as session:
+        session.add(Flashcard(front="Wasser", back="Water", deck=Deck(name="German")))
+        session.commit()
+
+    # A database created before flashcards could be searched.
+    with engine.begin() as connection:
+        for name in ("insert", "delete", "update"):
+            connection.execute(text(f"DROP TRIGGER flashcards_{name}_fts"))
+        connection.execute(text("DROP TABLE flashcards_fts"))
+
+    assert migrate(engine) == SCHEMA_VERSION
+    assert migrate(engine) == 0
+
+    with Session(engine) as session:
+        repository = FlashcardRepository(session)
+        assert [row.front for row in repository.search("water")] == ["Wasser"]
+
+        repository.update(1, back="Agua")
+        assert [row.front for row in repository.search("agua")] == ["Wasser"]
+
+
+def test_run_interruptible_stops_superseded_queries(session):
+    worker = DatabaseWorker()
+    endless = text(
+        "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) "
+        "SELECT count(*) FROM n"
+    )
+
+    async def cancel_query():
+        task = asyncio.create_task(
+            worker.run_interruptible(session, lambda: session.execute(endless))
+        )
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        # The thread is free again, and the session still usable.
+        return await asyncio.wait_for(
+            worker.run(lambda: session.execute(text("SELECT 1")).scalar()), 1
+        )
+
+    assert asyncio.run(cancel_query()) == 1
+    worker.shutdown()
+
+
+def test_migrate_hashes_existing_flashcards(engine):
+    # A database created before content hashes, with a duplicate.
+    with engine.begin() as connection:
+        connection.execute(text("DROP INDEX ux_flashcards_content"))
+        connection.execute(text("ALTER TABLE flashcards DROP COLUMN content_hash"))
+        connection.execute(text("INSERT INTO decks (name) VALUES ('German')"))
+        connection.execute(
+            text(
+                "INSERT INTO flashcards "
+                "(front, back, reversible, deck_id, created_at, last_updated_at) "
+                "VALUES (:front, 'Water', 0, 1, '2024-09-01', '2024-09-01')"
+            ),
+            [{"front": front} for front in ("Wasser", "wasser", "Feuer")],
+        )
+
+    migrate(engine)
+
+    with Session(engine) as session:
+        hashes = session.execute(
+            text("SELECT front, content_hash FROM flashcards ORDER BY id")
+        ).all()
+        assert [front for front, hash in hashes if hash] == ["Wasser", "Feuer"]
+
+        repository = FlashcardRepository(session)
+        assert repository.find_duplicate(1, " WASSER", "water") == 1
+        assert repository.find_duplicate(1, "Wasser", "water", exclude_id=1) is None
+
+
+def test_rebuild_content_hashes_keeps_existing_hashes(engine, session):
+    # Restored from a backup from before content hashes, next to one after.
+    session.add(Flashcard(front="Wasser", back="Water", deck=Deck(name="German")))
+    session.commit()
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                "INSERT INTO flashcards "
+                "(front, back, reversible, deck_id, created_at, last_updated_at) "
+                "VALUES (:front, 'Water', 0, 1, '2024-09-01', '2024-09-01')"
+            ),
+            [{"front": front} for front in ("WASSER", "Feuer", "feuer ")],
+        )
+
+        assert rebuild_content_hashes(connection) == 1
+        assert rebuild_content_hashes(connection) == 0
+
+        hashes = connection.execute(
+            text("SELECT front, content_hash FROM flashcards ORDER BY id")
+        ).all()
+        assert [front for front, hash in hashes if hash] == ["Wasser", "Feuer"]
+
+
+def test_migrate_adds_sync_ids(engine):
+    with Session(engine) as session:
+        session.add(Flashcard(front="Wasser", back="Water", deck=Deck(name="German")))
+        session.commit()
+
+    # A database created before collections could be synced.
+    with engine.begin() as connection:
+        for table_name in ("decks", "flashcards", "reviews"):
+            connection.execute(text(f"DROP TRIGGER {table_name}_insert_tombstone"))
+            connection.execute(text(f"DROP INDEX ux_{table_name}_sync_id"))
+            connection.execute(text(f"ALTER TABLE {table_name} DROP COLUMN sync_id"))
+        connection.execute(text("ALTER TABLE decks DROP COLUMN last_updated_at"))
+
+    assert migrate(engine) == SCHEMA_VERSION
+    assert migrate(engine) == 0
+
+    with Session(engine) as session:
+        deck = session.get(Deck, 1)
+        assert deck.last_updated_at is not None
+        assert len(deck.sync_id) == 32
+        sync_id = deck.flashcards[0].sync_id
+        assert len(sync_id) == 32
+
+        FlashcardRepository(session).delete(1)
+        tombstones = session.execute(text("SELECT table_name, sync_id FROM tombstones"))
+        assert tombstones.all() == [("flashcards", sync_id)]
+
+
+# The schema of the first release of memotica.
+BASELINE_SCHEMA = (
+    """
+    CREATE TABLE decks (
+        id INTEGER NOT NULL PRIMARY KEY,
+        name VARCHAR(50) NOT NULL,
+        parent_id INTEGER REFERENCES decks (id)
+    )
+    """,
+    """
+    CREATE TABLE flashcards (
+        id INTEGER NOT NULL PRIMARY KEY,
+        front VARCHAR NOT NULL,
+        back VARCHAR NOT NULL,
+        reversible BOOLEAN NOT NULL,
+        created_at DATETIME NOT NULL,
+        last_updated_at DATETIME NOT NULL,
+        deck_id INTEGER NOT NULL REFERENCES decks (id)
+    )
+    """,
+    "CREATE INDEX ix_flashcards_deck_id ON flashcards (deck_id)",
+    """
+    CREATE TABLE reviews (
+        id INTEGER NOT NULL PRIMARY KEY,
+        ef FLOAT NOT NULL,
+        interval INTEGER NOT NULL,
+        repetitions INTEGER NOT NULL,
+        next_review DATE NOT NULL,
+        reversed BOOLEAN NOT NULL,
+        created_at DATETIME NOT NULL,
+        last_updated_at DATETIME NOT NULL,
+        flashcard_id INTEGER NOT NULL REFERENCES flashcards (id)
+    )
+    """,
+    "CREATE INDEX ix_reviews_flashcard_id ON reviews (flashcard_id)",
+    "INSERT INTO decks (name) VALUES ('German')",
+    "INSERT INTO decks (name, parent_id) VALUES ('Verbs', 1)",
+    """
+    INSERT INTO flashcards
+    (front, back, reversible, created_at, last_updated_at, deck_id)
+    VALUES ('gehen', 'to go', 0, '2024-09-01', '2024-09-01', 2)
+    """,
+    """
+    INSERT INTO reviews (
+        ef, interval, repetitions, next_review, reversed,
+        created_at, last_updated_at, flashcard_id
+    )
+    VALUES (2.5, 1, 0, '2024-09-02', 0, '2024-09-01', '2024-09-01', 1)
+    """,
+)
+
+
+def test_init_db_creates_new_databases_at_the_latest_version(file_engine):
+    progress = []
+    init_db(file_engine, lambda *args: progress.append(args))
+
+    assert progress == []
+    with file_engine.connect() as connection:
+        assert get_schema_version(connection) == SCHEMA_VERSION
+    assert migrate(file_engine) == 0
+
+
+def test_migrate_baseline_database(file_engine):
+    with file_engine.begin() as connection:
+        for statement in BASELINE_SCHEMA:
+            connection.exec_driver_sql(statement)
+
+    progress = []
+    assert migrate(file_engine, lambda *args: progress.append(args)) == len(
+        migrations.MIGRATIONS
+    )
+
+    assert [(applied, total) for applied, total, _ in progress] == [
+        (applied, SCHEMA_VERSION) for applied in range(SCHEMA_VERSION)
+    ]
+    with Session(file_engine) as session:
+        assert get_schema_version(session.connection()) == SCHEMA_VERSION
+        verbs = DeckRepository(session).get_by_name("Verbs")
+        assert verbs.sync_id is not None
+
+        review = session.get(Review, 1)
+        assert review.deck_id == verbs.id
+        assert FlashcardRepository(session).search("gehen")[0].front == "gehen"
+        assert session.execute(text("SELECT count(*) FROM deck_closure")).scalar() == 3
+        assert session.execute(
+            text("SELECT flashcards, reviews FROM deck_statistics WHERE deck_id = 2")
+        ).one() == (1, 1)
+
+
+def test_failed_migration_leaves_the_database_unchanged(file_engine, monkeypatch):
+    with file_engine.begin() as connection:
+        for statement in BASELINE_SCHEMA:
+            connection.exec_driver_sql(statement)
+
+    def failing_migration(connection) -> None:
+        """
+        Fail halfway through.
+        """
+        raise RuntimeError("failed")
+
+    monkeypatch.setattr(
+        migrations, "MIGRATIONS", (*migrations.MIGRATIONS, failing_migration)
+    )
+    monkeypatch.setattr(migrations, "SCHEMA_VERSION", SCHEMA_VERSION + 1)
+
+    with pytest.raises(RuntimeError):
+        migrate(file_engine)
+
+    with file_engine.connect() as connection:
+        assert get_schema_version(connection) == 0
+        tables = connection.execute(
+            text("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name")
+        )
+        assert tables.scalars().all() == ["decks", "flashcards", "reviews"]
+        columns = connection.execute(text("PRAGMA table_info(reviews)"))
+        assert "deck_id" not in {row.name for row in columns}
+
+
+def test_migrate_refuses_newer_databases(file_engine):
+    with file_engine.begin() as connection:
+        connection.execute(text(f"PRAGMA user_version = {SCHEMA_VERSION + 1}"))
+
+    with pytest.raises(ValueError):
+        migrate(file_engine)
@@ -0,0 +1,62 @@
+from sqlalchemy import event
+from memotica.modals import DeckModal
+from memotica.models import Deck
+
+
+def test_get_index_reads_decks_with_one_query(engine, session, deck_repository):
+    german = deck_repository.add(Deck(name="German"))
+    verbs = deck_repository.add(Deck(name="Verbs", parent=german))
+    irregular = deck_repository.add(Deck(name="Irregular", parent=verbs))
+    japanese = deck_repository.add(Deck(name="Japanese"))
+    session.expire_all()
+
+    statements = []
+    event.listen(
+        engine, "before_cursor_execute", lambda *args: statements.append(args[2])
+    )
+
+    index = deck_repository.get_index()
+
+    assert [deck.name for deck in index.sub_decks(None)] == ["German", "Japanese"]
+    assert [deck.name for deck in index.sub_decks(verbs.id)] == ["Irregular"]
+    assert index.descendants(german.id) == {german.id, verbs.id, irregular.id}
+    assert index.get(japanese.id).name == "Japanese"
+    assert len(statements) == 1
+
+
+def test_changes(deck_repository):
+    german = deck_repository.add(Deck(name="German"))
+    verbs = deck_repository.add(Deck(name="Verbs", parent=german))
+    irregular = deck_repository.add(Deck(name="Irregular", parent=verbs))
+    index = deck_repository.get_index()
+
+    deck_repository.update(irregular.id, parent_id=german.id)
+    assert index.update(deck_repository.get(irregular.id)) == verbs.id
+    assert index.sub_decks(german.id) == [verbs, irregular]
+    assert index.sub_decks(verbs.id) == []
+
+    deck_repository.delete(german.id)
+    assert index.remove(german.id) == [verbs.id, irregular.id]
+    assert german.id not in index
+    assert index.sub_decks(None) == [verbs, irregular]
+    assert index.parent_id(verbs.id) is None
+
+    nouns = deck_repository.add(Deck(name="Nouns", parent=verbs))
+    index.add(nouns)
+    assert index.sub_decks(verbs.id) == [nouns]
+    assert len(index) == 3
+
+
+def test_deck_modal_excludes_the_deck_subtree(deck_repository):
+    german = deck_repository.add(Deck(name="German"))
+    verbs = deck_repository.add(Deck(name="Verbs", parent=german))
+    deck_repository.add(Deck(name="Irregular", parent=verbs))
+    deck_repository.add(Deck(name="Japanese"))
+    index = deck_repository.get_index()
+
+    # A deck can only be moved under decks outside of its own subtree.
+    modal = DeckModal(index, deck=verbs)
+    assert [deck.name for deck in modal.available_decks] == ["German", "Japanese"]
+
+    modal = DeckModal(index)
+    assert len(modal.available_decks) == 4
@@ -0,0 +1,188 @@
+import csv
+import zipfile
+from io import BytesIO, StringIO
+import pandas as pd
+import pytest
+from sqlalchemy import text
+from memotica.export import export_flashcards, export_tables
+from memotica.models import Deck, Flashcard, Review
+from memotica.repositories import select_deck_ids_by_name
+
+TABLES = ("decks", "flashcards", "reviews")
+
+
+def pandas_csv(engine, table: str) -> bytes:
+    # The layout written by `export all` before it streamed its rows.
+    with engine.connect() as connection:
+        df = pd.read_sql_table(table, con=connection)
+
+    buffer = BytesIO()
+    df.to_csv(buffer, index=False)
+    return buffer.getvalue()
+
+
+def export(engine, batch_size: int = 2) -> dict[str, bytes]:
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zipf, engine.connect() as connection:
+        stats = export_tables(connection, zipf, batch_size=batch_size)
+
+    assert stats.rows == sum(stats.tables.values())
+    with zipfile.ZipFile(buffer) as zipf:
+        return {table: zipf.read(f"{table}.csv") for table in TABLES}
+
+
+def test_export_empty_tables(engine):
+    exported = export(engine)
+
+    for table in TABLES:
+        assert exported[table] == pandas_csv(engine, table)
+
+
+@pytest.mark.parametrize(
+    "timestamps",
+    [
+        ["2024-09-01 00:00:00.000000", "2024-09-02 00:00:00"],
+        ["2024-09-01 10:00:00", "2024-09-02 00:00:00.000000"],
+        ["2024-09-01 10:00:00.100000", "2024-09-02 00:00:00"],
+        ["2024-09-01 10:00:00.100000", "2024-09-02 10:00:00.000001"],
+        ["2024-09-01 10:00:00.001000", "2024-09-02 23:59:59.999000"],
+    ],
+)
+def test_export_matches_pandas_layout(engine, session, timestamps):
+    german = Deck(name="German")
+    verbs = Deck(name="Verbs, irregular", parent=german)
+    session.add_all([german, verbs, Deck(name='"Kanji"')])
+    session.add_all(
+        [
+            Flashcard(front="gehen\nlaufen", back="to go", reversible=True, deck=verbs),
+            Flashcard(front="Straße", back='the "street"', deck=german),
+            Flashcard(front="Wasser", back="", deck=german),
+        ]
+    )
+    session.commit()
+
+    session.add(
+        Review(flashcard_id=1, deck_id=verbs.id, ef=1.3000000000000003, interval=6)
+    )
+    session.add(Review(flashcard_id=2, deck_id=german.id))
+    session.add(Review(flashcard_id=3, deck_id=german.id, ef=3.0, reversed=True))
+    session.commit()
+
+    session.execute(
+        text(
+            "UPDATE flashcards SET created_at = :first, last_updated_at = :first "
+            "WHERE id = 1"
+        ),
+        {"first": timestamps[0]},
+    )
+    session.execute(
+        text("UPDATE flashcards SET created_at = :second WHERE id > 1"),
+        {"second": timestamps[1]},
+    )
+    session.commit()
+
+    exported = export(engine)
+
+    for table in TABLES:
+        assert exported[table] == pandas_csv(engine, table)
+
+
+def test_export_integer_columns_with_nulls(engine, session):
+    german = Deck(name="German")
+    session.add(german)
+    session.commit()
+
+    # An integer column that is entirely NULL is left empty...
+    assert export(engine)["decks"] == pandas_csv(engine, "decks")
+
+    # ...and one that is only partly NULL is written as floats.
+    session.add(Deck(name="Verbs", parent=german))
+    session.commit()
+
+    exported = export(engine)["decks"]
+    rows = list(csv.DictReader(StringIO(exported.decode())))
+    assert [row["parent_id"] for row in rows] == ["", "1.0"]
+    assert exported == pandas_csv(engine, "decks")
+
+
+@pytest.fixture
+def decks(session, deck_repository):
+    german = deck_repository.add(Deck(name="German"))
+    verbs = deck_repository.add(Deck(name="Verbs", parent=german))
+    japanese = deck_repository.add(Deck(name="Japanese"))
+    for front, deck in [("Wasser", german), ("gehen", verbs), ("Mizu", japanese)]:
+        flashcard = Flashcard(front=front, back="", reversible=True, deck=deck)
+        session.add_all([flashcard, Review(flashcard=flashcard)])
+    session.commit()
+
+    return german, verbs, japanese
+
+
+def read_export(engine, deck_ids) -> dict[str, list[dict[str, str]]]:
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zipf, engine.connect() as connection:
+        export_tables(connection, zipf, deck_ids=deck_ids)
+
+    with zipfile.ZipFile(buffer) as zipf:
+        return {
+            table: list(csv.DictReader(StringIO(zipf.read(f"{table}.csv").decode())))
+            for table in TABLES
+        }
+
+
+def test_export_decks(engine, decks):
+    german, verbs, japanese = decks
+
+    exported = read_export(engine, select_deck_ids_by_name(["German", "Verbs"]))
+    assert [deck["name"] for deck in exported["decks"]] == ["German", "Verbs"]
+    assert [deck["parent_id"] for deck in exported["decks"]] == ["", "1.0"]
+    assert [f["front"] for f in exported["flashcards"]] == ["Wasser", "gehen"]
+    assert [r["deck_id"] for r in exported["reviews"]] == [
+        str(german.id),
+        str(verbs.id),
+    ]
+
+    # A parent that is not exported is cleared.
+    exported = read_export(engine, select_deck_ids_by_name(["Verbs", "Japanese"]))
+    assert [deck["name"] for deck in exported["decks"]] == ["Verbs", "Japanese"]
+    assert [deck["parent_id"] for deck in exported["decks"]] == ["", ""]
+    assert [f["front"] for f in exported["flashcards"]] == ["gehen", "Mizu"]
+    assert [r["deck_id"] for r in exported["reviews"]] == [
+        str(verbs.id),
+        str(japanese.id),
+    ]
+
+
+def test_export_decks_with_subdecks(engine, decks):
+    exported = read_export(engine, select_deck_ids_by_name(["German"], True))
+    assert [deck["name"] for deck in exported["decks"]] == ["German", "Verbs"]
+    assert [f["front"] for f in exported["flashcards"]] == ["Wasser", "gehen"]
+
+    exported = read_export(engine, select_deck_ids_by_name(["German"]))
+    assert [deck["name"] for deck in exported["decks"]] == ["German"]
+    assert [f["front"] for f in exported["flashcards"]] == ["Wasser"]
+
+
+def test_export_flashcards(engine, decks):
+    # The layout written before the deck filter moved into the query.
+    with engine.connect() as connection:
+        df = pd.read_sql_query(
+            text("""
+            SELECT f.front, f.back, f.reversible, d.name as deck
+            FROM flashcards AS f
+            LEFT JOIN decks AS d ON f.deck_id = d.id
+            """),
+            connection,
+        )
+
+    for deck_ids, names in [
+        (None, ["German", "Verbs", "Japanese"]),
+        (select_deck_ids_by_name(["German"], True), ["German", "Verbs"]),
+        (select_deck_ids_by_name(["Japanese"]), ["Japanese"]),
+    ]:
+        file = StringIO()
+        with engine.connect() as connection:
+            rows = export_flashcards(connection, file, deck_ids=deck_ids)
+
+        assert rows == len(names)
+        assert file.getvalue() == df[df["deck"].isin(names)].to_csv(index=False)
@@ -0,0 +1,110 @@
+from datetime import date, timedelta
+import numpy as np
+import pytest
+from sqlalchemy.orm import Session
+from memotica.forecast import (
+    ANSWER_QUALITIES,
+    ReviewArrays,
+    load_review_arrays,
+    simulate,
+)
+from memotica.models import Deck, Flashcard, Review
+from memotica.sm2 import sm2
+
+TODAY = date(2026, 1, 1)
+
+
+def expected_due(card, days, answers):
+    """
+    Walks every sequence of answers of a single card with the scalar sm2.
+    """
+
+    due = np.zeros(days)
+    total = sum(answers.values())
+
+    def walk(day, n, ef, i, probability):
+        if day >= days:
+            return
+
+        due[day] += probability
+        for answer, weight in answers.items():
+            new_n, new_ef, new_i = sm2(n, ef, i, ANSWER_QUALITIES[answer])
+            walk(day + new_i, new_n, new_ef, new_i, probability * weight / total)
+
+    due_in, n, ef, i = card
+    walk(max(due_in, 0), n, ef, i, 1.0)
+
+    return due
+
+
+class TestSimulate:
+    CARDS = [(-2, 0, 2.5, 1), (0, 1, 2.5, 1), (1, 3, 1.74, 6), (3, 2, 1.3, 6)]
+    ANSWERS = {"wrong": 0.2, "good": 0.5, "easy": 0.3}
+
+    def test_matches_scalar_sm2(self):
+        days = 12
+        reviews = ReviewArrays(
+            due_in=np.array([card[0] for card in self.CARDS]),
+            repetitions=np.array([card[1] for card in self.CARDS]),
+            ef=np.array([card[2] for card in self.CARDS]),
+            interval=np.array([card[3] for card in self.CARDS]),
+            count=np.ones(len(self.CARDS)),
+        )
+
+        expected = sum(expected_due(card, days, self.ANSWERS) for card in self.CARDS)
+
+        assert simulate(reviews, days, self.ANSWERS) == pytest.approx(expected)
+
+    def test_counts_are_weights(self):
+        reviews = ReviewArrays(
+            due_in=np.array([0]),
+            repetitions=np.array([2]),
+            ef=np.array([2.5]),
+            interval=np.array([6]),
+            count=np.array([1000.0]),
+        )
+
+        due = simulate(reviews, 5, {"wrong": 1})
+        assert due.tolist() == [1000, 1000, 1000, 1000, 1000]
+
+    def test_invalid_answers(self):
+        reviews = ReviewArrays(
+            due_in=np.array([0]),
+            repetitions=np.array([0]),
+            ef=np.array([2.5]),
+            interval=np.array([1]),
+            count=np.array([1.0]),
+        )
+
+        with pytest.raises(ValueError):
+            simulate(reviews, 5, {"maybe": 1})
+        with pytest.raises(ValueError):
+            simulate(reviews, 5, {"wrong": 0, "good": 0})
+
+
+def test_load_review_arrays(session: Session):
+    deck = Deck(name="test")
+    sub_deck = Deck(name="sub", parent=deck)
+    other_deck = Deck(name="other")
+
+    for i, (target, offset) in enumerate(
+        ((deck, -1), (deck, -1), (sub_deck, 2), (other_deck, 0))
+    ):
+        session.add(
+            Review(
+                flashcard=Flashcard(front=f"Front {i}", back="Back", deck=target),
+                next_review=TODAY + timedelta(days=offset),
+            )
+        )
+    session.add(
+        Review(
+            flashcard=Flashcard(front="Front", back="Back", deck=deck),
+            next_review=TODAY + timedelta(days=40),
+        )
+    )
+    session.commit()
+
+    reviews = load_review_arrays(session, deck.id, days=30, today=TODAY)
+
+    states = sorted(zip(reviews.due_in.tolist(), reviews.count.tolist()))
+    assert states == [(-1, 2.0), (2, 1.0)]
@@ -1,6 +1,15 @@
+import itertools
 from datetime import datetime, timedelta
 import pytest
-from memotica.models import Deck, Flashcard, Review
+from sqlalchemy import event, select, text
+from sqlalchemy.exc import IntegrityError
+from memotica.changes import Deleted, Inserted, Updated
+from memotica.models import Deck, DeckClosure, Flashcard, Review
+from memotica.repositories import (
+    StatisticsRepository,
+    flashcard_row_cursor,
+    rebuild_deck_closure,
+)
 
 
 class TestDeckRepository:
@@ -39,6 +48,49 @@ class TestDeckRepository:
         decks_in_db = self.deck_repository.get_with_subdecks(parent_deck.id)
         assert len(decks_in_db) == (NUM_CHILDREN * 2) + 1
 
+    def test_closure_follows_moves(self):
+        root = self.deck_repository.add(Deck(name="Root"))
+        parent = self.deck_repository.add(Deck(name="Parent", parent=root))
+        child = self.deck_repository.add(Deck(name="Child", parent=parent))
+        grandchild = self.deck_repository.add(Deck(name="Grandchild", parent=child))
+        other = self.deck_repository.add(Deck(name="Other"))
+
+        def subtree(deck: Deck) -> set[int]:
+            return {deck.id for deck in self.deck_repository.get_with_subdecks(deck.id)}
+
+        assert subtree(root) == {root.id, parent.id, child.id, grandchild.id}
+
+        self.deck_repository.update(child.id, parent_id=other.id)
+        assert subtree(root) == {root.id, parent.id}
+        assert subtree(other) == {other.id, child.id, grandchild.id}
+
+        self.deck_repository.update(child.id, parent_id=None)
+        assert subtree(other) == {other.id}
+        assert subtree(child) == {child.id, grandchild.id}
+
+        self.deck_repository.delete(parent.id)
+        assert subtree(root) == {root.id}
+
+        closure = self.deck_repository.session.execute(
+            select(
+                DeckClosure.ancestor_id, DeckClosure.descendant_id, DeckClosure.depth
+            )
+        ).all()
+        rebuild_deck_closure(self.deck_repository.session)
+        rebuilt_closure = self.deck_repository.session.execute(
+            select(
+                DeckClosure.ancestor_id, DeckClosure.descendant_id, DeckClosure.depth
+            )
+        ).all()
+        assert sorted(closure) == sorted(rebuilt_closure)
+
+    def test_cannot_move_deck_into_sub_deck(self):
+        parent = self.deck_repository.add(Deck(name="Parent"))
+        child = self.deck_repository.add(Deck(name="Child", parent=parent))
+
+        with pytest.raises(IntegrityError):
+            self.deck_repository.update(parent.id, parent_id=child.id)
+
     def test_get_by_name(self):
         deck = self.deck_repository.add(Deck(name="Testing 101"))
 
@@ -46,6 +98,21 @@ class TestDeckRepository:
         assert deck_in_db is not None
         assert deck_in_db.id == deck.id
 
+    def test_find_by_path(self):
+        german = self.deck_repository.add(Deck(name="German"))
+        german_verbs = self.deck_repository.add(Deck(name="Verbs", parent=german))
+        spanish = self.deck_repository.add(Deck(name="Spanish"))
+        spanish_verbs = self.deck_repository.add(Deck(name="Verbs", parent=spanish))
+
+        assert self.deck_repository.find_by_path("Verbs") == [
+            german_verbs,
+            spanish_verbs,
+        ]
+        assert self.deck_repository.find_by_path("Spanish/Verbs") == [spanish_verbs]
+        assert self.deck_repository.find_by_path("German") == [german]
+        assert self.deck_repository.find_by_path("French/Verbs") == []
+        assert self.deck_repository.get_path(spanish_verbs) == "Spanish/Verbs"
+
     def test_get_all(self):
         decks_in_db = self.deck_repository.get_all()
         assert len(decks_in_db) == 0
@@ -172,6 +239,83 @@ class TestFlashcardRepository:
         )
         assert len(flashcards_in_decks) == NUM_FLASHCARDS * 2
 
+    def test_get_by_deck_with_zero_offset_and_limit(self):
+        for i in range(3):
+            self.flashcard_repository.add(
+                Flashcard(front=f"Front {i}", back=f"Back {i}", deck=self.deck)
+            )
+
+        assert len(self.flashcard_repository.get_by_deck(self.deck.id, offset=0)) == 3
+        assert len(self.flashcard_repository.get_by_deck(self.deck.id, limit=0)) == 0
+
+    def test_get_page_by_decks(self):
+        sub_deck = self.deck_repository.add(Deck(name="Subdeck", parent=self.deck))
+        for i in range(5):
+            for deck in (sub_deck, self.deck):
+                self.flashcard_repository.add(
+                    Flashcard(front=f"Front {i}", back=f"Back {i}", deck=deck)
+                )
+
+        seen = []
+        cursor = None
+        while True:
+            page = self.flashcard_repository.get_page_by_decks(
+                [self.deck.id, sub_deck.id], limit=3, cursor=cursor
+            )
+            assert len(page.items) <= 3
+            seen.extend(page.items)
+
+            if page.next_cursor is None:
+                break
+            cursor = page.next_cursor
+
+        assert [(f.deck_id, f.id) for f in seen] == sorted(
+            (f.deck_id, f.id) for f in self.flashcard_repository.get_all()
+        )
+
+    def test_get_page_by_datetime(self):
+        for i in range(5):
+            self.flashcard_repository.add(
+                Flashcard(
+                    front=f"Front {i}",
+                    back=f"Back {i}",
+                    deck=self.deck,
+                    created_at=datetime(2024, 9, 1, 12, 0, 5 - i, 500),
+                )
+            )
+
+        seen = []
+        cursor = None
+        while True:
+            page = self.flashcard_repository._get_page(
+                select(Flashcard),
+                [Flashcard.created_at, Flashcard.id],
+                limit=2,
+                cursor=cursor,
+            )
+            seen.extend(page.items)
+
+            if page.next_cursor is None:
+                break
+            cursor = page.next_cursor
+
+        assert [f.front for f in seen] == [f"Front {i}" for i in reversed(range(5))]
+
+    def test_get_page_with_invalid_cursor(self):
+        with pytest.raises(ValueError):
+            self.flashcard_repository.get_page(cursor="not a cursor")
+
+    def test_iter_all(self):
+        for i in range(7):
+            self.flashcard_repository.add(
+                Flashcard(front=f"Front {i}", back=f"Back {i}", deck=self.deck)
+            )
+
+        flashcards = list(self.flashcard_repository.iter_all(page_size=2))
+        assert [flashcard.front for flashcard in flashcards] == [
+            f"Front {i}" for i in range(7)
+        ]
+
     def test_get_all(self):
         self.flashcard_repository.add(
             Flashcard(front="Wasser", back="Water", deck=self.deck)
@@ -206,6 +350,114 @@ class TestFlashcardRepository:
         deleted_flashcard = self.flashcard_repository.get(flashcard.id)
         assert deleted_flashcard is None
 
+    def test_changes_are_reported(self):
+        changes = []
+        self.flashcard_repository.subscribe(changes.append)
+
+        flashcard = self.flashcard_repository.add(
+            Flashcard(front="Wasser", back="Water", deck=self.deck)
+        )
+        self.flashcard_repository.update(flashcard.id, back="Agua")
+        self.flashcard_repository.delete(flashcard.id)
+        self.flashcard_repository.delete(flashcard.id)
+
+        assert changes == [
+            Inserted(Flashcard, (flashcard.id,)),
+            Updated(Flashcard, (flashcard.id,)),
+            Deleted(Flashcard, (flashcard.id,)),
+        ]
+
+    def test_get_rows_with_subdecks_by_ids(self):
+        ids = [
+            self.flashcard_repository.add(
+                Flashcard(front=f"Front {i}", back=f"Back {i}", deck=self.deck)
+            ).id
+            for i in range(3)
+        ]
+
+        rows = self.flashcard_repository.get_rows_with_subdecks(
+            self.deck.id, ids=ids[1:]
+        )
+        assert [(row.id, row.deck_id, row.deck) for row in rows] == [
+            (ids[1], self.deck.id, "Testing 101"),
+            (ids[2], self.deck.id, "Testing 101"),
+        ]
+
+    @pytest.mark.parametrize(
+        ("order_by", "descending", "search"),
+        [(None, False, None), ("front", True, None), (None, False, "wasser")],
+    )
+    def test_get_rows_with_subdecks_by_cursor(self, order_by, descending, search):
+        for i in range(7):
+            self.flashcard_repository.add(
+                Flashcard(front=f"Wasser {i % 3}", back=f"Water {i}", deck=self.deck)
+            )
+
+        def get_rows(**kwargs) -> list:
+            return self.flashcard_repository.get_rows_with_subdecks(
+                order_by=order_by, descending=descending, search=search, **kwargs
+            )
+
+        expected = [row.id for row in get_rows()]
+
+        ids, cursor = [], None
+        while rows := get_rows(limit=3, after=cursor):
+            ids += [row.id for row in rows]
+            cursor = flashcard_row_cursor(rows[-1])
+        assert ids == expected
+
+        ids, cursor = [], flashcard_row_cursor(get_rows()[-1])
+        while rows := get_rows(limit=3, before=cursor):
+            ids = [row.id for row in rows] + ids
+            cursor = flashcard_row_cursor(rows[0])
+        assert ids == expected[:-1]
+
+    def test_search(self):
+        sub_deck = self.deck_repository.add(Deck(name="Subdeck", parent=self.deck))
+        other_deck = self.deck_repository.add(Deck(name="Other"))
+        for front, back, deck in (
+            ("Wasser", "Water", self.deck),
+            ("Wasserfall", "Waterfall, water falling", sub_deck),
+            ("Feuer", "Fire", self.deck),
+            ("Wasserkocher", "Kettle", other_deck),
+        ):
+            self.flashcard_repository.add(Flashcard(front=front, back=back, deck=deck))
+
+        rows = self.flashcard_repository.search("water", deck_id=self.deck.id)
+        assert [row.front for row in rows] == ["Wasserfall", "Wasser"]
+        assert rows[0].deck == "Subdeck"
+
+        assert len(self.flashcard_repository.search("wass")) == 3
+        assert self.flashcard_repository.count_with_subdecks(search="wass") == 3
+        assert (
+            self.flashcard_repository.count_with_subdecks(self.deck.id, search="wass")
+            == 2
+        )
+        assert self.flashcard_repository.search("wass water fire") == []
+
+    def test_search_does_not_fail_on_syntax(self):
+        self.flashcard_repository.add(
+            Flashcard(front='Das "Wasser"', back="Water (AND) NOT", deck=self.deck)
+        )
+
+        for search in ('"wasser', "(and", "NOT", "water*", "a:b", "^"):
+            self.flashcard_repository.search(search)
+
+        assert len(self.flashcard_repository.search('"wasser')) == 1
+        assert self.flashcard_repository.count_with_subdecks(search="  ") == 1
+
+    def test_search_follows_updates_and_deletes(self):
+        flashcard = self.flashcard_repository.add(
+            Flashcard(front="Wasser", back="Water", deck=self.deck)
+        )
+
+        self.flashcard_repository.update(flashcard.id, back="Agua")
+        assert self.flashcard_repository.search("water") == []
+        assert len(self.flashcard_repository.search("agua")) == 1
+
+        self.flashcard_repository.delete(flashcard.id)
+        assert self.flashcard_repository.search("agua") == []
+
 
 class TestReviewRepository:
     @pytest.fixture(autouse=True)
@@ -273,6 +525,143 @@ class TestReviewRepository:
         assert len(pending_reviews) == 1
         assert pending_reviews[0].id == pending_review.id
 
+    def test_get_pending_query_plan(self):
+        query = self.review_repository._get_pending_query(self.deck.id)
+        compiled = query.statement.compile(
+            self.review_repository.session.bind,
+            compile_kwargs={"literal_binds": True},
+        )
+
+        plan = [
+            row.detail
+            for row in self.review_repository.session.execute(
+                text(f"EXPLAIN QUERY PLAN {compiled}")
+            )
+        ]
+
+        assert any("USING INDEX ix_reviews_due" in detail for detail in plan)
+        assert not any("TEMP B-TREE" in detail for detail in plan)
+
+    def test_get_pending_page(self):
+        for ef in (2.5, 1.3, 1.8, 1.3, 2.5):
+            self.review_repository.add(Review(flashcard=self.flashcard, ef=ef))
+        self.review_repository.add(
+            Review(flashcard=self.flashcard, next_review=datetime.now() + timedelta(1))
+        )
+
+        first_page = self.review_repository.get_pending_page(self.deck.id, limit=3)
+        assert first_page.next_cursor is not None
+
+        second_page = self.review_repository.get_pending_page(
+            self.deck.id, limit=3, cursor=first_page.next_cursor
+        )
+        assert second_page.next_cursor is None
+
+        pending_reviews = self.review_repository.get_pending(self.deck.id)
+        paged_reviews = first_page.items + second_page.items
+        assert [review.id for review in paged_reviews] == [
+            review.id for review in pending_reviews
+        ]
+
+    def test_deck_id_follows_flashcard(self):
+        review = self.review_repository.add(Review(flashcard=self.flashcard))
+        assert review.deck_id == self.deck.id
+
+        other_deck = self.deck_repository.add(Deck(name="Testing 102"))
+        self.flashcard_repository.update(self.flashcard.id, deck_id=other_deck.id)
+
+        self.review_repository.session.refresh(review)
+        assert review.deck_id == other_deck.id
+        assert len(self.review_repository.get_pending(self.deck.id)) == 0
+        assert len(self.review_repository.get_pending(other_deck.id)) == 1
+
+    def test_get_pending_with_subdecks(self):
+        sub_deck = self.deck_repository.add(Deck(name="Subdeck", parent=self.deck))
+        sub_sub_deck = self.deck_repository.add(
+            Deck(name="Subsubdeck", parent=sub_deck)
+        )
+        other_deck = self.deck_repository.add(Deck(name="Other"))
+
+        for deck in (sub_sub_deck, other_deck, sub_deck):
+            flashcard = self.flashcard_repository.add(
+                Flashcard(front="Front", back="Back", deck=deck)
+            )
+            self.review_repository.add(Review(flashcard=flashcard, ef=1.5))
+            self.review_repository.add(Review(flashcard=flashcard, ef=2.5))
+            self.review_repository.add(
+                Review(flashcard=flashcard, next_review=datetime.now() + timedelta(1))
+            )
+
+        self.review_repository.add(Review(flashcard=self.flashcard))
+
+        expected = [
+            review.id
+            for deck in self.deck_repository.get_with_subdecks(self.deck.id)
+            for review in self.review_repository.get_pending(deck.id)
+        ]
+
+        session = self.review_repository.session
+        session.expunge_all()
+
+        statements = []
+        event.listen(
+            session.bind,
+            "before_cursor_execute",
+            lambda *args: statements.append(args[2]),
+        )
+
+        pending_reviews = self.review_repository.get_pending_with_subdecks(self.deck.id)
+        assert [review.id for review in pending_reviews] == expected
+        assert len(pending_reviews) == 5
+        assert all(review.flashcard.front == "Front" for review in pending_reviews[1:])
+        assert len(statements) == 1
+
+    def test_reset_with_subdecks(self):
+        sub_deck = self.deck_repository.add(Deck(name="Subdeck", parent=self.deck))
+        other_deck = self.deck_repository.add(Deck(name="Other"))
+
+        reversible = self.flashcard_repository.add(
+            Flashcard(front="Kuh", back="Cow", reversible=True, deck=sub_deck)
+        )
+        other = self.flashcard_repository.add(
+            Flashcard(front="Hund", back="Dog", deck=other_deck)
+        )
+
+        for flashcard in (self.flashcard, reversible, other):
+            self.review_repository.add(
+                Review(flashcard=flashcard, ef=1.3, interval=20, repetitions=4)
+            )
+        self.review_repository.add(Review(flashcard=self.flashcard, reversed=True))
+
+        session = self.review_repository.session
+        statements = []
+        event.listen(
+            session.bind,
+            "before_cursor_execute",
+            lambda *args: statements.append(args[2]),
+        )
+
+        deleted, created = self.review_repository.reset_with_subdecks(self.deck.id)
+        assert (deleted, created) == (3, 3)
+        assert len([s for s in statements if s.startswith(("DELETE", "INSERT"))]) == 2
+
+        session.expire_all()
+        reviews = self.review_repository.get_all()
+        assert sorted(
+            (review.flashcard_id, review.reversed, review.ef, review.interval)
+            for review in reviews
+        ) == [
+            (self.flashcard.id, False, 2.5, 1),
+            (reversible.id, False, 2.5, 1),
+            (reversible.id, True, 2.5, 1),
+            (other.id, False, 1.3, 20),
+        ]
+        assert all(
+            review.next_review == datetime.now().date()
+            for review in reviews
+            if review.flashcard_id != other.id
+        )
+
     def test_update(self):
         original_review = self.review_repository.add(Review(flashcard=self.flashcard))
 
@@ -297,3 +686,106 @@ class TestReviewRepository:
         self.review_repository.delete_by_flashcard(self.flashcard.id)
         deleted_review = self.review_repository.get(review.id)
         assert deleted_review is None
+
+
+class TestStatisticsRepository:
+    @pytest.fixture(autouse=True)
+    def setup(
+        self,
+        session,
+        deck_repository,
+        flashcard_repository,
+        review_repository,
+    ):
+        self.deck_repository = deck_repository
+        self.flashcard_repository = flashcard_repository
+        self.review_repository = review_repository
+        self.statistics_repository = StatisticsRepository(session)
+
+        self.deck = self.deck_repository.add(Deck(name="Parent"))
+        self.sub_deck = self.deck_repository.add(Deck(name="Child", parent=self.deck))
+        self.ids = itertools.count()
+
+    def add_flashcard(self, deck: Deck, **review) -> Flashcard:
+        flashcard = self.flashcard_repository.add(
+            Flashcard(front=f"Front {next(self.ids)}", back="Back", deck=deck)
+        )
+        self.review_repository.add(Review(flashcard=flashcard, **review))
+        return flashcard
+
+    def assert_matches_rebuild(self):
+        deck_ids = [None, self.deck.id, self.sub_deck.id]
+        before = [
+            (
+                self.statistics_repository.count_flashcards(deck_id),
+                self.statistics_repository.count_reviews(deck_id),
+                self.statistics_repository.count_pending_reviews(deck_id),
+                self.statistics_repository.calc_avg_review_score(deck_id),
+            )
+            for deck_id in deck_ids
+        ]
+
+        self.statistics_repository.rebuild()
+
+        after = [
+            (
+                self.statistics_repository.count_flashcards(deck_id),
+                self.statistics_repository.count_reviews(deck_id),
+                self.statistics_repository.count_pending_reviews(deck_id),
+                self.statistics_repository.calc_avg_review_score(deck_id),
+            )
+            for deck_id in deck_ids
+        ]
+        assert before == after
+
+    def test_empty(self):
+        assert self.statistics_repository.count_flashcards() == 0
+        assert self.statistics_repository.count_reviews(self.deck.id) == 0
+        assert self.statistics_repository.count_pending_reviews() == 0
+        assert self.statistics_repository.calc_avg_review_score() == 0
+
+    def test_counts_roll_up_to_parent_decks(self):
+        self.add_flashcard(self.deck, ef=2.0)
+        self.add_flashcard(self.sub_deck, ef=1.5)
+        self.add_flashcard(self.sub_deck, next_review=datetime.now() + timedelta(3))
+
+        assert self.statistics_repository.count_flashcards(self.deck.id) == 3
+        assert self.statistics_repository.count_flashcards(self.sub_deck.id) == 2
+        assert self.statistics_repository.count_reviews(self.deck.id) == 3
+        assert self.statistics_repository.count_pending_reviews(self.deck.id) == 2
+        assert self.statistics_repository.count_reviewed_reviews(self.deck.id) == 1
+        assert self.statistics_repository.count_pending_reviews(self.sub_deck.id) == 1
+        assert self.statistics_repository.calc_avg_review_score(
+            self.sub_deck.id
+        ) == pytest.approx(2.0)
+        self.assert_matches_rebuild()
+
+    def test_counts_follow_updates(self):
+        flashcard = self.add_flashcard(self.sub_deck)
+        review = self.review_repository.get_by_flashcard(flashcard.id)[0]
+
+        self.review_repository.update(
+            review.id, ef=1.3, next_review=datetime.now().date() + timedelta(6)
+        )
+        assert self.statistics_repository.count_pending_reviews(self.deck.id) == 0
+        assert self.statistics_repository.calc_avg_review_score() == pytest.approx(1.3)
+
+        self.flashcard_repository.update(flashcard.id, deck_id=self.deck.id)
+        assert self.statistics_repository.count_flashcards(self.sub_deck.id) == 0
+        assert self.statistics_repository.count_reviews(self.sub_deck.id) == 0
+        assert self.statistics_repository.count_reviews(self.deck.id) == 1
+        self.assert_matches_rebuild()
+
+    def test_counts_follow_deletes(self):
+        flashcard = self.add_flashcard(self.sub_deck)
+        self.add_flashcard(self.sub_deck)
+
+        self.flashcard_repository.delete(flashcard.id)
+        assert self.statistics_repository.count_flashcards(self.deck.id) == 1
+        assert self.statistics_repository.count_reviews(self.deck.id) == 1
+        self.assert_matches_rebuild()
+
+        self.deck_repository.delete(self.sub_deck.id)
+        assert self.statistics_repository.count_flashcards() == 0
+        assert self.statistics_repository.count_reviews() == 0
+        self.assert_matches_rebuild()
@@ -0,0 +1,77 @@
+from datetime import date, datetime, timedelta
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from memotica.models import Deck, Flashcard, Review
+from memotica.review_journal import ReviewAnswer, ReviewJournal
+
+
+def answer(review: Review, ef: float) -> ReviewAnswer:
+    return ReviewAnswer(
+        review_id=review.id,
+        repetitions=1,
+        ef=ef,
+        interval=6,
+        next_review=date.today() + timedelta(days=6),
+        last_updated_at=datetime.now(),
+    )
+
+
+class TestReviewJournal:
+    @pytest.fixture(autouse=True)
+    def setup(self, session: Session, tmp_path):
+        flashcard = Flashcard(front="Wasser", back="Water", deck=Deck(name="test"))
+        self.reviews = [Review(flashcard=flashcard) for _ in range(3)]
+        session.add_all(self.reviews)
+        session.commit()
+
+        self.session = session
+        self.path = tmp_path / "memotica.db-reviews"
+
+    def test_flush_writes_answers_in_one_transaction(self):
+        journal = ReviewJournal(self.path)
+        for i, review in enumerate(self.reviews):
+            journal.record(answer(review, ef=2.0 + i / 10))
+
+        assert self.session.get(Review, self.reviews[0].id).ef == 2.5
+
+        commits = []
+        event.listen(self.session, "after_commit", commits.append)
+
+        assert journal.flush(self.session) == 3
+        assert len(commits) == 1
+        assert not journal.has_pending
+        assert self.path.read_text() == ""
+
+        self.session.expire_all()
+        assert [review.ef for review in self.reviews] == [2.0, 2.1, 2.2]
+        assert all(review.interval == 6 for review in self.reviews)
+
+    def test_record_asks_for_a_flush_every_n_answers(self):
+        journal = ReviewJournal(self.path, flush_every=2)
+
+        assert not journal.record(answer(self.reviews[0], ef=2.0))
+        assert journal.record(answer(self.reviews[1], ef=2.0))
+
+    def test_replay_writes_answers_left_by_a_crash(self):
+        journal = ReviewJournal(self.path)
+        journal.record(answer(self.reviews[0], ef=1.3))
+        journal.record(answer(self.reviews[0], ef=1.5))
+        journal.close()
+
+        with open(self.path, "a") as file:
+            file.write('{"review_id": 3, "ef"')
+
+        assert ReviewJournal(self.path).replay(self.session) == 2
+        assert self.path.read_text() == ""
+
+        self.session.expire_all()
+        assert self.reviews[0].ef == 1.5
+        assert self.reviews[2].ef == 2.5
+
+    def test_without_a_file(self):
+        journal = ReviewJournal()
+        journal.record(answer(self.reviews[0], ef=1.3))
+
+        assert journal.replay(self.session) == 0
+        assert journal.flush(self.session) == 1
@@ -1,5 +1,6 @@
+import numpy as np
 import pytest
-from memotica.sm2 import sm2
+from memotica.sm2 import sm2, sm2_batch
 
 
 @pytest.mark.parametrize(
@@ -52,3 +53,55 @@ from memotica.sm2 import sm2
 def test_sm2(test_name, test_data):
     results = sm2(**test_data["parameters"])
     assert results == test_data["expected"]
+
+
+def random_cards(seed: int, size: int = 20_000):
+    rng = np.random.default_rng(seed)
+    n = rng.integers(0, 12, size)
+    i = rng.integers(0, 500, size)
+    q = rng.integers(0, 6, size)
+
+    # Half of the easiness factors sit on, or right next to, a tie of the
+    # rounding to two decimals once the update is added.
+    ef = rng.uniform(1.0, 3.0, size)
+    ties = rng.integers(100, 300, size // 2) / 100 + 0.005
+    ef[: size // 2] = np.nextafter(ties, rng.choice([-np.inf, np.inf], size // 2))
+    ef[: size // 4] = ties[: size // 4]
+
+    return n, ef, i, q
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_sm2_batch_matches_sm2(seed):
+    n, ef, i, q = random_cards(seed)
+
+    batch_n, batch_ef, batch_i = sm2_batch(n, ef, i, q)
+
+    expected = [
+        sm2(int(n_), float(ef_), int(i_), int(q_))
+        for n_, ef_, i_, q_ in zip(n, ef, i, q)
+    ]
+    expected_n, expected_ef, expected_i = (
+        np.array(values) for values in zip(*expected)
+    )
+
+    assert np.array_equal(batch_n, expected_n)
+    assert np.array_equal(batch_i, expected_i)
+    # Compare the bits, not the values, so that even -0.0 and 0.0 differ.
+    assert np.array_equal(batch_ef.view(np.int64), expected_ef.view(np.int64))
+
+
+def test_sm2_batch_over_many_answers():
+    rng = np.random.default_rng(42)
+    size = 1_000
+    n = np.zeros(size, dtype=np.int64)
+    ef = np.full(size, 2.5)
+    i = np.zeros(size, dtype=np.int64)
+    cards = [(0, 2.5, 0)] * size
+
+    for _ in range(15):
+        q = rng.integers(0, 6, size)
+        n, ef, i = sm2_batch(n, ef, i, q)
+        cards = [sm2(*card, int(q_)) for card, q_ in zip(cards, q)]
+
+    assert [(int(n_), float(ef_), int(i_)) for n_, ef_, i_ in zip(n, ef, i)] == cards
@@ -0,0 +1,304 @@
+import json
+from datetime import date, datetime, timedelta
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+from memotica.models import Deck, Flashcard, Review, utcnow
+from memotica.repositories import DeckRepository, FlashcardRepository
+from memotica.review_journal import ReviewAnswer, ReviewJournal
+from memotica.sync import (
+    apply_changeset,
+    export_changeset,
+    get_watermark,
+    set_watermark,
+)
+
+
+def sync(source, target, since=None):
+    with source.begin() as connection:
+        changeset = export_changeset(connection, since)
+
+    # Changesets travel between machines as JSON.
+    changeset = json.loads(json.dumps(changeset))
+    with target.begin() as connection:
+        return apply_changeset(connection, changeset)
+
+
+def collection(engine) -> list[tuple]:
+    with engine.connect() as connection:
+        return connection.execute(
+            text("""
+            SELECT parent.name, decks.name, front, back, reversed, repetitions
+            FROM reviews
+            JOIN flashcards ON flashcards.id = reviews.flashcard_id
+            JOIN decks ON decks.id = flashcards.deck_id
+            LEFT JOIN decks AS parent ON parent.id = decks.parent_id
+            ORDER BY front, reversed
+            """)
+        ).all()
+
+
+@pytest.fixture
+def german(session):
+    german = Deck(name="German")
+    verbs = Deck(name="Verbs", parent=german)
+    wasser = Flashcard(front="Wasser", back="Water", reversible=True, deck=german)
+    gehen = Flashcard(front="gehen", back="to go", deck=verbs)
+    session.add_all(
+        [
+            wasser,
+            gehen,
+            Review(flashcard=wasser),
+            Review(flashcard=wasser, reversed=True),
+            Review(flashcard=gehen),
+        ]
+    )
+    session.commit()
+
+    return german
+
+
+def test_full_sync(engine, german, make_engine):
+    other_engine = make_engine()
+
+    stats = sync(engine, other_engine)
+
+    assert (stats.inserted, stats.updated, stats.skipped) == (7, 0, 0)
+    assert collection(other_engine) == collection(engine)
+    with other_engine.connect() as connection:
+        closure = connection.execute(text("SELECT count(*) FROM deck_closure"))
+        assert closure.scalar() == 3
+
+    # Applying the same changes again changes nothing.
+    stats = sync(engine, other_engine)
+    assert (stats.inserted, stats.updated, stats.skipped) == (0, 0, 7)
+    assert collection(other_engine) == collection(engine)
+
+
+def test_changes_since(engine, session, german, make_engine):
+    other_engine = make_engine()
+
+    sync(engine, other_engine)
+    since = utcnow()
+
+    FlashcardRepository(session).update(1, back="Water!")
+    with engine.begin() as connection:
+        changeset = export_changeset(connection, since)
+
+    assert [row["back"] for row in changeset["flashcards"]] == ["Water!"]
+    assert changeset["decks"] == changeset["reviews"] == []
+
+    stats = sync(engine, other_engine, since)
+    assert stats.updated == 1
+    assert collection(other_engine) == collection(engine)
+
+
+def sync_to_peer(source, target, peer):
+    """
+    Syncs like `memotica sync export --peer PEER` followed by `sync apply`.
+    """
+
+    with source.begin() as connection:
+        changeset = export_changeset(connection, get_watermark(connection, peer))
+        set_watermark(connection, peer, datetime.fromisoformat(changeset["until"]))
+
+    changeset = json.loads(json.dumps(changeset))
+    with target.begin() as connection:
+        return apply_changeset(connection, changeset)
+
+
+def test_received_changes_are_forwarded(engine, session, german, make_engine):
+    other_engine = make_engine()
+    third_engine = make_engine()
+
+    # The collection is shared between A (`engine`), B and C, through A.
+    sync_to_peer(engine, other_engine, "b")
+    sync_to_peer(engine, third_engine, "c")
+
+    with Session(other_engine) as other_session:
+        deck = DeckRepository(other_session).get_by_name("German")
+        feuer = Flashcard(front="Feuer", back="Fire", deck=deck)
+        other_session.add_all([feuer, Review(flashcard=feuer)])
+        other_session.commit()
+        FlashcardRepository(other_session).delete(2)
+
+    # A syncs with C again after B's changes, but before receiving them.
+    sync_to_peer(engine, third_engine, "c")
+    sync_to_peer(other_engine, engine, "a")
+    stats = sync_to_peer(engine, third_engine, "c")
+
+    assert (stats.inserted, stats.deleted) == (2, 2)
+    assert collection(third_engine) == collection(other_engine)
+    assert [row[2] for row in collection(third_engine)] == ["Feuer", "Wasser", "Wasser"]
+
+    # Nothing is sent twice.
+    stats = sync_to_peer(engine, third_engine, "c")
+    assert (stats.inserted, stats.updated, stats.deleted, stats.skipped) == (0, 0, 0, 0)
+
+
+def answer(review_id: int, repetitions: int) -> ReviewAnswer:
+    return ReviewAnswer(
+        review_id=review_id,
+        repetitions=repetitions,
+        ef=2.5,
+        interval=1,
+        next_review=date.today() + timedelta(days=1),
+        last_updated_at=utcnow(),
+    )
+
+
+def repetitions(engine) -> list[int]:
+    return [row[5] for row in collection(engine)]
+
+
+def test_journaled_answers_are_synced(engine, session, german, make_engine):
+    other_engine = make_engine()
+    journal = ReviewJournal()
+
+    sync_to_peer(engine, other_engine, "b")
+
+    # Exported while the answer waits in the journal.
+    journal.record(answer(3, 1))
+    sync_to_peer(engine, other_engine, "b")
+    journal.flush(session)
+
+    sync_to_peer(engine, other_engine, "b")
+    assert repetitions(other_engine) == [0, 1, 0]
+    assert collection(other_engine) == collection(engine)
+
+
+def test_journaled_answers_lose_to_later_changes(engine, session, german, make_engine):
+    other_engine = make_engine()
+    journal = ReviewJournal()
+
+    sync_to_peer(engine, other_engine, "b")
+
+    journal.record(answer(3, 1))
+    with Session(other_engine) as other_session:
+        review = other_session.get(Review, 3)
+        review.repetitions, review.last_updated_at = 2, utcnow()
+        other_session.commit()
+    sync_to_peer(other_engine, engine, "a")
+    journal.flush(session)
+
+    assert repetitions(engine) == [0, 2, 0]
+
+
+def test_watermark(engine):
+    until = utcnow()
+    with engine.begin() as connection:
+        assert get_watermark(connection, "laptop") is None
+        set_watermark(connection, "laptop", until - timedelta(days=1))
+        set_watermark(connection, "laptop", until)
+        assert get_watermark(connection, "laptop") == until
+        assert get_watermark(connection, "desktop") is None
+
+
+def test_last_writer_wins(engine, session, german, make_engine):
+    other_engine = make_engine()
+
+    sync(engine, other_engine)
+
+    with Session(other_engine) as other_session:
+        FlashcardRepository(other_session).update(1, back="older")
+    FlashcardRepository(session).update(1, back="newer")
+
+    sync(other_engine, engine)
+    sync(engine, other_engine)
+
+    assert collection(engine)[0][3] == "newer"
+    assert collection(other_engine) == collection(engine)
+
+
+def test_deletions(engine, session, german, make_engine):
+    other_engine = make_engine()
+
+    sync(engine, other_engine)
+    with other_engine.begin() as connection:
+        changeset_before = export_changeset(connection)
+
+    FlashcardRepository(session).delete(1)
+    stats = sync(engine, other_engine)
+
+    # The flashcard and its two reviews.
+    assert stats.deleted == 3
+    assert [row[2] for row in collection(other_engine)] == ["gehen"]
+
+    # Older changes do not bring the flashcard back.
+    with other_engine.begin() as connection:
+        stats = apply_changeset(connection, changeset_before)
+    assert stats.inserted == 0
+    assert [row[2] for row in collection(other_engine)] == ["gehen"]
+
+
+def test_deletions_lose_to_later_changes(engine, session, german, make_engine):
+    other_engine = make_engine()
+
+    sync(engine, other_engine)
+    since = utcnow()
+
+    FlashcardRepository(session).delete(2)
+    with Session(other_engine) as other_session:
+        FlashcardRepository(other_session).update(
+            2, back="to walk", last_updated_at=utcnow() + timedelta(seconds=1)
+        )
+
+    stats = sync(engine, other_engine, since)
+
+    # Only its review, which was not changed, is deleted.
+    assert (stats.deleted, stats.skipped) == (1, 1)
+    with other_engine.connect() as connection:
+        backs = connection.execute(select(Flashcard.back).order_by(Flashcard.id))
+        assert backs.scalars().all() == ["Water", "to walk"]
+
+
+def test_deleted_decks_keep_newer_flashcards(engine, session, make_engine):
+    other_engine = make_engine()
+
+    DeckRepository(session).add(Deck(name="Spanish"))
+    sync(engine, other_engine)
+
+    with Session(other_engine) as other_session:
+        spanish = DeckRepository(other_session).get_by_name("Spanish")
+        other_session.add(Flashcard(front="agua", back="water", deck=spanish))
+        other_session.commit()
+    DeckRepository(session).delete(1)
+
+    stats = sync(engine, other_engine)
+
+    assert (stats.deleted, stats.skipped) == (0, 1)
+    with other_engine.connect() as connection:
+        assert connection.execute(select(Deck.name)).scalars().all() == ["Spanish"]
+
+
+def test_rows_created_on_both_machines_are_merged(engine, german, make_engine):
+    other_engine = make_engine()
+
+    # The same deck and flashcard, imported on each machine on its own.
+    with Session(other_engine) as other_session:
+        german = Deck(name="German")
+        wasser = Flashcard(front="wasser ", back="water", reversible=True, deck=german)
+        other_session.add_all([wasser, Review(flashcard=wasser)])
+        other_session.commit()
+
+    sync(engine, other_engine)
+    sync(other_engine, engine)
+
+    # The later import wins, and nothing is duplicated.
+    assert collection(other_engine) == collection(engine)
+    assert [row[2] for row in collection(engine)] == ["gehen", "wasser ", "wasser "]
+    for model in (Deck, Flashcard, Review):
+        stmt = select(model.sync_id).order_by(model.sync_id)
+        with engine.connect() as connection, other_engine.connect() as other:
+            assert (
+                connection.execute(stmt).scalars().all()
+                == other.execute(stmt).scalars().all()
+            )
+
+
+def test_unsupported_changeset(make_engine):
+    other_engine = make_engine()
+
+    with other_engine.begin() as connection:
+        with pytest.raises(ValueError):
+            apply_changeset(connection, {"version": 0})
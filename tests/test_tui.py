@@ -1,8 +1,35 @@
+import threading
+from time import perf_counter
 import pytest
 from sqlalchemy.orm import Session
+from textual.pilot import Pilot
+from memotica.flashcards_table import FlashcardsTable
+from memotica.deck_tree import DeckTree
+from memotica.messages import SelectDeck, UpdateReview
+from memotica.modals import ForecastModal
+from memotica.models import Deck, Flashcard, Review
+from memotica.review_screen import ReviewScreen, ReviewStatus
 from memotica.tui import Memotica
 
 
+@pytest.fixture(scope="function", autouse=True)
+def session(engine):
+    with Session(engine, expire_on_commit=False) as session:
+        yield session
+
+
+async def wait_for_database(pilot: Pilot) -> None:
+    """
+    Waits until the app has no database work left, including the work
+    started by the messages that earlier work posted.
+    """
+
+    await pilot.pause()
+    while any(not worker.is_finished for worker in pilot.app.workers):
+        await pilot.app.workers.wait_for_complete()
+        await pilot.pause()
+
+
 @pytest.mark.asyncio
 async def test_user_cannot_add_flashcards_before_deck(session: Session):
     app = Memotica(session)
@@ -14,21 +41,23 @@ async def test_user_cannot_add_flashcards_before_deck(session: Session):
         assert len(app.screen_stack) == 1, "Deck modal should be closed"
 
         await pilot.press("ctrl+a")
-        assert (
-            len(app.screen_stack) == 1
-        ), "Flashcard modal can't be open since there are no decks yet"
+        assert len(app.screen_stack) == 1, (
+            "Flashcard modal can't be open since there are no decks yet"
+        )
 
 
 @pytest.mark.asyncio
 async def test_user_can_add_decks(session: Session):
     app = Memotica(session)
     async with app.run_test() as pilot:
+        await wait_for_database(pilot)
         decks_in_app = pilot.app.decks
         assert len(decks_in_app) == 0, "There should be no decks"
 
         await pilot.press("ctrl+n")
         await pilot.press("t", "e", "s", "t")
         await pilot.press("enter")
+        await wait_for_database(pilot)
 
         decks_in_app = pilot.app.decks
         assert len(decks_in_app) == 1, "There should be a deck"
@@ -38,20 +67,326 @@ async def test_user_can_add_decks(session: Session):
 async def test_user_cannot_add_decks_with_same_name(session: Session):
     app = Memotica(session)
     async with app.run_test() as pilot:
+        await wait_for_database(pilot)
         decks_in_app = pilot.app.decks
         assert len(decks_in_app) == 0, "There should be no decks"
 
         await pilot.press("ctrl+n")
         await pilot.press("t", "e", "s", "t")
         await pilot.press("enter")
+        await wait_for_database(pilot)
         assert len(app.screen_stack) == 1, "There should be a deck"
 
         await pilot.press("ctrl+n")
         await pilot.press("t", "e", "s", "t")
         await pilot.press("enter")
-        assert (
-            len(app.screen_stack) == 2
-        ), "Deck modal cannot close since deck name is invalid"
+        assert len(app.screen_stack) == 2, (
+            "Deck modal cannot close since deck name is invalid"
+        )
 
         decks_in_app = pilot.app.decks
         assert len(decks_in_app) == 1, "There should be a deck"
+
+
+@pytest.mark.asyncio
+async def test_deck_tree_is_patched_on_changes(session: Session):
+    german = Deck(name="German")
+    verbs = Deck(name="Verbs", parent=german)
+    japanese = Deck(name="Japanese")
+    session.add_all([german, verbs, japanese])
+    session.commit()
+
+    app = Memotica(session)
+    async with app.run_test() as pilot:
+        await wait_for_database(pilot)
+
+        def labels(node=None) -> list:
+            node = node or app.deck_tree.root
+            return [
+                (str(child.label), child.data, labels(child)) for child in node.children
+            ]
+
+        assert labels() == [
+            ("German", german.id, [("Verbs", verbs.id, [])]),
+            ("Japanese", japanese.id, []),
+        ]
+
+        def get_index():
+            raise AssertionError("The tree should not be rebuilt")
+
+        app.decks_repository.get_index = get_index
+
+        app.save_deck(Deck(name="Nouns", parent_id=german.id))
+        await wait_for_database(pilot)
+        assert labels()[0][2] == [("Verbs", verbs.id, []), ("Nouns", 4, [])]
+
+        app.save_deck_changes(verbs.id, Deck(name="Verben", parent_id=japanese.id))
+        await wait_for_database(pilot)
+        assert labels() == [
+            ("German", german.id, [("Nouns", 4, [])]),
+            ("Japanese", japanese.id, [("Verben", verbs.id, [])]),
+        ]
+
+        app.deck_tree.select_node(app.deck_tree.deck_nodes[japanese.id])
+        await wait_for_database(pilot)
+        assert app.selected_deck.name == "Japanese"
+
+        app.remove_deck(japanese.id)
+        await wait_for_database(pilot)
+        assert app.selected_deck is None
+        assert labels() == [
+            ("German", german.id, [("Nouns", 4, [])]),
+            ("Verben", verbs.id, []),
+        ]
+        assert not app.query_one(DeckTree).deck_nodes[verbs.id].allow_expand
+
+
+@pytest.mark.asyncio
+async def test_flashcards_table_applies_changes_in_place(session: Session):
+    german = Deck(name="German")
+    japanese = Deck(name="Japanese")
+    session.add_all(
+        Flashcard(front=f"Front {i}", back=f"Back {i}", deck=german) for i in range(3)
+    )
+    session.add(japanese)
+    session.commit()
+
+    app = Memotica(session)
+    async with app.run_test() as pilot:
+        await wait_for_database(pilot)
+        app.post_message(SelectDeck(german.id))
+        await wait_for_database(pilot)
+
+        table = app.flashcards_table
+        assert table.row_count == 3
+
+        def count_with_subdecks(*args, **kwargs):
+            raise AssertionError("The table should not be reloaded")
+
+        app.flashcards_repository.count_with_subdecks = count_with_subdecks
+
+        flashcard = session.get(Flashcard, 2)
+        app.save_flashcard_changes(
+            flashcard,
+            Flashcard(front="Wasser", back="Water", reversible=True, deck_id=german.id),
+        )
+        await wait_for_database(pilot)
+        assert [str(cell) for cell in table.get_row("2")] == [
+            "Wasser",
+            "Water",
+            "✔",
+            "German",
+        ]
+
+        app.save_flashcard(
+            Flashcard(front="Kuh", back="Cow", reversible=False, deck_id=german.id)
+        )
+        app.save_flashcard(
+            Flashcard(front="Neko", back="Cat", reversible=False, deck_id=japanese.id)
+        )
+        app.remove_flashcard(1)
+        await wait_for_database(pilot)
+        assert [str(table.get_cell_at((row, 0))) for row in range(3)] == [
+            "Wasser",
+            "Front 2",
+            "Kuh",
+        ]
+        assert table.border_subtitle == "3"
+
+        app.save_deck_changes(german.id, Deck(name="Deutsch"))
+        app.save_flashcard_changes(
+            flashcard,
+            Flashcard(
+                front="Wasser", back="Water", reversible=False, deck_id=japanese.id
+            ),
+        )
+        await wait_for_database(pilot)
+        assert table.row_count == 2
+        assert str(table.get_cell_at((0, 3))) == "Deutsch"
+        assert table.border_subtitle == "2"
+
+
+@pytest.mark.asyncio
+async def test_flashcards_table_loads_a_window_at_a_time(session: Session):
+    NUM_FLASHCARDS = 1000
+
+    deck = Deck(name="test")
+    session.add_all(
+        Flashcard(front=f"Front {i}", back=f"Back {i}", deck=deck)
+        for i in range(NUM_FLASHCARDS)
+    )
+    session.commit()
+
+    app = Memotica(session)
+    async with app.run_test() as pilot:
+        await wait_for_database(pilot)
+
+        table = app.query_one(FlashcardsTable)
+        assert table.row_count == FlashcardsTable.WINDOW_SIZE
+        assert table.border_subtitle == f"{NUM_FLASHCARDS}"
+
+        table.focus()
+        table.move_cursor(row=FlashcardsTable.WINDOW_SIZE - 1)
+        await wait_for_database(pilot)
+
+        assert table.window_start == FlashcardsTable.WINDOW_SIZE // 2
+        row_key, _ = table.coordinate_to_cell_key(table.cursor_coordinate)
+        assert row_key.value == f"{FlashcardsTable.WINDOW_SIZE}"
+
+        table.move_cursor(row=0)
+        await wait_for_database(pilot)
+
+        assert table.window_start == 0
+        assert table.row_count == FlashcardsTable.WINDOW_SIZE
+        row_key, _ = table.coordinate_to_cell_key(table.cursor_coordinate)
+        assert row_key.value == f"{FlashcardsTable.WINDOW_SIZE // 2 + 1}"
+
+        await pilot.click(FlashcardsTable, offset=(3, 1))
+        await wait_for_database(pilot)
+
+        assert table.order_by == "front"
+        assert table.window_start == 0
+        row_key, _ = table.coordinate_to_cell_key((0, 0))
+        assert row_key.value == "1"
+        assert str(table.get_cell_at((1, 0))) == "Front 1"
+
+
+@pytest.mark.asyncio
+async def test_search_filters_flashcards(session: Session):
+    deck = Deck(name="test")
+    session.add_all(
+        [
+            Flashcard(front="Wasser", back="Water", deck=deck),
+            Flashcard(front="Wasserfall", back="Waterfall", deck=deck),
+            Flashcard(front="Feuer", back="Fire", deck=deck),
+        ]
+    )
+    session.commit()
+
+    app = Memotica(session)
+    async with app.run_test() as pilot:
+        await wait_for_database(pilot)
+
+        await pilot.press("ctrl+l")
+        await pilot.press(*"wasserf")
+        await wait_for_database(pilot)
+
+        table = app.flashcards_table
+        assert table.search == "wasserf"
+        assert table.row_count == 1
+        assert str(table.get_cell_at((0, 0))) == "Wasserfall"
+
+        await pilot.press(*["backspace"] * 7, "enter")
+        await wait_for_database(pilot)
+
+        assert table.search is None
+        assert table.row_count == 3
+        assert app.focused is table
+
+
+@pytest.mark.asyncio
+async def test_ui_stays_responsive_while_a_query_runs(session: Session):
+    session.add(Flashcard(front="Wasser", back="Water", deck=Deck(name="test")))
+    session.commit()
+
+    app = Memotica(session)
+    async with app.run_test() as pilot:
+        await wait_for_database(pilot)
+
+        release = threading.Event()
+        count_with_subdecks = app.flashcards_repository.count_with_subdecks
+
+        def slow_count_with_subdecks(*args, **kwargs):
+            release.wait(timeout=10)
+            return count_with_subdecks(*args, **kwargs)
+
+        app.flashcards_repository.count_with_subdecks = slow_count_with_subdecks
+
+        await pilot.press("f5")
+        await pilot.pause()
+
+        started_at = perf_counter()
+        await pilot.press("ctrl+b")
+        await pilot.press("f1")
+        elapsed = perf_counter() - started_at
+
+        assert not release.is_set()
+        assert not app.show_sidebar, "Keys are handled while the query runs"
+        assert len(app.screen_stack) == 2, "Help modal should be open"
+        assert elapsed < 2
+
+        release.set()
+        await wait_for_database(pilot)
+
+        assert app.flashcards_table.row_count == 1
+
+
+@pytest.mark.asyncio
+async def test_review_answers_are_written_when_the_app_exits(session: Session):
+    deck = Deck(name="test")
+    review = Review(flashcard=Flashcard(front="Wasser", back="Water", deck=deck))
+    session.add(review)
+    session.commit()
+
+    app = Memotica(session)
+    async with app.run_test() as pilot:
+        await wait_for_database(pilot)
+
+        app.post_message(UpdateReview(review.id, repetitions=1, ef=1.7, interval=1))
+        await wait_for_database(pilot)
+
+        assert app.review_journal.has_pending
+
+    session.expire_all()
+    assert session.get(Review, review.id).ef == 1.7
+
+
+@pytest.mark.asyncio
+async def test_review_screen_prefetches_upcoming_cards(session: Session):
+    NUM_FLASHCARDS = 12
+    PREFETCH = 3
+
+    deck = Deck(name="test")
+    session.add_all(
+        Review(flashcard=Flashcard(front=f"Front {i}", back=f"Back {i}", deck=deck))
+        for i in range(NUM_FLASHCARDS)
+    )
+    session.commit()
+
+    app = Memotica(session, review_prefetch=PREFETCH)
+    async with app.run_test() as pilot:
+        await wait_for_database(pilot)
+
+        app.post_message(SelectDeck(deck.id))
+        await wait_for_database(pilot)
+        await pilot.press("ctrl+s")
+        await wait_for_database(pilot)
+
+        screen = app.screen
+        assert isinstance(screen, ReviewScreen)
+
+        for _ in range(NUM_FLASHCARDS - 1):
+            upcoming = list(screen.review_queue)[:PREFETCH]
+            assert all(review.flashcard_id in screen.contents for review in upcoming)
+            assert len(screen.contents) <= PREFETCH + 1
+
+            await pilot.press("space", "3")
+            assert screen.review_status == ReviewStatus.SHOW_QUESTION
+            await wait_for_database(pilot)
+
+
+@pytest.mark.asyncio
+async def test_forecast_modal(session: Session):
+    deck = Deck(name="test")
+    session.add(Review(flashcard=Flashcard(front="Wasser", back="Water", deck=deck)))
+    session.commit()
+
+    app = Memotica(session)
+    async with app.run_test() as pilot:
+        await wait_for_database(pilot)
+
+        await pilot.press("ctrl+f")
+        await wait_for_database(pilot)
+
+        assert isinstance(app.screen, ForecastModal)
+        assert app.screen.due[0] == 1